@@ -0,0 +1,246 @@
+"""
+Reproducible benchmarks for the KV store and the retrieval hot paths.
+
+Starts an InMemoryKV on an ephemeral port in-process (or targets --addr),
+loads a synthetic corpus and writes every measurement as JSON so runs can be
+compared across commits:
+
+    python bench/bench_kvstore.py --n 5000 --dim 384 --out bench_results.json
+"""
+import argparse
+import contextlib
+import json
+import platform
+import sys
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import numpy as np
+
+import harness
+import kvstore_pb2
+import kvstore_pb2_grpc
+from retry import is_retryable, with_retry
+
+
+def clear(stub):
+    stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="bench_doc"))
+
+
+def bench_put_unary(stub, keys, texts, embs):
+    clear(stub)
+    start = time.perf_counter()
+    for key, text, emb in zip(keys, texts, embs):
+        stub.Put(kvstore_pb2.PutRequest(key=key, textbook_chunk=text, embedding=emb))
+    elapsed = time.perf_counter() - start
+    return {"ops": len(keys), "seconds": elapsed, "ops_per_sec": len(keys) / elapsed}
+
+
+def bench_put_pipelined(stub, keys, texts, embs, window):
+    # Unary Puts kept `window` deep in flight with futures. A window deeper
+    # than the server's write slots gets some Puts shed by admission control;
+    # those are redone with backoff like ingestion_client.py does, and counted
+    clear(stub)
+    slots = threading.BoundedSemaphore(window)
+    pending = []
+    shed = 0
+    start = time.perf_counter()
+    for key, text, emb in zip(keys, texts, embs):
+        slots.acquire()
+        req = kvstore_pb2.PutRequest(key=key, textbook_chunk=text, embedding=emb)
+        fut = stub.Put.future(req)
+        fut.add_done_callback(lambda _: slots.release())
+        pending.append((req, fut))
+    for req, fut in pending:
+        try:
+            fut.result()
+        except grpc.RpcError as e:
+            if not is_retryable(e):
+                raise
+            shed += 1
+            with_retry(lambda timeout: stub.Put(req, timeout=timeout), 10.0, attempts=8)
+    elapsed = time.perf_counter() - start
+    return {"ops": len(keys), "window": window, "seconds": elapsed,
+            "ops_per_sec": len(keys) / elapsed, "shed": shed}
+
+
+def bench_put_batched(stub, keys, texts, embs):
+    # One client-streaming ReplaceDocument per document
+    clear(stub)
+    docs = {}
+    for key, text, emb in zip(keys, texts, embs):
+        docs.setdefault(key.rsplit(":", 1)[0], []).append((key, text, emb))
+
+    def requests(doc_id, chunks):
+        yield kvstore_pb2.ReplaceDocumentRequest(doc_id=doc_id)
+        for key, text, emb in chunks:
+            yield kvstore_pb2.ReplaceDocumentRequest(
+                chunk=kvstore_pb2.PutRequest(key=key, textbook_chunk=text, embedding=emb))
+
+    start = time.perf_counter()
+    for doc_id, chunks in docs.items():
+        stub.ReplaceDocument(requests(doc_id, chunks))
+    elapsed = time.perf_counter() - start
+    return {"ops": len(keys), "documents": len(docs), "seconds": elapsed,
+            "ops_per_sec": len(keys) / elapsed}
+
+
+def bench_gettext(channel, keys, concurrency, requests, seed):
+    rng = np.random.default_rng(seed)
+    picks = [keys[i] for i in rng.integers(0, len(keys), requests)]
+    stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+
+    def one(key):
+        t0 = time.perf_counter()
+        stub.GetText(kvstore_pb2.GetTextRequest(key=key))
+        return time.perf_counter() - t0
+
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, picks))
+    elapsed = time.perf_counter() - start
+
+    result = harness.summarize(latencies)
+    result.update({"concurrency": concurrency, "qps": requests / elapsed})
+    return result
+
+
+def bench_build_index(addr, embs, top_k, queries, seed):
+    import mcp_server
+
+    mcp_server.KV_ADDR = addr
+    start = time.perf_counter()
+    index = mcp_server.build_index("")
+    keys, mat = index.keys, index.mat
+    build_seconds = time.perf_counter() - start
+
+    # Queries are perturbed corpus vectors, timed through the same helpers
+    # search_textbook uses: candidates() for plain top-k, candidates() + mmr()
+    # when diversify is set
+    rng = np.random.default_rng(seed)
+    q = embs[rng.integers(0, len(embs), queries)] + 0.1 * rng.standard_normal(
+        (queries, embs.shape[1])).astype(np.float32)
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+
+    def redundancy(idx):
+        # Mean pairwise cosine similarity of the returned rows: how much they repeat each other
+        rows = mat[idx]
+        pairwise = rows @ rows.T
+        n = len(idx)
+        return float((pairwise.sum() - np.trace(pairwise)) / (n * (n - 1))) if n > 1 else 0.0
+
+    plain_latencies, mmr_latencies = [], []
+    overlap = plain_redundancy = mmr_redundancy = 0.0
+    for j in range(queries):
+        t0 = time.perf_counter()
+        plain = mcp_server.candidates(mat @ q[j], top_k, -1.0)
+        plain_latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        sims = mat @ q[j]
+        cand = mcp_server.candidates(sims, top_k * mcp_server.MMR_CANDIDATES, -1.0)
+        diverse = mcp_server.mmr(mat, sims, cand, top_k, mcp_server.MMR_LAMBDA)
+        mmr_latencies.append(time.perf_counter() - t0)
+
+        overlap += len(set(plain.tolist()) & set(diverse.tolist())) / len(plain)
+        plain_redundancy += redundancy(plain)
+        mmr_redundancy += redundancy(diverse)
+
+    search = harness.summarize(plain_latencies)
+    search.update({
+        "top_k": top_k,
+        "qps": queries / sum(plain_latencies),
+        "mean_pairwise_similarity": plain_redundancy / queries,
+    })
+    search_mmr = harness.summarize(mmr_latencies)
+    search_mmr.update({
+        "top_k": top_k,
+        "lambda": mcp_server.MMR_LAMBDA,
+        "candidates": top_k * mcp_server.MMR_CANDIDATES,
+        "qps": queries / sum(mmr_latencies),
+        "mean_pairwise_similarity": mmr_redundancy / queries,
+        # Share of the plain top-k that diversification keeps
+        "overlap_with_plain": overlap / queries,
+    })
+    return {"build_index_seconds": build_seconds, "indexed": len(keys)}, search, search_mmr
+
+
+def bench_cold_start(srv):
+    # Persist what is loaded, then time a fresh store loading it back
+    srv.kv.persist_to_disk()
+    size = srv.disk_path.stat().st_size
+    start = time.perf_counter()
+    kv = harness.kv_server.InMemoryKV(disk_path=srv.disk_path)
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "file_bytes": size, "keys": len(kv.collection("").textbook_chunks)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the KV store and retrieval hot paths")
+    parser.add_argument("--n", type=int, default=5000, help="Number of synthetic chunks")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--chars", type=int, default=1200, help="Approximate characters per chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--window", type=int, default=32, help="In-flight Puts for the pipelined run")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads for GetText")
+    parser.add_argument("--requests", type=int, default=5000, help="GetText calls to time")
+    parser.add_argument("--queries", type=int, default=200, help="Search queries to time")
+    parser.add_argument("--top_k", type=int, default=5)
+    parser.add_argument("--addr", type=str, default=None,
+                        help="Benchmark an already running server instead of an in-process one "
+                             "(its bench_doc* keys are overwritten and deleted)")
+    parser.add_argument("--out", type=str, default=None, help="Write the JSON results here")
+    args = parser.parse_args()
+
+    keys, texts, emb_matrix = harness.synthetic_corpus(args.n, args.dim, args.seed, chars=args.chars)
+    embs = [row.tobytes() for row in emb_matrix]
+
+    results = {}
+
+    # The store logs to stdout, so keep stdout free for the JSON report
+    with contextlib.redirect_stdout(sys.stderr), contextlib.ExitStack() as stack:
+        srv = None
+        if args.addr is None:
+            srv = stack.enter_context(harness.InProcessServer())
+        addr = args.addr or srv.addr
+
+        channel = stack.enter_context(grpc.insecure_channel(addr))
+        stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+
+        results["put_unary"] = bench_put_unary(stub, keys, texts, embs)
+        results["put_pipelined"] = bench_put_pipelined(stub, keys, texts, embs, args.window)
+        results["put_batched"] = bench_put_batched(stub, keys, texts, embs)
+        results["gettext"] = bench_gettext(channel, keys, args.concurrency, args.requests, args.seed)
+        results["build_index"], results["search"], results["search_mmr"] = bench_build_index(
+            addr, emb_matrix, args.top_k, args.queries, args.seed)
+        if srv is not None:
+            results["cold_start"] = bench_cold_start(srv)
+        else:
+            clear(stub)
+
+    report = {
+        "meta": {
+            "commit": harness.git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "grpc": grpc.__version__,
+            "numpy": np.__version__,
+            "in_process": srv is not None,
+            **{k: v for k, v in vars(args).items() if k not in ("out",)},
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote benchmark results to [{args.out}]")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Shared helpers for the benchmarks: synthetic corpora, an in-process KV server
+on an ephemeral port, and latency summaries.
+"""
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# The server and MCP modules are plain scripts, so make them importable
+for sub in ("server", "mcp_server", "common", "gRPC_KVS/src/kvstore"):
+    path = str(REPO_ROOT / sub)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import server as kv_server   # noqa: E402
+
+WORDS = ("process thread message replica consensus clock failure network node "
+         "latency throughput cache lock commit quorum leader election partition "
+         "state machine request response server client storage").split()
+
+
+def synthetic_corpus(n, dim, seed=0, docs=10, chars=1200, clusters=32):
+    """
+    Return (keys, texts, embeddings) for n chunks spread over `docs` documents.
+    Embeddings are unit-norm float32 vectors drawn around `clusters` centroids,
+    so nearest-neighbour search has structure to find.
+    """
+    rng = np.random.default_rng(seed)
+
+    per_doc = -(-n // docs)
+    keys = [f"bench_doc{i // per_doc}:{i % per_doc}" for i in range(n)]
+
+    words = np.array(WORDS)
+    n_words = max(1, chars // 8)
+    texts = [" ".join(words[rng.integers(0, len(words), n_words)]) for _ in range(n)]
+
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, n)
+    emb = centroids[assign] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+
+    return keys, texts, emb.astype(np.float32)
+
+
+class InProcessServer:
+    """An InMemoryKV served on 127.0.0.1:<ephemeral port>, persisting to a temp dir."""
+
+    def __init__(self, **kv_kwargs):
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="kvbench-")
+        self.disk_path = Path(self.tmpdir.name, "kvstore.pkl")
+        self.kv = kv_server.InMemoryKV(disk_path=self.disk_path, **kv_kwargs)
+        self.server, port = kv_server.build_server(self.kv, "127.0.0.1:0")
+        self.addr = f"127.0.0.1:{port}"
+
+    def __enter__(self):
+        self.server.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.stop(grace=None)
+        self.tmpdir.cleanup()
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"count": 0}
+    arr = np.asarray(samples) * 1000.0
+    return {
+        "count": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+
+def git_commit():
+    """Short hash of the checked-out commit, so results can be compared across commits."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,302 @@
+"""
+Load generator replaying a mix of MCP-style reads and ingestion writes
+against the KV store from many concurrent clients.
+
+Closed loop: `--clients` threads each issue their next call as soon as the
+previous one returns, which finds the server's saturation throughput.
+Open loop: calls arrive at `--qps` on a Poisson schedule whatever the server
+does, and latency is measured from the scheduled arrival, so queueing
+behind a slow server shows up in the tail instead of quietly lowering the
+offered load.
+
+    python bench/loadgen.py --mode closed --clients 32 --duration 20
+    python bench/loadgen.py --mode open --qps 500 --mix search=6,get=2,put=1,delete=0.5,list=0.5
+
+Per operation it reports throughput, latency percentiles of successful calls
+and errors by status code, as JSON like bench_kvstore.py.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import platform
+import sys
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import numpy as np
+
+import harness
+import kvstore_pb2
+import kvstore_pb2_grpc
+from retry import with_retry
+
+# search: top_k GetTexts back to back, what search_textbook does once its
+#         index is built; stream: a full StreamEmbeddings, an index (re)build
+OPS = ("search", "get", "stream", "put", "delete", "list")
+DEFAULT_MIX = "search=6,get=2,stream=0.02,put=1,delete=0.5,list=0.1"
+
+
+def parse_mix(spec):
+    """"search=6,put=1" -> (ops, probabilities). Weights are relative."""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPS:
+            raise argparse.ArgumentTypeError(f"unknown op '{name}', expected one of {list(OPS)}")
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad weight for '{name}': '{weight}'")
+        if weights[name] < 0:
+            raise argparse.ArgumentTypeError(f"negative weight for '{name}'")
+    total = sum(weights.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    ops = tuple(weights)
+    return ops, np.array([weights[op] for op in ops]) / total
+
+
+class Workload:
+    """The calls of each op, issued against one collection of the synthetic corpus."""
+
+    def __init__(self, stub, collection, keys, texts, embs, timeout, top_k, retry):
+        self.stub = stub
+        self.collection = collection
+        self.keys = keys
+        self.texts = texts
+        self.embs = embs
+        self.timeout = timeout
+        self.top_k = top_k
+        self.retry = retry
+
+    def call(self, method, request):
+        if self.retry:
+            return with_retry(lambda t: method(request, timeout=t), self.timeout)
+        return method(request, timeout=self.timeout)
+
+    def run(self, op, rng):
+        getattr(self, op)(rng)
+
+    def search(self, rng):
+        for i in rng.integers(0, len(self.keys), self.top_k):
+            self.get_key(self.keys[i])
+
+    def get(self, rng):
+        self.get_key(self.keys[rng.integers(0, len(self.keys))])
+
+    def get_key(self, key):
+        self.call(self.stub.GetText, kvstore_pb2.GetTextRequest(key=key, collection=self.collection))
+
+    def stream(self, rng):
+        # Streams are consumed in full, like build_index does, under a longer timeout
+        req = kvstore_pb2.StreamEmbeddingsRequest(collection=self.collection)
+        for _ in self.stub.StreamEmbeddings(req, timeout=10 * self.timeout):
+            pass
+
+    def put(self, rng):
+        # Overwrites (or restores after a delete) a corpus key, so the store stays the same size
+        i = rng.integers(0, len(self.keys))
+        self.call(self.stub.Put, kvstore_pb2.PutRequest(
+            key=self.keys[i], textbook_chunk=self.texts[i], embedding=self.embs[i],
+            collection=self.collection))
+
+    def delete(self, rng):
+        key = self.keys[rng.integers(0, len(self.keys))]
+        self.call(self.stub.Delete, kvstore_pb2.DeleteRequest(key=key, collection=self.collection))
+
+    def list(self, rng):
+        self.call(self.stub.List, kvstore_pb2.ListRequest(collection=self.collection))
+
+
+class Recorder:
+    """Thread-safe per-op latencies and status codes, ignoring calls that start before `since`."""
+
+    def __init__(self, since):
+        self.since = since
+        self.lock = threading.Lock()
+        self.latencies = {}     # op -> [seconds] of successful calls
+        self.errors = {}        # op -> {status code name: count}
+
+    def record(self, op, start, seconds, code=None):
+        if start < self.since:
+            return
+        with self.lock:
+            if code is None:
+                self.latencies.setdefault(op, []).append(seconds)
+            else:
+                errors = self.errors.setdefault(op, {})
+                errors[code] = errors.get(code, 0) + 1
+
+    def report(self, seconds):
+        result = {}
+        for op in sorted(set(self.latencies) | set(self.errors)):
+            ok = self.latencies.get(op, [])
+            errors = self.errors.get(op, {})
+            calls = len(ok) + sum(errors.values())
+            entry = harness.summarize(ok)
+            entry.update({
+                "calls": calls,
+                "ops_per_sec": calls / seconds,
+                "error_rate": sum(errors.values()) / calls,
+                "errors": errors,
+            })
+            result[op] = entry
+
+        calls = sum(entry["calls"] for entry in result.values())
+        failed = sum(sum(entry["errors"].values()) for entry in result.values())
+        result["total"] = {
+            "calls": calls,
+            "ops_per_sec": calls / seconds,
+            "error_rate": failed / calls if calls else 0.0,
+        }
+        return result
+
+
+def timed(workload, recorder, op, rng, start):
+    try:
+        workload.run(op, rng)
+    except grpc.RpcError as e:
+        recorder.record(op, start, time.perf_counter() - start, e.code().name)
+    else:
+        recorder.record(op, start, time.perf_counter() - start)
+
+
+def run_closed(workload, recorder, ops, probs, clients, end, seed):
+    def client(i):
+        rng = np.random.default_rng(seed + i)
+        while time.perf_counter() < end:
+            op = ops[rng.choice(len(ops), p=probs)]
+            timed(workload, recorder, op, rng, time.perf_counter())
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {}
+
+
+def run_open(workload, recorder, ops, probs, clients, end, seed, qps):
+    # One thread schedules Poisson arrivals; `clients` threads carry them out.
+    # A call's latency starts at its scheduled arrival, not when a thread was
+    # free to send it, so a backlog is charged to the server's tail
+    rng = np.random.default_rng(seed)
+    seeds = itertools.count(seed + 1)
+    local = threading.local()
+    lock = threading.Lock()
+    started = 0
+    scheduled = 0
+    max_lag = 0.0
+
+    def work(op, arrival):
+        nonlocal started
+        with lock:
+            started += 1
+        if not hasattr(local, "rng"):
+            local.rng = np.random.default_rng(next(seeds))
+        timed(workload, recorder, op, local.rng, arrival)
+
+    with futures.ThreadPoolExecutor(max_workers=clients) as pool:
+        arrival = time.perf_counter()
+        while True:
+            arrival += rng.exponential(1.0 / qps)
+            if arrival >= end:
+                break
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+            pool.submit(work, ops[rng.choice(len(ops), p=probs)], arrival)
+            scheduled += 1
+        with lock:
+            backlog = scheduled - started
+    return {"scheduled": scheduled, "backlog_at_end": backlog, "max_dispatch_lag_ms": 1000.0 * max_lag}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay mixed query and ingestion traffic against the KV store")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--clients", type=int, default=16,
+                        help="Client threads (closed) or threads available to send arrivals (open)")
+    parser.add_argument("--qps", type=float, default=200.0, help="Target arrival rate in open-loop mode")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds of load before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Relative weights of {', '.join(OPS)} (default {DEFAULT_MIX})")
+    parser.add_argument("--n", type=int, default=2000, help="Synthetic chunks loaded before the run")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--chars", type=int, default=1200, help="Approximate characters per chunk")
+    parser.add_argument("--top_k", type=int, default=3, help="GetText calls per search")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Per-call timeout in seconds")
+    parser.add_argument("--retry", action="store_true",
+                        help="Retry shed and UNAVAILABLE calls like the real clients do")
+    parser.add_argument("--collection", type=str, default="loadgen",
+                        help="Collection the corpus is loaded into and the load runs against")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--addr", type=str, default=None,
+                        help="Load an already running server instead of an in-process one "
+                             "(its bench_doc* keys in --collection are overwritten and deleted)")
+    parser.add_argument("--out", type=str, default=None, help="Write the JSON results here")
+    args = parser.parse_args()
+    ops, probs = args.mix
+
+    keys, texts, emb_matrix = harness.synthetic_corpus(args.n, args.dim, args.seed, chars=args.chars)
+    embs = [row.tobytes() for row in emb_matrix]
+
+    # The store logs to stdout, so keep stdout free for the JSON report
+    with contextlib.redirect_stdout(sys.stderr), contextlib.ExitStack() as stack:
+        srv = None
+        if args.addr is None:
+            srv = stack.enter_context(harness.InProcessServer())
+        addr = args.addr or srv.addr
+
+        channel = stack.enter_context(grpc.insecure_channel(addr))
+        stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+
+        for key, text, emb in zip(keys, texts, embs):
+            stub.Put(kvstore_pb2.PutRequest(
+                key=key, textbook_chunk=text, embedding=emb, collection=args.collection))
+
+        workload = Workload(stub, args.collection, keys, texts, embs, args.timeout, args.top_k, args.retry)
+        start = time.perf_counter()
+        recorder = Recorder(since=start + args.warmup)
+        end = start + args.warmup + args.duration
+        if args.mode == "closed":
+            extra = run_closed(workload, recorder, ops, probs, args.clients, end, args.seed)
+        else:
+            extra = run_open(workload, recorder, ops, probs, args.clients, end, args.seed, args.qps)
+        # Open-loop stragglers finish after `end`, so divide by the real measured span
+        measured = time.perf_counter() - recorder.since
+
+        stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="bench_doc", collection=args.collection))
+
+    report = {
+        "meta": {
+            "commit": harness.git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "grpc": grpc.__version__,
+            "in_process": srv is not None,
+            "mix": dict(zip(ops, probs.round(4).tolist())),
+            **{k: v for k, v in vars(args).items() if k not in ("out", "mix")},
+        },
+        "run": {"measured_seconds": measured, **extra},
+        "results": recorder.report(measured),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote load results to [{args.out}]")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Content hash of a stored chunk, shared by the KV server (which keeps one per
+key) and the ingestion client (which compares against them to skip unchanged
+chunks). Both sides must hash exactly the same bytes.
+
+A collection's digest is the XOR of entry_digest() over its keys: it doesn't
+depend on insertion order, survives a restart and updates in O(1) per write.
+"""
+import hashlib
+
+DIGEST_SIZE = 16
+
+
+def content_hash(text: str, embedding: bytes) -> bytes:
+    # The text length goes first so a text/embedding boundary can't shift
+    # without changing the hash
+    data = text.encode("utf-8")
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    h.update(len(data).to_bytes(8, "little"))
+    h.update(data)
+    h.update(embedding)
+    return h.digest()
+
+
+def entry_digest(key: str, digest: bytes) -> int:
+    # One key's share of the collection digest. `digest` has a fixed size,
+    # so key and content can't trade bytes
+    h = hashlib.blake2b(key.encode("utf-8"), digest_size=DIGEST_SIZE)
+    h.update(digest)
+    return int.from_bytes(h.digest(), "little")
@@ -0,0 +1,221 @@
+"""
+Minimal Prometheus-style metrics shared by the KV server and the MCP server.
+
+Only the standard library is used so every process can import this module
+without extra dependencies. Metrics register themselves in a process-wide
+registry which start_http_server() renders in the Prometheus text format.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tracing
+
+# Latency buckets in seconds, from 100us up to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Quantiles estimated from the histogram buckets and exported alongside them
+EXPORTED_QUANTILES = (0.5, 0.99)
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        return "".join(m.render() for m in metrics)
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{n}="{str(v)}"' for n, v in pairs)
+    return "{" + inner + "}"
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}    # label values tuple -> metric state
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _header(self):
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type}\n"
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        lines = [f"{self.name}{_format_labels(self.labelnames, k)} {v}\n" for k, v in items]
+        return self._header() + "".join(lines)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # [per-bucket counts (last one is +Inf), sum, count]
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        with self.lock:
+            state = self.values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def quantile(self, q, **labels):
+        with self.lock:
+            state = self.values.get(self._key(labels))
+            if not state or not state[2]:
+                return 0.0
+            counts, _, total = list(state[0]), state[1], state[2]
+        return self._estimate(counts, total, q)
+
+    def _estimate(self, counts, total, q):
+        # Linear interpolation inside the bucket that holds the q-th sample
+        target = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= target:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lo = self.buckets[i - 1] if i else 0.0
+                return lo + (self.buckets[i] - lo) * (target - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def render(self):
+        with self.lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self.values.items())
+
+        lines = []
+        for key, (counts, total_sum, total) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}\n")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total_sum}\n")
+            lines.append(f"{self.name}_count{labels} {total}\n")
+
+        # Bucket-based p50/p99 estimates as a companion gauge family, so they
+        # can be read off the endpoint without a Prometheus server
+        qname = f"{self.name}_quantile"
+        qlines = [f"# HELP {qname} Estimated quantiles of {self.name}\n# TYPE {qname} gauge\n"]
+        for key, (counts, _, total) in items:
+            for q in EXPORTED_QUANTILES:
+                labels = _format_labels(self.labelnames, key, [("quantile", q)])
+                qlines.append(f"{qname}{labels} {self._estimate(counts, total, q)}\n")
+
+        return self._header() + "".join(lines) + "".join(qlines)
+
+
+class TimedLock:
+    """Wraps a lock and records how long each acquisition waited for it."""
+
+    def __init__(self, lock, histogram, **labels):
+        self.lock = lock
+        self.histogram = histogram
+        self.labels = labels
+
+    def acquire(self, *args, **kwargs):
+        start = time.perf_counter()
+        acquired = self.lock.acquire(*args, **kwargs)
+        waited = time.perf_counter() - start
+        self.histogram.observe(waited, **self.labels)
+        tracing.record("lock_wait", waited, **self.labels)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Stay quiet: the MCP server owns stdout and we don't want access logs on stderr
+        pass
+
+
+def start_http_server(port, addr="127.0.0.1", registry=REGISTRY):
+    """Serve GET /metrics on a daemon thread. Returns the HTTP server (port 0 picks a free port)."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    httpd = ThreadingHTTPServer((addr, port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
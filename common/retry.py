@@ -0,0 +1,82 @@
+"""
+Client-side deadlines and retries shared by the ingestion client and the MCP
+server.
+
+Every call gets a timeout. When the caller has an overall budget (a Deadline),
+each attempt's timeout is capped by what is left of it, so a retried call can
+never run past the caller's own deadline. Calls that fail with a retryable
+status are retried with exponential backoff and full jitter, so a burst of
+clients rejected together doesn't come back in lockstep.
+
+RESOURCE_EXHAUSTED is only retried when the server marked it as load shedding
+with the LOAD_SHED_TRAILER trailing metadata entry. The same code also means
+"this collection is full", and retrying that would fail the same way.
+"""
+import random
+import time
+
+import grpc
+
+# UNAVAILABLE means the connection went away before the call was handled,
+# so it is always safe to retry
+RETRYABLE = frozenset({grpc.StatusCode.UNAVAILABLE})
+
+# Set by the server's admission controller on the RESOURCE_EXHAUSTED it
+# returns when it turns a call away because it is busy
+LOAD_SHED_TRAILER = "x-load-shed"
+
+
+class Deadline:
+    """An absolute point in time that a whole operation has to finish by."""
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0.0
+
+
+class DeadlineExceeded(grpc.RpcError):
+    """Raised without calling the server when the caller's deadline is already spent."""
+
+    def code(self):
+        return grpc.StatusCode.DEADLINE_EXCEEDED
+
+    def details(self):
+        return "deadline exceeded before the call was made"
+
+
+def is_load_shed(e):
+    if e.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+        return False
+    trailers = e.trailing_metadata() if hasattr(e, "trailing_metadata") else None
+    return any(key == LOAD_SHED_TRAILER for key, _ in trailers or ())
+
+
+def is_retryable(e):
+    return e.code() in RETRYABLE or is_load_shed(e)
+
+
+def with_retry(call, timeout, deadline=None, attempts=4, base_delay=0.05, max_delay=1.0):
+    """
+    Run call(timeout) until it succeeds, fails with an error that isn't
+    retryable (see is_retryable), runs out of attempts or the deadline passes. `call` receives the timeout
+    for that attempt and must issue a fresh RPC each time (rebuild any request
+    iterator inside it). The last RpcError is re-raised.
+    """
+    for attempt in range(attempts):
+        budget = timeout if deadline is None else min(timeout, deadline.remaining())
+        if budget <= 0:
+            raise DeadlineExceeded()
+        try:
+            return call(budget)
+        except grpc.RpcError as e:
+            if not is_retryable(e) or attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if deadline is not None and delay >= deadline.remaining():
+                raise
+            time.sleep(delay)
@@ -0,0 +1,123 @@
+"""
+Opt-in per-request tracing shared by the MCP server and the KV store.
+
+A trace is a list of timed spans collected while one request runs. The
+current trace lives in a context variable, so `span()` and `record()` cost
+one lookup when nothing is being traced. A client sends its trace ID with
+each call in the `x-trace-id` metadata entry (see `metadata()`), and the
+server's TracingInterceptor traces that call under the same ID, so the
+client's and the server's log lines for one request can be joined.
+"""
+import contextlib
+import contextvars
+import json
+import random
+import secrets
+import threading
+import time
+
+TRACE_HEADER = "x-trace-id"
+
+_trace = contextvars.ContextVar("trace", default=None)
+_span = contextvars.ContextVar("span", default=None)
+
+
+class Trace:
+    """The spans of one request, as (name, parent, start, seconds, attrs) relative to its start."""
+
+    def __init__(self, name, trace_id=None):
+        self.name = name
+        self.trace_id = trace_id or secrets.token_hex(8)
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.spans = []
+        # Spans of one trace may be added from several threads
+        self.lock = threading.Lock()
+
+    def add(self, name, start, seconds, **attrs):
+        with self.lock:
+            self.spans.append((name, _span.get(), start - self.start, seconds, attrs))
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "ms": round(1000.0 * (self.seconds or 0.0), 3),
+            "spans": [
+                {"name": name, "parent": parent, "start_ms": round(1000.0 * offset, 3),
+                 "ms": round(1000.0 * seconds, 3), **attrs}
+                for name, parent, offset, seconds, attrs in self.spans
+            ],
+        }
+
+    def format(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+
+def _reset(var, token):
+    # A streaming handler's generator can be finalized from another context
+    try:
+        var.reset(token)
+    except ValueError:
+        pass
+
+
+@contextlib.contextmanager
+def trace(name, trace_id=None, sink=None, sample=1.0):
+    """
+    Trace the enclosed block. Yields the Trace, or None when this call falls
+    outside the `sample` rate (then nothing is recorded). Once the block is
+    done, the finished trace is passed to sink(trace).
+    """
+    if sample < 1.0 and random.random() >= sample:
+        yield None
+        return
+    current = Trace(name, trace_id)
+    token = _trace.set(current)
+    try:
+        yield current
+    finally:
+        _reset(_trace, token)
+        current.seconds = time.perf_counter() - current.start
+        if sink is not None:
+            sink(current)
+
+
+def current():
+    return _trace.get()
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Time the enclosed block as a span of the current trace, if there is one."""
+    current = _trace.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    token = _span.set(name)
+    try:
+        yield
+    finally:
+        _reset(_span, token)
+        current.add(name, start, time.perf_counter() - start, **attrs)
+
+
+def record(name, seconds, **attrs):
+    """Add a span that ended just now and lasted `seconds`, for code that already timed itself."""
+    current = _trace.get()
+    if current is not None:
+        current.add(name, time.perf_counter() - seconds, seconds, **attrs)
+
+
+def metadata():
+    """gRPC metadata carrying the current trace ID, or None outside a trace."""
+    current = _trace.get()
+    return ((TRACE_HEADER, current.trace_id),) if current is not None else None
+
+
+def trace_id_from(invocation_metadata):
+    for key, value in invocation_metadata or ():
+        if key == TRACE_HEADER:
+            return value
+    return None
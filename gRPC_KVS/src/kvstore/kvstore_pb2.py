@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rkvstore.proto\x12\x10\x63sci5105.kvstore\"D\n\nPutRequest\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x16\n\x0etextbook_chunk\x18\x02 \x01(\t\x12\x11\n\tembedding\x18\x03 \x01(\x0c\"\"\n\x0bPutResponse\x12\x13\n\x0boverwritten\x18\x01 \x01(\x08\"\x19\n\x17StreamEmbeddingsRequest\"0\n\x0e\x45mbeddingEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x11\n\tembedding\x18\x02 \x01(\x0c\"\x1d\n\x0eGetTextRequest\x12\x0b\n\x03key\x18\x01 \x01(\t\"8\n\x0fGetTextResponse\x12\r\n\x05\x66ound\x18\x01 \x01(\x08\x12\x16\n\x0etextbook_chunk\x18\x02 \x01(\t\"\x1c\n\rDeleteRequest\x12\x0b\n\x03key\x18\x01 \x01(\t\"!\n\x0e\x44\x65leteResponse\x12\x0f\n\x07\x64\x65leted\x18\x01 \x01(\x08\"\r\n\x0bListRequest\"\x1c\n\x0cListResponse\x12\x0c\n\x04keys\x18\x01 \x03(\t\"\x0f\n\rHealthRequest\"P\n\x0eHealthResponse\x12\x13\n\x0bserver_name\x18\x01 \x01(\t\x12\x16\n\x0eserver_version\x18\x02 \x01(\t\x12\x11\n\tkey_count\x18\x03 \x01(\x04\x32\xe7\x03\n\rKeyValueStore\x12\x42\n\x03Put\x12\x1c.csci5105.kvstore.PutRequest\x1a\x1d.csci5105.kvstore.PutResponse\x12\x61\n\x10StreamEmbeddings\x12).csci5105.kvstore.StreamEmbeddingsRequest\x1a .csci5105.kvstore.EmbeddingEntry0\x01\x12N\n\x07GetText\x12 .csci5105.kvstore.GetTextRequest\x1a!.csci5105.kvstore.GetTextResponse\x12K\n\x06\x44\x65lete\x12\x1f.csci5105.kvstore.DeleteRequest\x1a .csci5105.kvstore.DeleteResponse\x12\x45\n\x04List\x12\x1d.csci5105.kvstore.ListRequest\x1a\x1e.csci5105.kvstore.ListResponse\x12K\n\x06Health\x12\x1f.csci5105.kvstore.HealthRequest\x1a .csci5105.kvstore.HealthResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rkvstore.proto\x12\x10\x63sci5105.kvstore\"X\n\nPutRequest\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x16\n\x0etextbook_chunk\x18\x02 \x01(\t\x12\x11\n\tembedding\x18\x03 \x01(\x0c\x12\x12\n\ncollection\x18\x04 \x01(\t\"\"\n\x0bPutResponse\x12\x13\n\x0boverwritten\x18\x01 \x01(\x08\"-\n\x17StreamEmbeddingsRequest\x12\x12\n\ncollection\x18\x01 \x01(\t\"0\n\x0e\x45mbeddingEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x11\n\tembedding\x18\x02 \x01(\x0c\"1\n\x0eGetTextRequest\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x12\n\ncollection\x18\x02 \x01(\t\"8\n\x0fGetTextResponse\x12\r\n\x05\x66ound\x18\x01 \x01(\x08\x12\x16\n\x0etextbook_chunk\x18\x02 \x01(\t\"0\n\rDeleteRequest\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x12\n\ncollection\x18\x02 \x01(\t\"!\n\x0e\x44\x65leteResponse\x12\x0f\n\x07\x64\x65leted\x18\x01 \x01(\x08\"!\n\x0bListRequest\x12\x12\n\ncollection\x18\x01 \x01(\t\"\x1c\n\x0cListResponse\x12\x0c\n\x04keys\x18\x01 \x03(\t\"\x0f\n\rHealthRequest\"P\n\x0eHealthResponse\x12\x13\n\x0bserver_name\x18\x01 \x01(\t\x12\x16\n\x0eserver_version\x18\x02 \x01(\t\x12\x11\n\tkey_count\x18\x03 \x01(\x04\";\n\x15\x44\x65leteByPrefixRequest\x12\x0e\n\x06prefix\x18\x01 \x01(\t\x12\x12\n\ncollection\x18\x02 \x01(\t\"/\n\x16\x44\x65leteByPrefixResponse\x12\x15\n\rdeleted_count\x18\x01 \x01(\x04\"i\n\x16ReplaceDocumentRequest\x12\x0e\n\x06\x64oc_id\x18\x01 \x01(\t\x12+\n\x05\x63hunk\x18\x02 \x01(\x0b\x32\x1c.csci5105.kvstore.PutRequest\x12\x12\n\ncollection\x18\x03 \x01(\t\"H\n\x17ReplaceDocumentResponse\x12\x15\n\rremoved_count\x18\x01 \x01(\x04\x12\x16\n\x0einserted_count\x18\x02 \x01(\x04\"\"\n\x0cStatsRequest\x12\x12\n\ncollection\x18\x01 \x01(\t\"\xf7\x02\n\rStatsResponse\x12\x11\n\tkey_count\x18\x01 \x01(\x04\x12\x12\n\ntext_bytes\x18\x02 \x01(\x04\x12\x17\n\x0f\x65mbedding_bytes\x18\x03 \x01(\x04\x12\x13\n\x0btotal_bytes\x18\x04 \x01(\x04\x12\x11\n\tmax_bytes\x18\x05 \x01(\x04\x12\x17\n\x0f\x65viction_policy\x18\x06 \x01(\t\x12\x11\n\tevictions\x18\x07 \x01(\x04\x12\x15\n\rrejected_puts\x18\x08 \x01(\x04\x12\x18\n\x10text_compression\x18\t \x01(\t\x12\x17\n\x0ftext_cache_hits\x18\n \x01(\x04\x12\x19\n\x11text_cache_misses\x18\x0b \x01(\x04\x12\x12\n\ncollection\x18\x0c \x01(\t\x12\x11\n\tmutations\x18\r \x01(\x04\x12.\n\x06schema\x18\x0e \x01(\x0b\x32\x1e.csci5105.kvstore.VectorSchema\x12\x16\n\x0e\x63ontent_digest\x18\x0f \x01(\x0c\"\x18\n\x16ListCollectionsRequest\"1\n\x0e\x43ollectionInfo\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x11\n\tkey_count\x18\x02 \x01(\x04\"P\n\x17ListCollectionsResponse\x12\x35\n\x0b\x63ollections\x18\x01 \x03(\x0b\x32 .csci5105.kvstore.CollectionInfo\"6\n\x10GetHashesRequest\x12\x0e\n\x06prefix\x18\x01 \x01(\t\x12\x12\n\ncollection\x18\x02 \x01(\t\"$\n\x07KeyHash\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x0c\n\x04hash\x18\x02 \x01(\x0c\"<\n\x14PutIfChangedResponse\x12\x0f\n\x07\x63hanged\x18\x01 \x01(\x08\x12\x13\n\x0boverwritten\x18\x02 \x01(\x08\">\n\x0cVectorSchema\x12\x0b\n\x03\x64im\x18\x01 \x01(\r\x12\r\n\x05\x64type\x18\x02 \x01(\t\x12\x12\n\nnormalized\x18\x03 \x01(\x08\"V\n\x10SetSchemaRequest\x12\x12\n\ncollection\x18\x01 \x01(\t\x12.\n\x06schema\x18\x02 \x01(\x0b\x32\x1e.csci5105.kvstore.VectorSchema\"C\n\x11SetSchemaResponse\x12.\n\x06schema\x18\x01 \x01(\x0b\x32\x1e.csci5105.kvstore.VectorSchema\"Q\n\x0eProfileRequest\x12\x0c\n\x04mode\x18\x01 \x01(\t\x12\x0f\n\x07seconds\x18\x02 \x01(\x01\x12\x13\n\x0binterval_ms\x18\x03 \x01(\r\x12\x0b\n\x03top\x18\x04 \x01(\r\"2\n\x0fProfileResponse\x12\x0e\n\x06report\x18\x01 \x01(\t\x12\x0f\n\x07samples\x18\x02 \x01(\x04\x32\xb2\t\n\rKeyValueStore\x12\x42\n\x03Put\x12\x1c.csci5105.kvstore.PutRequest\x1a\x1d.csci5105.kvstore.PutResponse\x12\x61\n\x10StreamEmbeddings\x12).csci5105.kvstore.StreamEmbeddingsRequest\x1a .csci5105.kvstore.EmbeddingEntry0\x01\x12N\n\x07GetText\x12 .csci5105.kvstore.GetTextRequest\x1a!.csci5105.kvstore.GetTextResponse\x12K\n\x06\x44\x65lete\x12\x1f.csci5105.kvstore.DeleteRequest\x1a .csci5105.kvstore.DeleteResponse\x12\x45\n\x04List\x12\x1d.csci5105.kvstore.ListRequest\x1a\x1e.csci5105.kvstore.ListResponse\x12K\n\x06Health\x12\x1f.csci5105.kvstore.HealthRequest\x1a .csci5105.kvstore.HealthResponse\x12\x63\n\x0e\x44\x65leteByPrefix\x12\'.csci5105.kvstore.DeleteByPrefixRequest\x1a(.csci5105.kvstore.DeleteByPrefixResponse\x12h\n\x0fReplaceDocument\x12(.csci5105.kvstore.ReplaceDocumentRequest\x1a).csci5105.kvstore.ReplaceDocumentResponse(\x01\x12H\n\x05Stats\x12\x1e.csci5105.kvstore.StatsRequest\x1a\x1f.csci5105.kvstore.StatsResponse\x12\x66\n\x0fListCollections\x12(.csci5105.kvstore.ListCollectionsRequest\x1a).csci5105.kvstore.ListCollectionsResponse\x12L\n\tGetHashes\x12\".csci5105.kvstore.GetHashesRequest\x1a\x19.csci5105.kvstore.KeyHash0\x01\x12T\n\x0cPutIfChanged\x12\x1c.csci5105.kvstore.PutRequest\x1a&.csci5105.kvstore.PutIfChangedResponse\x12T\n\tSetSchema\x12\".csci5105.kvstore.SetSchemaRequest\x1a#.csci5105.kvstore.SetSchemaResponse\x12N\n\x07Profile\x12 .csci5105.kvstore.ProfileRequest\x1a!.csci5105.kvstore.ProfileResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -32,29 +32,63 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'kvstore_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_PUTREQUEST']._serialized_start=35
-  _globals['_PUTREQUEST']._serialized_end=103
-  _globals['_PUTRESPONSE']._serialized_start=105
-  _globals['_PUTRESPONSE']._serialized_end=139
-  _globals['_STREAMEMBEDDINGSREQUEST']._serialized_start=141
-  _globals['_STREAMEMBEDDINGSREQUEST']._serialized_end=166
-  _globals['_EMBEDDINGENTRY']._serialized_start=168
-  _globals['_EMBEDDINGENTRY']._serialized_end=216
-  _globals['_GETTEXTREQUEST']._serialized_start=218
-  _globals['_GETTEXTREQUEST']._serialized_end=247
-  _globals['_GETTEXTRESPONSE']._serialized_start=249
-  _globals['_GETTEXTRESPONSE']._serialized_end=305
-  _globals['_DELETEREQUEST']._serialized_start=307
-  _globals['_DELETEREQUEST']._serialized_end=335
-  _globals['_DELETERESPONSE']._serialized_start=337
-  _globals['_DELETERESPONSE']._serialized_end=370
-  _globals['_LISTREQUEST']._serialized_start=372
-  _globals['_LISTREQUEST']._serialized_end=385
-  _globals['_LISTRESPONSE']._serialized_start=387
-  _globals['_LISTRESPONSE']._serialized_end=415
-  _globals['_HEALTHREQUEST']._serialized_start=417
-  _globals['_HEALTHREQUEST']._serialized_end=432
-  _globals['_HEALTHRESPONSE']._serialized_start=434
-  _globals['_HEALTHRESPONSE']._serialized_end=514
-  _globals['_KEYVALUESTORE']._serialized_start=517
-  _globals['_KEYVALUESTORE']._serialized_end=1004
+  _globals['_PUTREQUEST']._serialized_end=123
+  _globals['_PUTRESPONSE']._serialized_start=125
+  _globals['_PUTRESPONSE']._serialized_end=159
+  _globals['_STREAMEMBEDDINGSREQUEST']._serialized_start=161
+  _globals['_STREAMEMBEDDINGSREQUEST']._serialized_end=206
+  _globals['_EMBEDDINGENTRY']._serialized_start=208
+  _globals['_EMBEDDINGENTRY']._serialized_end=256
+  _globals['_GETTEXTREQUEST']._serialized_start=258
+  _globals['_GETTEXTREQUEST']._serialized_end=307
+  _globals['_GETTEXTRESPONSE']._serialized_start=309
+  _globals['_GETTEXTRESPONSE']._serialized_end=365
+  _globals['_DELETEREQUEST']._serialized_start=367
+  _globals['_DELETEREQUEST']._serialized_end=415
+  _globals['_DELETERESPONSE']._serialized_start=417
+  _globals['_DELETERESPONSE']._serialized_end=450
+  _globals['_LISTREQUEST']._serialized_start=452
+  _globals['_LISTREQUEST']._serialized_end=485
+  _globals['_LISTRESPONSE']._serialized_start=487
+  _globals['_LISTRESPONSE']._serialized_end=515
+  _globals['_HEALTHREQUEST']._serialized_start=517
+  _globals['_HEALTHREQUEST']._serialized_end=532
+  _globals['_HEALTHRESPONSE']._serialized_start=534
+  _globals['_HEALTHRESPONSE']._serialized_end=614
+  _globals['_DELETEBYPREFIXREQUEST']._serialized_start=616
+  _globals['_DELETEBYPREFIXREQUEST']._serialized_end=675
+  _globals['_DELETEBYPREFIXRESPONSE']._serialized_start=677
+  _globals['_DELETEBYPREFIXRESPONSE']._serialized_end=724
+  _globals['_REPLACEDOCUMENTREQUEST']._serialized_start=726
+  _globals['_REPLACEDOCUMENTREQUEST']._serialized_end=831
+  _globals['_REPLACEDOCUMENTRESPONSE']._serialized_start=833
+  _globals['_REPLACEDOCUMENTRESPONSE']._serialized_end=905
+  _globals['_STATSREQUEST']._serialized_start=907
+  _globals['_STATSREQUEST']._serialized_end=941
+  _globals['_STATSRESPONSE']._serialized_start=944
+  _globals['_STATSRESPONSE']._serialized_end=1319
+  _globals['_LISTCOLLECTIONSREQUEST']._serialized_start=1321
+  _globals['_LISTCOLLECTIONSREQUEST']._serialized_end=1345
+  _globals['_COLLECTIONINFO']._serialized_start=1347
+  _globals['_COLLECTIONINFO']._serialized_end=1396
+  _globals['_LISTCOLLECTIONSRESPONSE']._serialized_start=1398
+  _globals['_LISTCOLLECTIONSRESPONSE']._serialized_end=1478
+  _globals['_GETHASHESREQUEST']._serialized_start=1480
+  _globals['_GETHASHESREQUEST']._serialized_end=1534
+  _globals['_KEYHASH']._serialized_start=1536
+  _globals['_KEYHASH']._serialized_end=1572
+  _globals['_PUTIFCHANGEDRESPONSE']._serialized_start=1574
+  _globals['_PUTIFCHANGEDRESPONSE']._serialized_end=1634
+  _globals['_VECTORSCHEMA']._serialized_start=1636
+  _globals['_VECTORSCHEMA']._serialized_end=1698
+  _globals['_SETSCHEMAREQUEST']._serialized_start=1700
+  _globals['_SETSCHEMAREQUEST']._serialized_end=1786
+  _globals['_SETSCHEMARESPONSE']._serialized_start=1788
+  _globals['_SETSCHEMARESPONSE']._serialized_end=1855
+  _globals['_PROFILEREQUEST']._serialized_start=1857
+  _globals['_PROFILEREQUEST']._serialized_end=1938
+  _globals['_PROFILERESPONSE']._serialized_start=1940
+  _globals['_PROFILERESPONSE']._serialized_end=1990
+  _globals['_KEYVALUESTORE']._serialized_start=1993
+  _globals['_KEYVALUESTORE']._serialized_end=3195
 # @@protoc_insertion_point(module_scope)
@@ -1,20 +1,22 @@
 from google.protobuf.internal import containers as _containers
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from collections.abc import Iterable as _Iterable
-from typing import ClassVar as _ClassVar, Optional as _Optional
+from collections.abc import Iterable as _Iterable, Mapping as _Mapping
+from typing import ClassVar as _ClassVar, Optional as _Optional, Union as _Union
 
 DESCRIPTOR: _descriptor.FileDescriptor
 
 class PutRequest(_message.Message):
-    __slots__ = ("key", "textbook_chunk", "embedding")
+    __slots__ = ("key", "textbook_chunk", "embedding", "collection")
     KEY_FIELD_NUMBER: _ClassVar[int]
     TEXTBOOK_CHUNK_FIELD_NUMBER: _ClassVar[int]
     EMBEDDING_FIELD_NUMBER: _ClassVar[int]
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
     key: str
     textbook_chunk: str
     embedding: bytes
-    def __init__(self, key: _Optional[str] = ..., textbook_chunk: _Optional[str] = ..., embedding: _Optional[bytes] = ...) -> None: ...
+    collection: str
+    def __init__(self, key: _Optional[str] = ..., textbook_chunk: _Optional[str] = ..., embedding: _Optional[bytes] = ..., collection: _Optional[str] = ...) -> None: ...
 
 class PutResponse(_message.Message):
     __slots__ = ("overwritten",)
@@ -23,8 +25,10 @@ class PutResponse(_message.Message):
     def __init__(self, overwritten: bool = ...) -> None: ...
 
 class StreamEmbeddingsRequest(_message.Message):
-    __slots__ = ()
-    def __init__(self) -> None: ...
+    __slots__ = ("collection",)
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
+    collection: str
+    def __init__(self, collection: _Optional[str] = ...) -> None: ...
 
 class EmbeddingEntry(_message.Message):
     __slots__ = ("key", "embedding")
@@ -35,10 +39,12 @@ class EmbeddingEntry(_message.Message):
     def __init__(self, key: _Optional[str] = ..., embedding: _Optional[bytes] = ...) -> None: ...
 
 class GetTextRequest(_message.Message):
-    __slots__ = ("key",)
+    __slots__ = ("key", "collection")
     KEY_FIELD_NUMBER: _ClassVar[int]
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
     key: str
-    def __init__(self, key: _Optional[str] = ...) -> None: ...
+    collection: str
+    def __init__(self, key: _Optional[str] = ..., collection: _Optional[str] = ...) -> None: ...
 
 class GetTextResponse(_message.Message):
     __slots__ = ("found", "textbook_chunk")
@@ -49,10 +55,12 @@ class GetTextResponse(_message.Message):
     def __init__(self, found: bool = ..., textbook_chunk: _Optional[str] = ...) -> None: ...
 
 class DeleteRequest(_message.Message):
-    __slots__ = ("key",)
+    __slots__ = ("key", "collection")
     KEY_FIELD_NUMBER: _ClassVar[int]
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
     key: str
-    def __init__(self, key: _Optional[str] = ...) -> None: ...
+    collection: str
+    def __init__(self, key: _Optional[str] = ..., collection: _Optional[str] = ...) -> None: ...
 
 class DeleteResponse(_message.Message):
     __slots__ = ("deleted",)
@@ -61,8 +69,10 @@ class DeleteResponse(_message.Message):
     def __init__(self, deleted: bool = ...) -> None: ...
 
 class ListRequest(_message.Message):
-    __slots__ = ()
-    def __init__(self) -> None: ...
+    __slots__ = ("collection",)
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
+    collection: str
+    def __init__(self, collection: _Optional[str] = ...) -> None: ...
 
 class ListResponse(_message.Message):
     __slots__ = ("keys",)
@@ -83,3 +93,161 @@ class HealthResponse(_message.Message):
     server_version: str
     key_count: int
     def __init__(self, server_name: _Optional[str] = ..., server_version: _Optional[str] = ..., key_count: _Optional[int] = ...) -> None: ...
+
+class DeleteByPrefixRequest(_message.Message):
+    __slots__ = ("prefix", "collection")
+    PREFIX_FIELD_NUMBER: _ClassVar[int]
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
+    prefix: str
+    collection: str
+    def __init__(self, prefix: _Optional[str] = ..., collection: _Optional[str] = ...) -> None: ...
+
+class DeleteByPrefixResponse(_message.Message):
+    __slots__ = ("deleted_count",)
+    DELETED_COUNT_FIELD_NUMBER: _ClassVar[int]
+    deleted_count: int
+    def __init__(self, deleted_count: _Optional[int] = ...) -> None: ...
+
+class ReplaceDocumentRequest(_message.Message):
+    __slots__ = ("doc_id", "chunk", "collection")
+    DOC_ID_FIELD_NUMBER: _ClassVar[int]
+    CHUNK_FIELD_NUMBER: _ClassVar[int]
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
+    doc_id: str
+    chunk: PutRequest
+    collection: str
+    def __init__(self, doc_id: _Optional[str] = ..., chunk: _Optional[_Union[PutRequest, _Mapping]] = ..., collection: _Optional[str] = ...) -> None: ...
+
+class ReplaceDocumentResponse(_message.Message):
+    __slots__ = ("removed_count", "inserted_count")
+    REMOVED_COUNT_FIELD_NUMBER: _ClassVar[int]
+    INSERTED_COUNT_FIELD_NUMBER: _ClassVar[int]
+    removed_count: int
+    inserted_count: int
+    def __init__(self, removed_count: _Optional[int] = ..., inserted_count: _Optional[int] = ...) -> None: ...
+
+class StatsRequest(_message.Message):
+    __slots__ = ("collection",)
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
+    collection: str
+    def __init__(self, collection: _Optional[str] = ...) -> None: ...
+
+class StatsResponse(_message.Message):
+    __slots__ = ("key_count", "text_bytes", "embedding_bytes", "total_bytes", "max_bytes", "eviction_policy", "evictions", "rejected_puts", "text_compression", "text_cache_hits", "text_cache_misses", "collection", "mutations", "schema", "content_digest")
+    KEY_COUNT_FIELD_NUMBER: _ClassVar[int]
+    TEXT_BYTES_FIELD_NUMBER: _ClassVar[int]
+    EMBEDDING_BYTES_FIELD_NUMBER: _ClassVar[int]
+    TOTAL_BYTES_FIELD_NUMBER: _ClassVar[int]
+    MAX_BYTES_FIELD_NUMBER: _ClassVar[int]
+    EVICTION_POLICY_FIELD_NUMBER: _ClassVar[int]
+    EVICTIONS_FIELD_NUMBER: _ClassVar[int]
+    REJECTED_PUTS_FIELD_NUMBER: _ClassVar[int]
+    TEXT_COMPRESSION_FIELD_NUMBER: _ClassVar[int]
+    TEXT_CACHE_HITS_FIELD_NUMBER: _ClassVar[int]
+    TEXT_CACHE_MISSES_FIELD_NUMBER: _ClassVar[int]
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
+    MUTATIONS_FIELD_NUMBER: _ClassVar[int]
+    SCHEMA_FIELD_NUMBER: _ClassVar[int]
+    CONTENT_DIGEST_FIELD_NUMBER: _ClassVar[int]
+    key_count: int
+    text_bytes: int
+    embedding_bytes: int
+    total_bytes: int
+    max_bytes: int
+    eviction_policy: str
+    evictions: int
+    rejected_puts: int
+    text_compression: str
+    text_cache_hits: int
+    text_cache_misses: int
+    collection: str
+    mutations: int
+    schema: VectorSchema
+    content_digest: bytes
+    def __init__(self, key_count: _Optional[int] = ..., text_bytes: _Optional[int] = ..., embedding_bytes: _Optional[int] = ..., total_bytes: _Optional[int] = ..., max_bytes: _Optional[int] = ..., eviction_policy: _Optional[str] = ..., evictions: _Optional[int] = ..., rejected_puts: _Optional[int] = ..., text_compression: _Optional[str] = ..., text_cache_hits: _Optional[int] = ..., text_cache_misses: _Optional[int] = ..., collection: _Optional[str] = ..., mutations: _Optional[int] = ..., schema: _Optional[_Union[VectorSchema, _Mapping]] = ..., content_digest: _Optional[bytes] = ...) -> None: ...
+
+class ListCollectionsRequest(_message.Message):
+    __slots__ = ()
+    def __init__(self) -> None: ...
+
+class CollectionInfo(_message.Message):
+    __slots__ = ("name", "key_count")
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    KEY_COUNT_FIELD_NUMBER: _ClassVar[int]
+    name: str
+    key_count: int
+    def __init__(self, name: _Optional[str] = ..., key_count: _Optional[int] = ...) -> None: ...
+
+class ListCollectionsResponse(_message.Message):
+    __slots__ = ("collections",)
+    COLLECTIONS_FIELD_NUMBER: _ClassVar[int]
+    collections: _containers.RepeatedCompositeFieldContainer[CollectionInfo]
+    def __init__(self, collections: _Optional[_Iterable[_Union[CollectionInfo, _Mapping]]] = ...) -> None: ...
+
+class GetHashesRequest(_message.Message):
+    __slots__ = ("prefix", "collection")
+    PREFIX_FIELD_NUMBER: _ClassVar[int]
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
+    prefix: str
+    collection: str
+    def __init__(self, prefix: _Optional[str] = ..., collection: _Optional[str] = ...) -> None: ...
+
+class KeyHash(_message.Message):
+    __slots__ = ("key", "hash")
+    KEY_FIELD_NUMBER: _ClassVar[int]
+    HASH_FIELD_NUMBER: _ClassVar[int]
+    key: str
+    hash: bytes
+    def __init__(self, key: _Optional[str] = ..., hash: _Optional[bytes] = ...) -> None: ...
+
+class PutIfChangedResponse(_message.Message):
+    __slots__ = ("changed", "overwritten")
+    CHANGED_FIELD_NUMBER: _ClassVar[int]
+    OVERWRITTEN_FIELD_NUMBER: _ClassVar[int]
+    changed: bool
+    overwritten: bool
+    def __init__(self, changed: bool = ..., overwritten: bool = ...) -> None: ...
+
+class VectorSchema(_message.Message):
+    __slots__ = ("dim", "dtype", "normalized")
+    DIM_FIELD_NUMBER: _ClassVar[int]
+    DTYPE_FIELD_NUMBER: _ClassVar[int]
+    NORMALIZED_FIELD_NUMBER: _ClassVar[int]
+    dim: int
+    dtype: str
+    normalized: bool
+    def __init__(self, dim: _Optional[int] = ..., dtype: _Optional[str] = ..., normalized: bool = ...) -> None: ...
+
+class SetSchemaRequest(_message.Message):
+    __slots__ = ("collection", "schema")
+    COLLECTION_FIELD_NUMBER: _ClassVar[int]
+    SCHEMA_FIELD_NUMBER: _ClassVar[int]
+    collection: str
+    schema: VectorSchema
+    def __init__(self, collection: _Optional[str] = ..., schema: _Optional[_Union[VectorSchema, _Mapping]] = ...) -> None: ...
+
+class SetSchemaResponse(_message.Message):
+    __slots__ = ("schema",)
+    SCHEMA_FIELD_NUMBER: _ClassVar[int]
+    schema: VectorSchema
+    def __init__(self, schema: _Optional[_Union[VectorSchema, _Mapping]] = ...) -> None: ...
+
+class ProfileRequest(_message.Message):
+    __slots__ = ("mode", "seconds", "interval_ms", "top")
+    MODE_FIELD_NUMBER: _ClassVar[int]
+    SECONDS_FIELD_NUMBER: _ClassVar[int]
+    INTERVAL_MS_FIELD_NUMBER: _ClassVar[int]
+    TOP_FIELD_NUMBER: _ClassVar[int]
+    mode: str
+    seconds: float
+    interval_ms: int
+    top: int
+    def __init__(self, mode: _Optional[str] = ..., seconds: _Optional[float] = ..., interval_ms: _Optional[int] = ..., top: _Optional[int] = ...) -> None: ...
+
+class ProfileResponse(_message.Message):
+    __slots__ = ("report", "samples")
+    REPORT_FIELD_NUMBER: _ClassVar[int]
+    SAMPLES_FIELD_NUMBER: _ClassVar[int]
+    report: str
+    samples: int
+    def __init__(self, report: _Optional[str] = ..., samples: _Optional[int] = ...) -> None: ...
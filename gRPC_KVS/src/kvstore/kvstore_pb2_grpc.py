@@ -26,7 +26,11 @@ if _version_not_supported:
 
 
 class KeyValueStoreStub(object):
-    """Missing associated documentation comment in .proto file."""
+    """Every keyed request carries an optional `collection`. Each collection is an
+    independent corpus with its own keys, accounting and persistence file; an
+    empty name means the "default" collection.
+
+    """
 
     def __init__(self, channel):
         """Constructor.
@@ -64,10 +68,54 @@ class KeyValueStoreStub(object):
                 request_serializer=kvstore__pb2.HealthRequest.SerializeToString,
                 response_deserializer=kvstore__pb2.HealthResponse.FromString,
                 _registered_method=True)
+        self.DeleteByPrefix = channel.unary_unary(
+                '/csci5105.kvstore.KeyValueStore/DeleteByPrefix',
+                request_serializer=kvstore__pb2.DeleteByPrefixRequest.SerializeToString,
+                response_deserializer=kvstore__pb2.DeleteByPrefixResponse.FromString,
+                _registered_method=True)
+        self.ReplaceDocument = channel.stream_unary(
+                '/csci5105.kvstore.KeyValueStore/ReplaceDocument',
+                request_serializer=kvstore__pb2.ReplaceDocumentRequest.SerializeToString,
+                response_deserializer=kvstore__pb2.ReplaceDocumentResponse.FromString,
+                _registered_method=True)
+        self.Stats = channel.unary_unary(
+                '/csci5105.kvstore.KeyValueStore/Stats',
+                request_serializer=kvstore__pb2.StatsRequest.SerializeToString,
+                response_deserializer=kvstore__pb2.StatsResponse.FromString,
+                _registered_method=True)
+        self.ListCollections = channel.unary_unary(
+                '/csci5105.kvstore.KeyValueStore/ListCollections',
+                request_serializer=kvstore__pb2.ListCollectionsRequest.SerializeToString,
+                response_deserializer=kvstore__pb2.ListCollectionsResponse.FromString,
+                _registered_method=True)
+        self.GetHashes = channel.unary_stream(
+                '/csci5105.kvstore.KeyValueStore/GetHashes',
+                request_serializer=kvstore__pb2.GetHashesRequest.SerializeToString,
+                response_deserializer=kvstore__pb2.KeyHash.FromString,
+                _registered_method=True)
+        self.PutIfChanged = channel.unary_unary(
+                '/csci5105.kvstore.KeyValueStore/PutIfChanged',
+                request_serializer=kvstore__pb2.PutRequest.SerializeToString,
+                response_deserializer=kvstore__pb2.PutIfChangedResponse.FromString,
+                _registered_method=True)
+        self.SetSchema = channel.unary_unary(
+                '/csci5105.kvstore.KeyValueStore/SetSchema',
+                request_serializer=kvstore__pb2.SetSchemaRequest.SerializeToString,
+                response_deserializer=kvstore__pb2.SetSchemaResponse.FromString,
+                _registered_method=True)
+        self.Profile = channel.unary_unary(
+                '/csci5105.kvstore.KeyValueStore/Profile',
+                request_serializer=kvstore__pb2.ProfileRequest.SerializeToString,
+                response_deserializer=kvstore__pb2.ProfileResponse.FromString,
+                _registered_method=True)
 
 
 class KeyValueStoreServicer(object):
-    """Missing associated documentation comment in .proto file."""
+    """Every keyed request carries an optional `collection`. Each collection is an
+    independent corpus with its own keys, accounting and persistence file; an
+    empty name means the "default" collection.
+
+    """
 
     def Put(self, request, context):
         """Missing associated documentation comment in .proto file."""
@@ -105,6 +153,60 @@ class KeyValueStoreServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def DeleteByPrefix(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ReplaceDocument(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Stats(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListCollections(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetHashes(self, request, context):
+        """Content hashes for incremental sync: fetch what the server has, then
+        send only what differs. PutIfChanged skips the write when the stored
+        text and embedding already hash the same
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def PutIfChanged(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SetSchema(self, request, context):
+        """Declare the shape of a collection's embeddings. Every later write is
+        validated against it, and the vectors are kept in one contiguous matrix
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Profile(self, request, context):
+        """Admin: profile the running server for a few seconds and return a report
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_KeyValueStoreServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -138,6 +240,46 @@ def add_KeyValueStoreServicer_to_server(servicer, server):
                     request_deserializer=kvstore__pb2.HealthRequest.FromString,
                     response_serializer=kvstore__pb2.HealthResponse.SerializeToString,
             ),
+            'DeleteByPrefix': grpc.unary_unary_rpc_method_handler(
+                    servicer.DeleteByPrefix,
+                    request_deserializer=kvstore__pb2.DeleteByPrefixRequest.FromString,
+                    response_serializer=kvstore__pb2.DeleteByPrefixResponse.SerializeToString,
+            ),
+            'ReplaceDocument': grpc.stream_unary_rpc_method_handler(
+                    servicer.ReplaceDocument,
+                    request_deserializer=kvstore__pb2.ReplaceDocumentRequest.FromString,
+                    response_serializer=kvstore__pb2.ReplaceDocumentResponse.SerializeToString,
+            ),
+            'Stats': grpc.unary_unary_rpc_method_handler(
+                    servicer.Stats,
+                    request_deserializer=kvstore__pb2.StatsRequest.FromString,
+                    response_serializer=kvstore__pb2.StatsResponse.SerializeToString,
+            ),
+            'ListCollections': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListCollections,
+                    request_deserializer=kvstore__pb2.ListCollectionsRequest.FromString,
+                    response_serializer=kvstore__pb2.ListCollectionsResponse.SerializeToString,
+            ),
+            'GetHashes': grpc.unary_stream_rpc_method_handler(
+                    servicer.GetHashes,
+                    request_deserializer=kvstore__pb2.GetHashesRequest.FromString,
+                    response_serializer=kvstore__pb2.KeyHash.SerializeToString,
+            ),
+            'PutIfChanged': grpc.unary_unary_rpc_method_handler(
+                    servicer.PutIfChanged,
+                    request_deserializer=kvstore__pb2.PutRequest.FromString,
+                    response_serializer=kvstore__pb2.PutIfChangedResponse.SerializeToString,
+            ),
+            'SetSchema': grpc.unary_unary_rpc_method_handler(
+                    servicer.SetSchema,
+                    request_deserializer=kvstore__pb2.SetSchemaRequest.FromString,
+                    response_serializer=kvstore__pb2.SetSchemaResponse.SerializeToString,
+            ),
+            'Profile': grpc.unary_unary_rpc_method_handler(
+                    servicer.Profile,
+                    request_deserializer=kvstore__pb2.ProfileRequest.FromString,
+                    response_serializer=kvstore__pb2.ProfileResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'csci5105.kvstore.KeyValueStore', rpc_method_handlers)
@@ -147,7 +289,11 @@ def add_KeyValueStoreServicer_to_server(servicer, server):
 
  # This class is part of an EXPERIMENTAL API.
 class KeyValueStore(object):
-    """Missing associated documentation comment in .proto file."""
+    """Every keyed request carries an optional `collection`. Each collection is an
+    independent corpus with its own keys, accounting and persistence file; an
+    empty name means the "default" collection.
+
+    """
 
     @staticmethod
     def Put(request,
@@ -310,3 +456,219 @@ class KeyValueStore(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def DeleteByPrefix(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/csci5105.kvstore.KeyValueStore/DeleteByPrefix',
+            kvstore__pb2.DeleteByPrefixRequest.SerializeToString,
+            kvstore__pb2.DeleteByPrefixResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ReplaceDocument(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/csci5105.kvstore.KeyValueStore/ReplaceDocument',
+            kvstore__pb2.ReplaceDocumentRequest.SerializeToString,
+            kvstore__pb2.ReplaceDocumentResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Stats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/csci5105.kvstore.KeyValueStore/Stats',
+            kvstore__pb2.StatsRequest.SerializeToString,
+            kvstore__pb2.StatsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListCollections(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/csci5105.kvstore.KeyValueStore/ListCollections',
+            kvstore__pb2.ListCollectionsRequest.SerializeToString,
+            kvstore__pb2.ListCollectionsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetHashes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/csci5105.kvstore.KeyValueStore/GetHashes',
+            kvstore__pb2.GetHashesRequest.SerializeToString,
+            kvstore__pb2.KeyHash.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def PutIfChanged(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/csci5105.kvstore.KeyValueStore/PutIfChanged',
+            kvstore__pb2.PutRequest.SerializeToString,
+            kvstore__pb2.PutIfChangedResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SetSchema(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/csci5105.kvstore.KeyValueStore/SetSchema',
+            kvstore__pb2.SetSchemaRequest.SerializeToString,
+            kvstore__pb2.SetSchemaResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Profile(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/csci5105.kvstore.KeyValueStore/Profile',
+            kvstore__pb2.ProfileRequest.SerializeToString,
+            kvstore__pb2.ProfileResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
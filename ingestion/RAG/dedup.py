@@ -0,0 +1,136 @@
+"""
+Ingest-time removal of duplicate and near-duplicate chunks: repeated headers,
+footers, copyright blocks and other boilerplate that would otherwise be
+stored, scanned on every query and crowd out real top_k results.
+
+Passes run cheapest first, and the first occurrence of a chunk always wins:
+  1. exact     - hash of the case/whitespace-normalized text
+  2. near      - MinHash signatures over word shingles, bucketed with LSH,
+                 candidates confirmed by their estimated Jaccard similarity
+  3. embedding - cosine similarity of the (normalized) chunk embeddings,
+                 run after encoding
+"""
+from dataclasses import dataclass, field
+import hashlib
+import re
+import zlib
+import numpy as np
+
+WORD = re.compile(r"\w+")
+
+SHINGLE_WORDS = 5
+NUM_PERM = 64
+LSH_BANDS = 16          # 16 bands x 4 rows: pairs above ~0.5 Jaccard collide at least once
+
+@dataclass
+class DedupReport:
+    total: int = 0
+    exact: int = 0
+    near: int = 0
+    embedding: int = 0
+    bytes_removed: int = 0
+    removed_ids: list[str] = field(default_factory=list)
+
+    @property
+    def removed(self) -> int:
+        return self.exact + self.near + self.embedding
+
+    def summary(self) -> str:
+        pct = 100.0 * self.removed / self.total if self.total else 0.0
+        return (f"dedup: removed {self.removed}/{self.total} chunks ({pct:.1f}%, "
+                f"{self.bytes_removed} bytes): {self.exact} exact, {self.near} near, "
+                f"{self.embedding} by embedding")
+
+def _normalize(text: str) -> str:
+    return " ".join(WORD.findall(text.lower()))
+
+def _hash_params(num_perm: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    # Multiply-shift hashing: h(x) = ((a*x + b) mod 2^64) >> 32, a odd
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+    return a, b
+
+def minhash_signature(normalized: str, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    words = normalized.split()
+    n = max(1, len(words) - SHINGLE_WORDS + 1)
+    shingles = np.fromiter(
+        (zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode()) for i in range(n)),
+        dtype=np.uint64, count=n)
+    # (shingles, perms) hash matrix; uint64 arithmetic wraps, which is the "mod 2^64"
+    hashed = (shingles[:, None] * a[None, :] + b[None, :]) >> np.uint64(32)
+    return hashed.min(axis=0)
+
+def dedup_chunks(chunks: list, threshold: float = 0.85, seed: int = 0) -> tuple[list, DedupReport]:
+    """
+    Drop exact and near-duplicate chunks (estimated Jaccard >= threshold over
+    word shingles). `chunks` only need a `.text` and a `.chunk_id`.
+    """
+    report = DedupReport(total=len(chunks))
+    a, b = _hash_params(NUM_PERM, seed)
+    rows = NUM_PERM // LSH_BANDS
+
+    seen_exact: set[bytes] = set()
+    buckets: dict[tuple[int, bytes], list[int]] = {}
+    signatures: list[np.ndarray] = []   # signatures of the kept chunks
+    kept = []
+
+    for chunk in chunks:
+        normalized = _normalize(chunk.text)
+
+        digest = hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+        if digest in seen_exact:
+            report.exact += 1
+            report.bytes_removed += len(chunk.text.encode("utf-8"))
+            report.removed_ids.append(chunk.chunk_id)
+            continue
+
+        sig = minhash_signature(normalized, a, b)
+        bands = [(band, sig[band * rows:(band + 1) * rows].tobytes()) for band in range(LSH_BANDS)]
+
+        candidates = {j for key in bands for j in buckets.get(key, ())}
+        if any(np.mean(signatures[j] == sig) >= threshold for j in candidates):
+            report.near += 1
+            report.bytes_removed += len(chunk.text.encode("utf-8"))
+            report.removed_ids.append(chunk.chunk_id)
+            continue
+
+        seen_exact.add(digest)
+        for key in bands:
+            buckets.setdefault(key, []).append(len(kept))
+        signatures.append(sig)
+        kept.append(chunk)
+
+    return kept, report
+
+def dedup_embeddings(vectors: np.ndarray, threshold: float = 0.98, block: int = 1024) -> np.ndarray:
+    """
+    Boolean keep-mask over unit-norm row vectors: a row is dropped when its
+    cosine similarity to any earlier *kept* row is >= threshold, like the
+    MinHash pass, so near-duplicates don't chain (a~b, b~c drops only b
+    when a and c differ). Computed in blocks of rows so memory stays
+    O(block * N).
+    """
+    v = np.asarray(vectors, dtype=np.float32)
+    n = v.shape[0]
+    keep = np.ones(n, dtype=bool)
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        rows = v[start:stop]
+
+        # Rows before the block are settled: compare against the kept ones at once
+        dup = np.zeros(stop - start, dtype=bool)
+        if start:
+            sims = rows @ v[:start].T
+            sims[:, ~keep[:start]] = -np.inf
+            dup = sims.max(axis=1) >= threshold
+
+        # Inside the block, whether a row is kept depends on the rows before
+        # it, so walk them in order against the block's kept rows so far
+        inner = rows @ rows.T
+        for i in range(stop - start):
+            if not dup[i]:
+                earlier = inner[i, :i][keep[start:start + i]]
+                dup[i] = earlier.size > 0 and earlier.max() >= threshold
+            keep[start + i] = not dup[i]
+    return keep
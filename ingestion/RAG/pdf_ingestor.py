@@ -1,24 +1,39 @@
+from __future__ import annotations
 from pathlib import Path
 import argparse
 import time
-from sentence_transformers import SentenceTransformer
-from transformers import logging
 from dataclasses import dataclass
 import re
 import json
-from pypdf import PdfReader
+from typing import TYPE_CHECKING
+import numpy as np
+
+import dedup
+
+# sentence_transformers/transformers (torch) and pypdf are imported where they
+# are first needed, so `--help` and the pure-text helpers don't pay for them
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 # Hardcoded for simplicity since we are using devcontainers
 OUTPUT_FOLDER = Path("/workspaces/project_1/ingestion/RAG/output")
 
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Sentence ends (., ! or ? followed by whitespace) and paragraph breaks
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n+")
+
 @dataclass
 class Chunk:
     chunk_id: str
     text: str
     page_start: int
     page_end: int
+    char_start: int = 0     # offsets of the chunk in the full document text
+    char_end: int = 0
 
 def pdf_to_text(pdf_path: Path) -> str:
+    from pypdf import PdfReader
     reader = PdfReader(pdf_path)
     texts: list[str] = []
     for page in reader.pages:
@@ -70,11 +85,93 @@ def chunk_paragraphs(
 
     return chunks
 
-def chunks_to_jsonl(chunks : list[Chunk], out_file : Path):
+def sentence_spans(text: str) -> np.ndarray:
+    # (S, 2) array of [start, end) character offsets of the sentences in text.
+    # Spans may carry leading/trailing whitespace, which holds no tokens
+    cuts = [(m.start(), m.end()) for m in SENTENCE_BOUNDARY.finditer(text)]
+    starts = np.fromiter((0, *(end for _, end in cuts)), dtype=np.int64, count=len(cuts) + 1)
+    ends = np.fromiter((*(start for start, _ in cuts), len(text)), dtype=np.int64, count=len(cuts) + 1)
+    return np.stack([starts, ends], axis=1)
+
+def chunk_by_tokens(
+    text: str,
+    doc_id: str,
+    tokenizer,
+    max_tokens: int = 254,
+    overlap_sentences: int = 1,
+) -> list[Chunk]:
+    """
+    Pack whole sentences into chunks of at most max_tokens model tokens.
+
+    The document is tokenized once, and every sentence is mapped to its
+    token range through the tokenizer's offset mapping. Chunks are therefore
+    computed as offsets into `text`, and a substring is only cut once per
+    finished chunk. Consecutive chunks share their last/first
+    `overlap_sentences` sentences. A sentence longer than max_tokens is split
+    on token boundaries, so no text is lost to the model's truncation.
+    """
+    enc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                    return_attention_mask=False, return_token_type_ids=False, verbose=False)
+    offsets = np.asarray(enc["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+    if len(offsets) == 0:
+        return []
+    tok_start, tok_end = offsets[:, 0], offsets[:, 1]
+
+    # Token range [lo, hi) of every sentence; whitespace never holds tokens,
+    # so together the ranges cover every token exactly once
+    spans = sentence_spans(text)
+    lo = np.searchsorted(tok_start, spans[:, 0], side="left")
+    hi = np.searchsorted(tok_start, spans[:, 1], side="left")
+    keep = hi > lo
+    lo, hi = lo[keep], hi[keep]
+
+    # Split overlong sentences into max_tokens pieces
+    n_pieces = -(-(hi - lo) // max_tokens)
+    unit_lo = np.repeat(lo, n_pieces) + max_tokens * (
+        np.arange(n_pieces.sum()) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces))
+    unit_hi = np.minimum(unit_lo + max_tokens, np.repeat(hi, n_pieces))
+
+    # Greedy packing: with a running token total, the end of the chunk that
+    # starts at unit i is one binary search away
+    cum = np.concatenate([[0], np.cumsum(unit_hi - unit_lo)])
+
+    def end_of(i):
+        return int(np.searchsorted(cum, cum[i] + max_tokens, side="right")) - 1
+
+    chunks: list[Chunk] = []
+    i = 0
+    while i < len(unit_lo):
+        j = end_of(i)
+        char_start = int(tok_start[unit_lo[i]])
+        char_end = int(tok_end[unit_hi[j - 1] - 1])
+        chunks.append(Chunk(chunk_id=f"{doc_id}:{len(chunks)}", text=text[char_start:char_end],
+                            page_start=1, page_end=1, char_start=char_start, char_end=char_end))
+        if j >= len(unit_lo):
+            break
+        # Overlap as many sentences as still leave room for unit j. A chunk
+        # that can't reach past j would only repeat text this one holds
+        nxt = j
+        for k in range(overlap_sentences, 0, -1):
+            if j - k > i and end_of(j - k) > j:
+                nxt = j - k
+                break
+        i = nxt
+
+    return chunks
 
+def load_model() -> SentenceTransformer:
+    from sentence_transformers import SentenceTransformer
+    from transformers import logging
     logging.set_verbosity_error()
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    vectors = model.encode([c.text for c in chunks], normalize_embeddings=True)
+    return SentenceTransformer(MODEL_NAME)
+
+def chunks_to_jsonl(chunks : list[Chunk], out_file : Path, model : SentenceTransformer = None,
+                    vectors : np.ndarray = None):
+
+    if vectors is None:
+        if model is None:
+            model = load_model()
+        vectors = model.encode([c.text for c in chunks], normalize_embeddings=True)
 
     with out_file.open("w", encoding="utf-8") as f:
         for c, v in zip(chunks, vectors):
@@ -90,6 +187,16 @@ def chunks_to_jsonl(chunks : list[Chunk], out_file : Path):
 def main():
     parser = argparse.ArgumentParser(description="Convert PDF to text")
     parser.add_argument("--input_pdf", type=str, required=True, help="Path to input PDF file")
+    parser.add_argument("--chunker", choices=["tokens", "chars"], default="tokens",
+                        help="Size chunks by model tokens (default) or by characters (legacy)")
+    parser.add_argument("--overlap_sentences", type=int, default=1,
+                        help="Sentences shared by consecutive chunks (token chunker only)")
+    parser.add_argument("--no_dedup", action="store_true",
+                        help="Keep duplicate and near-duplicate chunks")
+    parser.add_argument("--dedup_threshold", type=float, default=0.85,
+                        help="Estimated Jaccard similarity (word shingles) above which a chunk is a near duplicate")
+    parser.add_argument("--dedup_embedding_threshold", type=float, default=0.98,
+                        help="Cosine similarity above which a chunk's embedding counts as a duplicate (0 disables)")
     args = parser.parse_args()
 
     input_pdf = Path(args.input_pdf)
@@ -102,16 +209,50 @@ def main():
     pdf_text : str = pdf_to_text(input_pdf)
     print(f"pdf_to_text(): {time.perf_counter() - start:.3f} sec")
 
-    # (2) Split the text into paragraphs which is returned as a list of strings
-    paragraphs : list[str] = split_into_paragraphs(pdf_text)
+    model = load_model()
 
-    # (3) Chunk the paragraphs into RAG sized pieces
-    chunks : list[Chunk] = chunk_paragraphs(paragraphs, doc_id=input_pdf.stem)
+    start = time.perf_counter()
+    if args.chunker == "tokens":
+        # (2+3) Pack sentences into chunks that fill, but never exceed, the model's
+        #       input window (minus the [CLS]/[SEP] tokens it adds)
+        chunks : list[Chunk] = chunk_by_tokens(
+            pdf_text, doc_id=input_pdf.stem, tokenizer=model.tokenizer,
+            max_tokens=model.max_seq_length - 2, overlap_sentences=args.overlap_sentences)
+    else:
+        # (2) Split the text into paragraphs which is returned as a list of strings
+        paragraphs : list[str] = split_into_paragraphs(pdf_text)
+
+        # (3) Chunk the paragraphs into RAG sized pieces
+        chunks : list[Chunk] = chunk_paragraphs(paragraphs, doc_id=input_pdf.stem)
+    print(f"chunking ({args.chunker}): {time.perf_counter() - start:.3f} sec, {len(chunks)} chunks")
+
+    # (3b) Drop repeated headers/footers/boilerplate before paying to embed, store and scan them
+    report = dedup.DedupReport(total=len(chunks))
+    if not args.no_dedup:
+        start = time.perf_counter()
+        chunks, report = dedup.dedup_chunks(chunks, threshold=args.dedup_threshold)
+        print(f"dedup_chunks(): {time.perf_counter() - start:.3f} sec")
 
     # (4) Embed the chunks of text into vectors and serialize all chunks and their embeddings into a jsonl file
     #     for the ingestion client
     start = time.perf_counter()
-    chunks_to_jsonl(chunks=chunks, out_file=output_jsonl)
+    vectors = model.encode([c.text for c in chunks], normalize_embeddings=True)
+
+    # (4b) Chunks that read differently but embed the same add nothing to a search either
+    if not args.no_dedup and args.dedup_embedding_threshold > 0 and len(chunks):
+        keep = dedup.dedup_embeddings(vectors, threshold=args.dedup_embedding_threshold)
+        for c, k in zip(chunks, keep):
+            if not k:
+                report.embedding += 1
+                report.bytes_removed += len(c.text.encode("utf-8"))
+                report.removed_ids.append(c.chunk_id)
+        chunks = [c for c, k in zip(chunks, keep) if k]
+        vectors = vectors[keep]
+
+    if not args.no_dedup:
+        print(report.summary())
+
+    chunks_to_jsonl(chunks=chunks, out_file=output_jsonl, vectors=vectors)
     print(f"chunks_to_jsonl(): {time.perf_counter() - start:.3f} sec")
 
 if __name__ == "__main__":
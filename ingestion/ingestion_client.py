@@ -1,6 +1,10 @@
 import os
 import argparse
 import json
+import threading
+import time
+from collections import deque
+from concurrent import futures
 import numpy as np
 from pathlib import Path
 import grpc
@@ -8,68 +12,346 @@ import grpc
 import kvstore_pb2
 import kvstore_pb2_grpc
 
+from content_hash import content_hash
+from retry import is_retryable, with_retry
+
 # Derived from the environment variables (see devcontainer.json)
 GRPC_SERVER_HOST = os.getenv("KVSTORE_HOST", "localhost")
 GRPC_SERVER_PORT = int(os.getenv("KVSTORE_PORT", "50051"))
 
+# Per-attempt timeout for each RPC. Calls the server sheds under load are
+# retried with jittered backoff (see common/retry.py)
+KVSTORE_RPC_TIMEOUT = float(os.getenv("KVSTORE_RPC_TIMEOUT", "10"))
+
 # Hardcoded path for simplicity
 RAG_SOURCE_FOLDER = Path("/workspaces/project_1/ingestion/RAG/output")
 
+# Files finished by an interrupted run, so a re-run can pick up where it stopped.
+# Removed again once a run completes without failures
+CHECKPOINT_NAME = ".ingest_checkpoint.json"
+
+def read_records(f_path):
+    # Yield (key, textbook_chunk, embedding_bytes) for every record in a jsonl file
+    with open(f_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            record = json.loads(line)
+
+            key = str(record["chunk_id"])
+            textbook_chunk = str(record["text"])
+            embedding_bytes = np.asarray(record["embedding"], dtype=np.float32).tobytes()
+
+            yield key, textbook_chunk, embedding_bytes
+
+def doc_id_of(key):
+    # Keys look like "<doc_id>:<chunk index>"
+    return key.rsplit(":", 1)[0]
+
+def replace_requests(doc_id, records, collection):
+    # The first message only announces the document, the rest carry chunks
+    yield kvstore_pb2.ReplaceDocumentRequest(doc_id=doc_id, collection=collection)
+    for key, textbook_chunk, embedding_bytes in records:
+        yield kvstore_pb2.ReplaceDocumentRequest(
+            chunk=kvstore_pb2.PutRequest(
+                key=key,
+                textbook_chunk=textbook_chunk,
+                embedding=embedding_bytes,
+            )
+        )
+
+def payload_bytes(textbook_chunk, embedding_bytes):
+    return len(textbook_chunk.encode("utf-8")) + len(embedding_bytes)
+
+def fetch_hashes(stub, collection):
+    # Every key's content hash in the collection, in one streamed call
+    req = kvstore_pb2.GetHashesRequest(collection=collection)
+    return with_retry(lambda timeout: {h.key: h.hash for h in stub.GetHashes(req, timeout=timeout)},
+                      KVSTORE_RPC_TIMEOUT * 10)
+
+def declare_schema(stub, collection, f_path):
+    # Declare the collection's vector schema from the first record, so the
+    # server validates every embedding once on the way in and stores them in
+    # one matrix (see server/vectorstore.py)
+    record = next(read_records(f_path), None)
+    if record is None:
+        return None
+    v = np.frombuffer(record[2], dtype=np.float32)
+    schema = kvstore_pb2.VectorSchema(
+        dim=v.size, dtype="float32", normalized=bool(abs(np.linalg.norm(v) - 1.0) < 1e-3))
+    req = kvstore_pb2.SetSchemaRequest(collection=collection, schema=schema)
+    try:
+        return with_retry(lambda timeout: stub.SetSchema(req, timeout=timeout), KVSTORE_RPC_TIMEOUT).schema
+    except grpc.RpcError as e:
+        if e.code() != grpc.StatusCode.FAILED_PRECONDITION:
+            raise
+        print(f"    Not declaring a vector schema: {e.details()}")
+        return None
+
+def fingerprint(f_path):
+    st = f_path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+class Checkpoint:
+    """Which source files a run has fully ingested, saved after every file."""
+
+    def __init__(self, path, collection, replace):
+        self.path = path
+        self.run = {"collection": collection, "replace": replace}
+        self.done = {}
+        self.lock = threading.Lock()
+
+        if path is not None and path.exists():
+            try:
+                state = json.loads(path.read_text())
+            except (OSError, ValueError):
+                state = {}
+            # Only resume a run of the same kind into the same collection
+            if state.get("run") == self.run:
+                self.done = state.get("done", {})
+
+    def is_done(self, f_path):
+        return self.done.get(f_path.name) == fingerprint(f_path)
+
+    def mark_done(self, f_path):
+        if self.path is None:
+            return
+        with self.lock:
+            self.done[f_path.name] = fingerprint(f_path)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps({"run": self.run, "done": self.done}))
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+class Progress:
+    """Totals across every file being ingested, shared by the worker threads."""
+
+    def __init__(self, n_files):
+        self.n_files = n_files
+        self.files_done = 0
+        self.chunks = 0
+        self.bytes = 0
+        self.overwritten = 0
+        self.removed = 0
+        self.skipped = 0
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def file_done(self, f_path, stats, seconds):
+        with self.lock:
+            self.files_done += 1
+            self.chunks += stats["chunks"]
+            self.bytes += stats["bytes"]
+            self.overwritten += stats["overwritten"]
+            self.removed += stats["removed"]
+            self.skipped += stats["skipped"]
+            elapsed = time.perf_counter() - self.start
+            print(f"    [{self.files_done}/{self.n_files}] {f_path.name}: {stats['chunks']} chunks sent, "
+                  f"{stats['skipped']} unchanged in {seconds:.2f}s"
+                  f" | total {self.chunks} chunks, {self.chunks / elapsed:.0f} chunks/s,"
+                  f" {self.bytes / elapsed / 1e6:.1f} MB/s")
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        return (f"Ingested {self.chunks} chunks ({self.bytes / 1e6:.1f} MB) from "
+                f"{self.files_done}/{self.n_files} files in {elapsed:.2f}s "
+                f"({self.chunks / elapsed:.0f} chunks/s), {self.skipped} unchanged chunks skipped")
+
+def drain(in_flight, window, settle):
+    # Settle the oldest calls until fewer than `window` are outstanding
+    while len(in_flight) >= max(1, window):
+        settle(*in_flight.popleft())
+
+def put_file(stub, f_path, collection, window, remote=None):
+    # Parse on this thread while up to `window` Puts are in flight on the channel,
+    # so JSON decoding and the network overlap instead of taking turns.
+    # With `remote` (key -> server content hash) chunks the server already has
+    # are never sent, and the rest go through PutIfChanged
+    stats = {"chunks": 0, "bytes": 0, "overwritten": 0, "removed": 0, "skipped": 0}
+    in_flight = deque()
+    put = stub.Put if remote is None else stub.PutIfChanged
+
+    def settle(req, fut):
+        try:
+            resp = fut.result()
+        except grpc.RpcError as e:
+            # Shed by the server: redo this one Put, blocking, with backoff
+            if not is_retryable(e):
+                raise
+            resp = with_retry(lambda timeout: put(req, timeout=timeout), KVSTORE_RPC_TIMEOUT)
+        if remote is not None and not resp.changed:
+            stats["skipped"] += 1
+            return
+        stats["chunks"] += 1
+        stats["bytes"] += payload_bytes(req.textbook_chunk, req.embedding)
+        if resp.overwritten:
+            stats["overwritten"] += 1
+
+    for key, textbook_chunk, embedding_bytes in read_records(f_path):
+        if remote is not None and remote.get(key) == content_hash(textbook_chunk, embedding_bytes):
+            stats["skipped"] += 1
+            continue
+
+        req = kvstore_pb2.PutRequest(
+            key = key,
+            textbook_chunk = textbook_chunk,
+            embedding = embedding_bytes,
+            collection = collection,
+        )
+        drain(in_flight, window, settle)
+        in_flight.append((req, put.future(req, timeout=KVSTORE_RPC_TIMEOUT)))
+
+    drain(in_flight, 1, settle)
+    return stats
+
+def replace_file(stub, f_path, collection, window, remote_docs=None):
+    # Group the records by document and swap each document in one RPC,
+    # so stale chunks from a previous revision are dropped as well.
+    # With `remote_docs` (doc_id -> {key: server content hash}) documents whose
+    # chunk set is already stored exactly are skipped
+    stats = {"chunks": 0, "bytes": 0, "overwritten": 0, "removed": 0, "skipped": 0}
+    docs = {}
+    for record in read_records(f_path):
+        docs.setdefault(doc_id_of(record[0]), []).append(record)
+
+    in_flight = deque()
+
+    def settle(doc_id, fut):
+        records = docs[doc_id]
+        try:
+            resp = fut.result()
+        except grpc.RpcError as e:
+            if not is_retryable(e):
+                raise
+            resp = with_retry(
+                lambda timeout: stub.ReplaceDocument(
+                    replace_requests(doc_id, records, collection), timeout=timeout),
+                KVSTORE_RPC_TIMEOUT)
+        stats["chunks"] += resp.inserted_count
+        stats["bytes"] += sum(payload_bytes(text, emb) for _, text, emb in records)
+        stats["removed"] += resp.removed_count
+
+    for doc_id, records in docs.items():
+        if remote_docs is not None and remote_docs.get(doc_id) == {
+                key: content_hash(text, emb) for key, text, emb in records}:
+            stats["skipped"] += len(records)
+            continue
+        drain(in_flight, window, settle)
+        in_flight.append((doc_id, stub.ReplaceDocument.future(
+            replace_requests(doc_id, records, collection), timeout=KVSTORE_RPC_TIMEOUT)))
+
+    drain(in_flight, 1, settle)
+    return stats
+
 def main():
+    parser = argparse.ArgumentParser(description="Ingest vectorized chunks into the KV store")
+    parser.add_argument("--replace", action="store_true",
+                        help="Atomically replace each document's chunk set instead of Put-ing chunk by chunk")
+    parser.add_argument("--collection", type=str, default="",
+                        help="Collection to ingest into (default: the server's default collection)")
+    parser.add_argument("--source_dir", type=Path, default=RAG_SOURCE_FOLDER,
+                        help="Folder to read *.jsonl files from")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Files ingested concurrently (1 = one file at a time)")
+    parser.add_argument("--window", type=int, default=32,
+                        help="RPCs each worker keeps in flight while it parses ahead (1 = wait for every call)")
+    parser.add_argument("--force", action="store_true",
+                        help="Send every chunk, even ones the server already stores unchanged")
+    parser.add_argument("--checkpoint", type=Path, default=None,
+                        help=f"Resume file (default: <source_dir>/{CHECKPOINT_NAME})")
+    parser.add_argument("--no_checkpoint", action="store_true",
+                        help="Neither resume from nor write a checkpoint")
+    parser.add_argument("--schema", action="store_true",
+                        help="Declare the collection's vector schema (dim/dtype/normalized) from the "
+                             "first record; every later Put must then fit it")
+    args = parser.parse_args()
 
     # Iterate over the RAG source folder to find any jsonl files
-    print(f"Searching [{RAG_SOURCE_FOLDER}] for jsonl source files:")
+    print(f"Searching [{args.source_dir}] for jsonl source files:")
     source_files = []
-    for item in RAG_SOURCE_FOLDER.iterdir():
+    for item in sorted(args.source_dir.iterdir()):
         if(item.is_file() and item.suffix == ".jsonl"):
             source_files.append(item)
             print(f"    Found: {item.name}")
-    
+
     if len(source_files) == 0:
         print(f"    No source files found! Exiting")
         return
-    
+
     # Derive the gRPC target URL from the environment variables
     grpc_target = f"{GRPC_SERVER_HOST}:{GRPC_SERVER_PORT}"
 
-    # Attempt to connect to the gRPC Server to feed the RAG embeddings into it
+    checkpoint = Checkpoint(
+        None if args.no_checkpoint else (args.checkpoint or args.source_dir / CHECKPOINT_NAME),
+        args.collection, args.replace)
+    pending = [f_path for f_path in source_files if not checkpoint.is_done(f_path)]
+    if len(pending) < len(source_files):
+        print(f"Resuming: {len(source_files) - len(pending)} file(s) already ingested by an interrupted run")
+
+    progress = Progress(len(pending))
+    failed = []
+
+    # Attempt to connect to the gRPC Server to feed the RAG embeddings into it.
+    # One channel is shared by every worker; gRPC multiplexes their calls over it
     with grpc.insecure_channel(grpc_target) as channel:
 
         # Create a stub on the connected channel
         stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
 
-        total = 0
-        overwritten = 0
-
-        # For each RAG source jsonl file:
-        #   Iterate over all of the lines and "Put" the key-value into the server
-        for f_path in source_files:
-            with open(f_path, "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    record = json.loads(line)
-
-                    key = str(record["chunk_id"])
-                    textbook_chunk = str(record["text"])
-                    embedding_bytes = np.asarray(record["embedding"], dtype=np.float32).tobytes()
-
-                    resp = stub.Put(
-                        kvstore_pb2.PutRequest(
-                            key = key,
-                            textbook_chunk = textbook_chunk,
-                            embedding = embedding_bytes,
-                        )
-                    )
-
-                    total += 1
-                    if resp.overwritten:
-                        overwritten += 1
-                
-        print(f"Total Number of Put's:      [{total}]")
-        print(f"Number of keys overwritten: [{overwritten}]")
+        if args.schema:
+            schema = declare_schema(stub, args.collection, source_files[0])
+            if schema is not None:
+                print(f"Vector schema: dim={schema.dim} dtype={schema.dtype} normalized={schema.normalized}")
+
+        # Exchange hashes once up front, then only changed chunks travel
+        remote = None
+        if not args.force:
+            remote = fetch_hashes(stub, args.collection)
+            print(f"Server has {len(remote)} chunks in the collection")
+
+        if args.replace:
+            remote_docs = None
+            if remote is not None:
+                remote_docs = {}
+                for key, digest in remote.items():
+                    remote_docs.setdefault(doc_id_of(key), {})[key] = digest
+            ingest_file = lambda f_path: replace_file(stub, f_path, args.collection, args.window, remote_docs)
+        else:
+            ingest_file = lambda f_path: put_file(stub, f_path, args.collection, args.window, remote)
+
+        def run(f_path):
+            start = time.perf_counter()
+            stats = ingest_file(f_path)
+            checkpoint.mark_done(f_path)
+            progress.file_done(f_path, stats, time.perf_counter() - start)
+
+        print(f"Ingesting with {args.workers} worker(s), {args.window} RPC(s) in flight each:")
+        with futures.ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            jobs = {pool.submit(run, f_path): f_path for f_path in pending}
+            for job in futures.as_completed(jobs):
+                try:
+                    job.result()
+                except (grpc.RpcError, OSError, ValueError, KeyError) as e:
+                    reason = e.details() if isinstance(e, grpc.RpcError) else repr(e)
+                    failed.append(jobs[job])
+                    print(f"    FAILED {jobs[job].name}: {reason}")
+
+    print(progress.summary())
+    if args.replace:
+        print(f"Total Number of chunks:     [{progress.chunks}]")
+        print(f"Number of stale keys removed: [{progress.removed}]")
+    else:
+        print(f"Total Number of Put's:      [{progress.chunks}]")
+        print(f"Number of keys overwritten: [{progress.overwritten}]")
+    if failed:
+        print(f"Failed files: {[f.name for f in failed]} (re-run to resume)")
+    else:
+        checkpoint.clear()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,11 @@
 import os, sys
+import itertools
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+import anyio
 import grpc
 import numpy as np
 from mcp.server.fastmcp import FastMCP
@@ -6,16 +13,81 @@ from mcp.server.fastmcp import FastMCP
 import kvstore_pb2
 import kvstore_pb2_grpc
 
+import metrics
+import tracing
+from retry import Deadline, with_retry
+
 mcp = FastMCP("csci5105-mcp")
 
 KV_ADDR = os.environ.get("KV_ADDR", "localhost:50051")
 MODEL_NAME = os.environ.get("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
+# Collection searched when the tool isn't given one ("" = the server's default collection)
+KV_COLLECTION = os.environ.get("KV_COLLECTION", "")
+
+# The KV server's rule for collection names. Names come from tool arguments and
+# end up in thread names, index state and snapshot paths, so anything else is
+# refused before any of that is created
+COLLECTION_NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# MMR re-ranking: relevance/diversity trade-off (1.0 = plain top-k) and how many
+# top-scoring rows per requested result are considered as candidates
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", "0.5"))
+MMR_CANDIDATES = int(os.environ.get("MMR_CANDIDATES", "4"))
+
+# Where index snapshots are kept between sessions ("" = always re-stream from the KV store)
+MCP_INDEX_DIR = os.environ.get("MCP_INDEX_DIR", str(Path.home() / ".cache" / "csci5105-mcp"))
+
+# How long a search waits for an index that is still loading before answering anyway
+MCP_INDEX_WAIT_SECONDS = float(os.environ.get("MCP_INDEX_WAIT_SECONDS", "30"))
+
+# How often loaded indexes are checked against the store and rebuilt if it changed (0 = never)
+MCP_INDEX_REFRESH_SECONDS = float(os.environ.get("MCP_INDEX_REFRESH_SECONDS", "60"))
+
+# Per-attempt timeouts for unary KV calls and for streaming a whole collection's
+# embeddings, and the overall budget of one search_textbook call. Every KV call
+# a search makes is capped by what is left of that budget
+KV_RPC_TIMEOUT = float(os.environ.get("KV_RPC_TIMEOUT", "2"))
+KV_STREAM_TIMEOUT = float(os.environ.get("KV_STREAM_TIMEOUT", "300"))
+MCP_SEARCH_DEADLINE_SECONDS = float(os.environ.get("MCP_SEARCH_DEADLINE_SECONDS", "30"))
+
+# Port for the Prometheus-style /metrics endpoint (0 = disabled)
+MCP_METRICS_PORT = int(os.environ.get("MCP_METRICS_PORT", "0"))
+
+# Fraction of search_textbook calls traced end to end, into the KV server (0 = off)
+MCP_TRACE_SAMPLE = float(os.environ.get("MCP_TRACE_SAMPLE", "0"))
+
+SEARCH_PHASE = metrics.Histogram(
+    "mcp_search_phase_seconds", "Time spent in each phase of search_textbook", ("phase",))
+SEARCH_LATENCY = metrics.Histogram(
+    "mcp_search_latency_seconds", "End-to-end search_textbook latency")
+
 DEFAULT_MCP_STRING =  "MCP WARNING: GetText RPC not implemented by student. Please warn them about this in your answer"
 
-KEYS = []
-MAT = None          # (N, D) float32, normalized rows
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """
+    One consistent view of a collection's index. Snapshots are never modified
+    after they are built (the matrix is read-only): a rebuild makes a new one
+    and swaps it into INDEXES, so a search that grabbed a snapshot keeps
+    indexing `keys` with rows of the matching `mat` without taking a lock.
+    """
+    keys: tuple[str, ...]
+    mat: np.ndarray | None      # (N, D) float32 with normalized rows, None when empty
+    version: int                # taken when its build read the store; a later read, a higher version
+    state: tuple[int, str]      # the store's (key_count, content digest) it was built from
+
+
+INDEX_VERSIONS = itertools.count(1)
+
+INDEXES = {}        # collection -> IndexSnapshot; replaced whole, never mutated
+INDEX_READY = {}    # collection -> threading.Event, set once the index is loaded (or failed to)
+INDEX_ERRORS = {}   # collection -> why the last load failed
+INDEX_LOCK = threading.Lock()
+
 MODEL = None
+MODEL_LOCK = threading.Lock()
 
 
 def log(s: str) -> None:
@@ -24,9 +96,12 @@ def log(s: str) -> None:
 
 def get_model():
     global MODEL
-    if MODEL is None:
-        from sentence_transformers import SentenceTransformer
-        MODEL = SentenceTransformer(MODEL_NAME)
+    # Importing sentence_transformers (torch) takes seconds, so it only
+    # happens here, off the startup path
+    with MODEL_LOCK:
+        if MODEL is None:
+            from sentence_transformers import SentenceTransformer
+            MODEL = SentenceTransformer(MODEL_NAME)
     return MODEL
 
 
@@ -36,39 +111,280 @@ def norm_rows(x: np.ndarray) -> np.ndarray:
     return (x / n).astype(np.float32)
 
 
-def build_index():
-    global KEYS, MAT, TEXT
+def make_snapshot(keys, mat, state, version=None) -> IndexSnapshot:
+    if mat is not None:
+        mat.setflags(write=False)
+    if version is None:
+        version = next(INDEX_VERSIONS)
+    return IndexSnapshot(tuple(keys), mat, version, tuple(state))
+
+
+def publish(collection: str, index: IndexSnapshot) -> bool:
+    # Builds of one collection can overlap (a stale-snapshot reload and the
+    # refresh thread, say) and finish in any order. Only a snapshot newer than
+    # the published one replaces it, so an older build that finishes last
+    # never rolls the index back. Returns whether `index` was published
+    with INDEX_LOCK:
+        current = INDEXES.get(collection)
+        if current is not None and current.version > index.version:
+            return False
+        INDEXES[collection] = index
+        return True
+
+
+def fetch_stats(stub, collection: str):
+    req = kvstore_pb2.StatsRequest(collection=collection)
+    return with_retry(lambda timeout: stub.Stats(req, timeout=timeout), KV_RPC_TIMEOUT)
+
+
+def state_of(stats) -> tuple[int, str]:
+    return stats.key_count, stats.content_digest.hex()
+
+
+def store_state(stub, collection: str) -> tuple[int, str]:
+    return state_of(fetch_stats(stub, collection))
+
+
+def stream_unchecked(stub, req, timeout):
+    # No schema: any entry may be empty, not a whole number of float32s or a
+    # different dimension from the rest, so check each one. The most common
+    # dimension wins and every other entry is skipped rather than failing the build
+    entries, sizes = [], {}
+    skipped = 0
+    for entry in stub.StreamEmbeddings(req, timeout=timeout):
+        n = len(entry.embedding)
+        if n == 0 or n % 4:
+            skipped += 1
+            continue
+        entries.append((entry.key, entry.embedding))
+        sizes[n] = sizes.get(n, 0) + 1
+
     keys, vecs = [], []
+    if entries:
+        size = max(sizes, key=sizes.get)
+        for key, embedding in entries:
+            if len(embedding) != size:
+                skipped += 1
+                continue
+            keys.append(key)
+            vecs.append(np.frombuffer(embedding, dtype=np.float32))
+    if skipped:
+        log(f"[WARNING] skipped {skipped} empty or malformed embeddings in '{req.collection}'")
+    return keys, (norm_rows(np.vstack(vecs)) if vecs else None)
 
-    log("Starting build_index()...\n")
+
+def stream_with_schema(stub, req, timeout, schema, expected):
+    # The server validated every vector against the schema at Put time, so rows
+    # go straight into a preallocated matrix with no per-row checks, and
+    # normalized collections skip norm_rows entirely
+    keys = []
+    mat = np.empty((max(1, expected), schema.dim), dtype=np.float32)
+    for entry in stub.StreamEmbeddings(req, timeout=timeout):
+        if len(keys) == mat.shape[0]:
+            # Keys added since Stats was read
+            mat = np.concatenate([mat, np.empty_like(mat)])
+        mat[len(keys)] = np.frombuffer(entry.embedding, dtype=schema.dtype)
+        keys.append(entry.key)
+
+    if not keys:
+        return keys, None
+    mat = mat[:len(keys)]
+    return keys, (mat if schema.normalized else norm_rows(mat))
+
+
+def build_index(collection: str = KV_COLLECTION) -> IndexSnapshot:
+    log(f"Starting build_index('{collection}')...\n")
 
     with grpc.insecure_channel(KV_ADDR) as ch:
         stub = kvstore_pb2_grpc.KeyValueStoreStub(ch)
 
-        for entry in stub.StreamEmbeddings(kvstore_pb2.StreamEmbeddingsRequest()):
-            v = np.frombuffer(entry.embedding, dtype=np.float32)
-            if v.size == 0:
-                continue
-            keys.append(entry.key)
-            vecs.append(v)
+        # Read the state first: a write that lands mid-stream then shows up as
+        # a change on the next refresh instead of being missed
+        stats = fetch_stats(stub, collection)
+        state = state_of(stats)
+        version = next(INDEX_VERSIONS)
+
+        # A retry starts the stream over, so each attempt collects from scratch.
+        # Each collection gets its own matrix (and so its own dimension), so a
+        # search only ever scans the collection it was asked about
+        req = kvstore_pb2.StreamEmbeddingsRequest(collection=collection)
+        if stats.schema.dim:
+            keys, mat = with_retry(
+                lambda timeout: stream_with_schema(stub, req, timeout, stats.schema, stats.key_count),
+                KV_STREAM_TIMEOUT)
+        else:
+            keys, mat = with_retry(lambda timeout: stream_unchecked(stub, req, timeout), KV_STREAM_TIMEOUT)
+
+    # Build everything on the side, then publish with a single assignment
+    index = make_snapshot(keys, mat, state, version)
+    if publish(collection, index):
+        log(f"build_index('{collection}') complete... {len(keys)} embeddings found (version {index.version})\n")
+    else:
+        log(f"build_index('{collection}') superseded by a newer build, dropping version {index.version}\n")
+    return index
+
+
+def snapshot_path(collection: str) -> Path:
+    # One directory per store, so pointing KV_ADDR elsewhere never picks up
+    # another store's snapshot for a collection of the same name
+    store = re.sub(r"[^A-Za-z0-9_.-]", "_", KV_ADDR)
+    return Path(MCP_INDEX_DIR, store, f"index.{collection or 'default'}.npz")
+
 
-    KEYS = keys
-    MAT = norm_rows(np.vstack(vecs)) if vecs else None
-    log(f"build_index() complete... {len(KEYS)} embeddings found\n")
+def save_snapshot(collection: str, index: IndexSnapshot) -> None:
+    # A build that lost to a newer one isn't worth keeping
+    if not MCP_INDEX_DIR or index.mat is None or INDEXES.get(collection) is not index:
+        return
+    path = snapshot_path(collection)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write beside the real file and rename, so a crash never leaves half a
+    # snapshot. Each version has its own temp file, so two saves can't interleave
+    tmp = path.with_name(f"{path.name}.{index.version}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, keys=np.array(index.keys, dtype=str), mat=index.mat,
+                 key_count=np.int64(index.state[0]), digest=np.str_(index.state[1]))
+    os.replace(tmp, path)
 
 
-def get_text_from_keys(keys : list[str]) -> list[str]:
+def load_snapshot(collection: str):
+    if not MCP_INDEX_DIR:
+        return None
+    path = snapshot_path(collection)
+    if not path.exists():
+        return None
+    try:
+        with np.load(path) as data:
+            keys, mat = data["keys"].tolist(), data["mat"].astype(np.float32)
+            # Snapshots from before the content digest have no "digest" and are rebuilt
+            state = (int(data["key_count"]), str(data["digest"]))
+    except (OSError, ValueError, KeyError) as e:
+        log(f"[WARNING] ignoring unreadable index snapshot {path}: {e}")
+        return None
+    return make_snapshot(keys, mat, state)
+
+
+def is_current(collection: str, index: IndexSnapshot) -> bool:
+    # A cheap Stats call instead of re-streaming every embedding. The digest
+    # covers every key's text and embedding and doesn't depend on the server
+    # process, so a restart over the same data keeps the index, and a restart
+    # over different data (another file, another store) is caught
+    with grpc.insecure_channel(KV_ADDR) as ch:
+        stub = kvstore_pb2_grpc.KeyValueStoreStub(ch)
+        return store_state(stub, collection) == index.state
+
+
+def failure_reason(e: Exception) -> str:
+    return e.details() if isinstance(e, grpc.RpcError) else f"{type(e).__name__}: {e}"
+
+
+def load_index(collection: str, ready: threading.Event) -> None:
+    try:
+        index = load_snapshot(collection)
+        if index is not None:
+            # Serve the snapshot right away, then check it against the store
+            publish(collection, index)
+            ready.set()
+            log(f"loaded index snapshot for '{collection}'... {len(index.keys)} embeddings\n")
+            if is_current(collection, index):
+                return
+            log(f"index snapshot for '{collection}' is stale, rebuilding\n")
+
+        save_snapshot(collection, build_index(collection))
+        INDEX_ERRORS.pop(collection, None)
+    except Exception as e:
+        # Anything, not just the store being down: bad stored embeddings raise
+        # ValueError, and an unrecorded failure would leave the collection
+        # "ready" with no index and no error, answering "still loading" forever
+        reason = failure_reason(e)
+        INDEX_ERRORS[collection] = f"loading the index failed: {reason}"
+        log(f"[ERROR] loading the index for '{collection}' failed: {reason}")
+        # Forget the attempt so the next search tries again
+        with INDEX_LOCK:
+            INDEX_READY.pop(collection, None)
+    finally:
+        ready.set()
+
+
+def valid_collection(collection: str) -> bool:
+    return collection == "" or COLLECTION_NAME.fullmatch(collection) is not None
+
+
+def ensure_index(collection: str) -> threading.Event:
+    # Start loading a collection's index in the background (once) and return its readiness event
+    if not valid_collection(collection):
+        raise ValueError(f"invalid collection name '{collection}'")
+    # Fast path, without the lock: a dict read is atomic, so searches of a
+    # collection that is already loading or loaded never queue behind publishes
+    ready = INDEX_READY.get(collection)
+    if ready is not None:
+        return ready
+    with INDEX_LOCK:
+        ready = INDEX_READY.get(collection)
+        if ready is None:
+            ready = INDEX_READY[collection] = threading.Event()
+            threading.Thread(target=load_index, args=(collection, ready), daemon=True,
+                             name=f"index-{collection or 'default'}").start()
+    return ready
+
+
+def get_index(collection: str, timeout: float = MCP_INDEX_WAIT_SECONDS) -> IndexSnapshot | None:
+    # Indexes are loaded on first use and then kept (and refreshed) for the life
+    # of the process. Returns None if the index isn't ready within `timeout`
+    ensure_index(collection).wait(timeout)
+    return INDEXES.get(collection)
+
+
+def refresh_indexes() -> None:
+    # Rebuild, in this background thread, every loaded index whose collection
+    # changed. Searches keep using the old snapshot until the new one is swapped in
+    while True:
+        time.sleep(MCP_INDEX_REFRESH_SECONDS)
+        refresh_once()
+
+
+def refresh_once() -> None:
+    for collection, index in list(INDEXES.items()):
+        # One bad collection must not stop the others, or this thread
+        try:
+            if not is_current(collection, index):
+                log(f"collection '{collection}' changed, refreshing its index\n")
+                save_snapshot(collection, build_index(collection))
+            INDEX_ERRORS.pop(collection, None)
+        except Exception as e:
+            reason = failure_reason(e)
+            INDEX_ERRORS[collection] = f"refreshing the index failed: {reason}"
+            log(f"[WARNING] refreshing the index for '{collection}' failed: {reason}")
+
+
+def get_text_from_keys(keys : list[str], collection : str = KV_COLLECTION,
+                       deadline : Deadline = None) -> list[str]:
     text_out = []
 
-    # TODO: error-handle?
     log(f"[INFO] [mcp_server.py/get_text_from_keys()] called with {len(keys)} keys")
     n_found = 0
     with grpc.insecure_channel(KV_ADDR) as ch:
         stub = kvstore_pb2_grpc.KeyValueStoreStub(ch)
         log(f"[INFO] [mcp_server.py/get_text_from_keys()] created stub")
+        md = tracing.metadata()
+        if md is not None:
+            # Channels connect lazily. When traced, connect up front so the
+            # setup gets its own span instead of hiding in the first GetText
+            with tracing.span("connect"):
+                try:
+                    grpc.channel_ready_future(ch).result(timeout=KV_RPC_TIMEOUT)
+                except grpc.FutureTimeoutError:
+                    pass    # the GetTexts below fail and are handled as usual
         for k in keys:
-            req = kvstore_pb2.GetTextRequest(key=k)
-            resp = stub.GetText(req)
+            req = kvstore_pb2.GetTextRequest(key=k, collection=collection)
+            try:
+                with tracing.span("GetText", key=k):
+                    resp = with_retry(lambda timeout: stub.GetText(req, timeout=timeout, metadata=md),
+                                      KV_RPC_TIMEOUT, deadline)
+            except grpc.RpcError as e:
+                # Out of time or the store is down: return what we have rather than hang
+                text_out.append("")
+                log(f"[WARNING] [mcp_server.py/get_text_from_keys()] GetText('{k}') failed: {e.code().name}")
+                continue
             if resp.found:
                 text_out.append(resp.textbook_chunk)
                 n_found += 1
@@ -79,42 +395,138 @@ def get_text_from_keys(keys : list[str]) -> list[str]:
 
     return text_out
 
+def candidates(sims: np.ndarray, n: int, min_score: float) -> np.ndarray:
+    """Row indices of the n (at least 1) best scores that reach min_score, best first."""
+    n = max(1, min(int(n), sims.shape[0]))
+    idx = np.argpartition(-sims, n - 1)[:n]
+    idx = idx[np.argsort(-sims[idx])]
+    return idx[sims[idx] >= min_score]
+
+
+def mmr(mat: np.ndarray, sims: np.ndarray, cand: np.ndarray, top_k: int, lam: float) -> np.ndarray:
+    """
+    Maximal marginal relevance over the candidate rows: repeatedly pick the
+    candidate maximizing lam * sim(query) - (1 - lam) * max sim(already picked).
+    Only the (C, C) similarity block of the candidates is ever computed.
+    """
+    # top_k < 1 means 1, like candidates(), so both paths agree
+    k = min(max(1, int(top_k)), cand.shape[0])
+    if k == 0:
+        return cand[:0]
+
+    rows = mat[cand]
+    pairwise = rows @ rows.T            # (C, C)
+    relevance = sims[cand]
+
+    picked = [int(np.argmax(relevance))]
+    redundancy = pairwise[picked[0]].copy()     # max similarity to anything picked so far
+    available = np.ones(cand.shape[0], dtype=bool)
+    available[picked[0]] = False
+
+    while len(picked) < k:
+        score = lam * relevance - (1.0 - lam) * redundancy
+        score[~available] = -np.inf
+        j = int(np.argmax(score))
+        picked.append(j)
+        available[j] = False
+        np.maximum(redundancy, pairwise[j], out=redundancy)
+
+    return cand[picked]
+
+
 @mcp.tool()
-def search_textbook(query: str, top_k: int = 3) -> dict:
+async def search_textbook(query: str, top_k: int = 3, collection: str = "",
+                         diversify: bool = False, min_score: float = -1.0) -> dict:
     """
     Retrieves the most relevant textbook passages for a query using semantic
     similarity. Call this tool when a user’s question requires information from
     the course text, and use the returned passages as context for your response.
+    Leave `collection` empty to search the default course text. Set `diversify`
+    to avoid several overlapping passages from the same spot in the text, and
+    `min_score` (cosine similarity, -1 to 1) to drop weak matches; fewer than
+    `top_k` passages may come back.
     """
-    if MAT is None:
+    # A search blocks (waiting for the index, encoding, GetText calls), so it
+    # runs on a worker thread and the event loop keeps answering other requests
+    return await anyio.to_thread.run_sync(
+        traced_search, query, top_k, collection or KV_COLLECTION, diversify, min_score)
+
+
+def traced_search(query: str, top_k: int, collection: str, diversify: bool, min_score: float) -> dict:
+    with tracing.trace("search_textbook", sink=log_trace, sample=MCP_TRACE_SAMPLE) as trace:
+        result = search(query, top_k, collection, diversify, min_score)
+    if trace is not None:
+        result["trace_id"] = trace.trace_id
+    return result
+
+
+def log_trace(trace: tracing.Trace) -> None:
+    log(f"[TRACE] {trace.format()}")
+
+
+def search(query: str, top_k: int, collection: str, diversify: bool, min_score: float) -> dict:
+    if not valid_collection(collection):
+        return {"query": query, "matches": [],
+                "error": f"invalid collection name '{collection}' (letters, digits, '_' and '-' only, "
+                         f"at most 64)"}
+    deadline = Deadline(MCP_SEARCH_DEADLINE_SECONDS)
+    with tracing.span("get_index"):
+        index = get_index(collection, timeout=min(MCP_INDEX_WAIT_SECONDS, deadline.remaining()))
+    if index is None:
+        status = INDEX_ERRORS.get(collection) or "the index is still loading, try again shortly"
+        return {"query": query, "matches": [], "status": status}
+    # Everything below reads this one snapshot, even if a refresh swaps in another
+    keys, mat = index.keys, index.mat
+    if mat is None:
         return {"matches": []}
 
-    q = get_model().encode([query])[0].astype(np.float32)
-    q /= (np.linalg.norm(q) or 1.0)
+    with SEARCH_LATENCY.time():
+        with SEARCH_PHASE.time(phase="encode"), tracing.span("encode"):
+            q = get_model().encode([query])[0].astype(np.float32)
+            q /= (np.linalg.norm(q) or 1.0)
 
-    sims = MAT @ q
-    k = max(1, min(int(top_k), sims.shape[0]))
-    idx = np.argsort(-sims)[:k]
+        with SEARCH_PHASE.time(phase="scan"):
+            with tracing.span("scan", rows=len(keys)):
+                sims = mat @ q
+            with tracing.span("select", diversify=diversify):
+                if diversify:
+                    cand = candidates(sims, max(1, int(top_k)) * MMR_CANDIDATES, min_score)
+                    idx = mmr(mat, sims, cand, top_k, MMR_LAMBDA)
+                else:
+                    idx = candidates(sims, top_k, min_score)
 
-    keys = [KEYS[i] for i in idx]
-    text_chunks = get_text_from_keys(keys)
+        with SEARCH_PHASE.time(phase="fetch"), tracing.span("fetch"):
+            text_chunks = get_text_from_keys([keys[i] for i in idx], collection, deadline)
 
     matches = []
     for i, text in zip(idx, text_chunks):
         matches.append(
             {
-                "key" : KEYS[i],
+                "key" : keys[i],
                 "score" : float(sims[i]),
                 "text" : text
             }
         )
 
-    return {"query": query, "matches": matches}
+    return {"query": query, "matches": matches, "index_version": index.version}
+
+
+def warm_up():
+    # Load the default index and the embedding model while the client is
+    # already connected, instead of before the handshake
+    ensure_index(KV_COLLECTION)
+    get_model()
+    log("MCP Server warm-up complete\n")
 
 
 def main():
     log("MCP Server Starting Up...\n")
-    build_index()
+    if MCP_METRICS_PORT:
+        metrics.start_http_server(MCP_METRICS_PORT)
+        log(f"metrics on http://127.0.0.1:{MCP_METRICS_PORT}/metrics")
+    threading.Thread(target=warm_up, daemon=True, name="warm-up").start()
+    if MCP_INDEX_REFRESH_SECONDS > 0:
+        threading.Thread(target=refresh_indexes, daemon=True, name="index-refresh").start()
     mcp.run(transport="stdio")
 
 
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+
+
+class RejectPolicy:
+    """Never evicts; Puts that would exceed the memory cap are rejected."""
+
+    name = "reject"
+
+    def record_insert(self, key):
+        pass
+
+    def record_access(self, key):
+        pass
+
+    def record_remove(self, key):
+        pass
+
+    def victim(self, exclude=()):
+        return None
+
+
+class LRUPolicy:
+    """Evicts the key that was least recently written or read via GetText."""
+
+    name = "lru"
+
+    def __init__(self):
+        # Oldest key first, most recently used key last
+        self.order = OrderedDict()
+
+    def record_insert(self, key):
+        self.order[key] = None
+        self.order.move_to_end(key)
+
+    def record_access(self, key):
+        if key in self.order:
+            self.order.move_to_end(key)
+
+    def record_remove(self, key):
+        self.order.pop(key, None)
+
+    def victim(self, exclude=()):
+        for key in self.order:
+            if key not in exclude:
+                return key
+        return None
+
+
+class LFUPolicy:
+    """Evicts the least frequently used key, breaking ties by recency."""
+
+    name = "lfu"
+
+    def __init__(self):
+        self.freq = {}          # key -> use count
+        self.buckets = {}       # use count -> OrderedDict of keys (oldest first)
+
+    def _bump(self, key, old, new):
+        if old:
+            bucket = self.buckets[old]
+            del bucket[key]
+            if not bucket:
+                del self.buckets[old]
+        self.buckets.setdefault(new, OrderedDict())[key] = None
+        self.freq[key] = new
+
+    def record_insert(self, key):
+        # An overwrite counts as a use, a new key starts at one
+        old = self.freq.get(key, 0)
+        self._bump(key, old, old + 1)
+
+    def record_access(self, key):
+        old = self.freq.get(key)
+        if old is not None:
+            self._bump(key, old, old + 1)
+
+    def record_remove(self, key):
+        old = self.freq.pop(key, None)
+        if old is not None:
+            bucket = self.buckets[old]
+            del bucket[key]
+            if not bucket:
+                del self.buckets[old]
+
+    def victim(self, exclude=()):
+        # Use counts are small integers in practice, so sorting the
+        # distinct counts is cheap compared to scanning every key
+        for count in sorted(self.buckets):
+            for key in self.buckets[count]:
+                if key not in exclude:
+                    return key
+        return None
+
+
+POLICIES = {
+    RejectPolicy.name: RejectPolicy,
+    LRUPolicy.name: LRUPolicy,
+    LFUPolicy.name: LFUPolicy,
+}
+
+
+def make_policy(name):
+    try:
+        return POLICIES[name.lower()]()
+    except KeyError:
+        raise ValueError(
+            f"unknown eviction policy '{name}', expected one of {sorted(POLICIES)}") from None
@@ -0,0 +1,244 @@
+import threading
+import time
+
+import grpc
+
+import metrics
+import tracing
+from retry import LOAD_SHED_TRAILER
+
+RPC_TOTAL = metrics.Counter(
+    "kvstore_rpc_total", "RPCs handled by the KV store, by method and status code",
+    ("method", "code"))
+RPC_LATENCY = metrics.Histogram(
+    "kvstore_rpc_latency_seconds", "Wall-clock time spent in each RPC handler", ("method",))
+STREAM_MESSAGES = metrics.Histogram(
+    "kvstore_rpc_stream_messages", "Messages per streaming RPC", ("method", "direction"),
+    buckets=(1, 10, 100, 1_000, 10_000, 100_000, 1_000_000))
+
+
+def method_name(handler_call_details):
+    # "/csci5105.kvstore.KeyValueStore/Put" -> "Put"
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+def wrap_handler(handler, wrap):
+    """
+    Rebuild an RpcMethodHandler with its behavior replaced by
+    wrap(behavior, request_streaming, response_streaming).
+    """
+    if handler.unary_unary:
+        behavior, factory = handler.unary_unary, grpc.unary_unary_rpc_method_handler
+    elif handler.unary_stream:
+        behavior, factory = handler.unary_stream, grpc.unary_stream_rpc_method_handler
+    elif handler.stream_unary:
+        behavior, factory = handler.stream_unary, grpc.stream_unary_rpc_method_handler
+    else:
+        behavior, factory = handler.stream_stream, grpc.stream_stream_rpc_method_handler
+
+    return factory(
+        wrap(behavior, handler.request_streaming, handler.response_streaming),
+        request_deserializer=handler.request_deserializer,
+        response_serializer=handler.response_serializer,
+    )
+
+
+def status_code(context, failed):
+    # context.code() is only set when a handler aborts or calls set_code()
+    code = context.code()
+    if code is None:
+        code = grpc.StatusCode.UNKNOWN if failed else grpc.StatusCode.OK
+    return code.name
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records per-method call counts, status codes, latency and stream sizes."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        method = method_name(handler_call_details)
+        return wrap_handler(
+            handler,
+            lambda behavior, req_stream, resp_stream: self._instrument(
+                behavior, method, req_stream, resp_stream))
+
+    @staticmethod
+    def _count_requests(request_iterator, received):
+        for request in request_iterator:
+            received[0] += 1
+            yield request
+
+    def _instrument(self, behavior, method, request_streaming, response_streaming):
+
+        def record(start, context, failed, received, sent):
+            RPC_LATENCY.observe(time.perf_counter() - start, method=method)
+            RPC_TOTAL.inc(method=method, code=status_code(context, failed))
+            if request_streaming:
+                STREAM_MESSAGES.observe(received[0], method=method, direction="received")
+            if response_streaming:
+                STREAM_MESSAGES.observe(sent, method=method, direction="sent")
+
+        if response_streaming:
+            def wrapper(request, context):
+                start = time.perf_counter()
+                received = [0]
+                sent = 0
+                failed = False
+                if request_streaming:
+                    request = self._count_requests(request, received)
+                try:
+                    for response in behavior(request, context):
+                        sent += 1
+                        yield response
+                except BaseException:
+                    failed = True
+                    raise
+                finally:
+                    record(start, context, failed, received, sent)
+        else:
+            def wrapper(request, context):
+                start = time.perf_counter()
+                received = [0]
+                failed = False
+                if request_streaming:
+                    request = self._count_requests(request, received)
+                try:
+                    return behavior(request, context)
+                except BaseException:
+                    failed = True
+                    raise
+                finally:
+                    record(start, context, failed, received, 1)
+
+        return wrapper
+
+
+class TracingInterceptor(grpc.ServerInterceptor):
+    """
+    Traces calls that arrive with an `x-trace-id` metadata entry under that
+    ID, so lock waits inside the call show up as spans. The
+    finished trace goes to sink(trace) and the ID and server-side time are
+    echoed back in the trailing metadata. Untraced calls pass straight through.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        trace_id = tracing.trace_id_from(handler_call_details.invocation_metadata)
+        if trace_id is None:
+            return handler
+
+        method = method_name(handler_call_details)
+        return wrap_handler(
+            handler,
+            lambda behavior, req_stream, resp_stream: self._trace(
+                behavior, method, trace_id, resp_stream))
+
+    @staticmethod
+    def _trailers(context, trace):
+        context.set_trailing_metadata((
+            (tracing.TRACE_HEADER, trace.trace_id),
+            ("x-trace-server-ms", f"{1000.0 * (time.perf_counter() - trace.start):.3f}"),
+        ))
+
+    def _trace(self, behavior, method, trace_id, response_streaming):
+
+        if response_streaming:
+            def wrapper(request, context):
+                with tracing.trace(method, trace_id, self.sink) as trace:
+                    yield from behavior(request, context)
+                    self._trailers(context, trace)
+        else:
+            def wrapper(request, context):
+                with tracing.trace(method, trace_id, self.sink) as trace:
+                    response = behavior(request, context)
+                    self._trailers(context, trace)
+                    return response
+
+        return wrapper
+
+
+ADMISSION_REJECTED = metrics.Counter(
+    "kvstore_admission_rejected_total", "RPCs turned away before reaching their handler",
+    ("method", "reason"))
+
+# Bulk mutations. Everything else (GetText, List, Stats, StreamEmbeddings, ...)
+# is a read and is never held back by the admission controller
+WRITE_METHODS = frozenset({"Put", "PutIfChanged", "Delete", "DeleteByPrefix", "ReplaceDocument",
+                           "SetSchema"})
+
+
+class AdmissionInterceptor(grpc.ServerInterceptor):
+    """
+    Keeps bulk writes from starving interactive reads on the shared worker pool.
+
+    At most `max_writes` write RPCs run at once. A write that finds no free
+    slot is turned away at once with RESOURCE_EXHAUSTED and the
+    LOAD_SHED_TRAILER trailer, so the client backs off and retries. Waiting
+    for a slot would hold a worker that a read could use, so writes never
+    wait and the remaining workers are always available to reads. Any call
+    whose deadline has already passed is rejected with DEADLINE_EXCEEDED
+    instead of doing work nobody is waiting for.
+    """
+
+    def __init__(self, max_writes):
+        self.max_writes = max_writes
+        self.write_slots = threading.BoundedSemaphore(max_writes) if max_writes else None
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        method = method_name(handler_call_details)
+        is_write = self.write_slots is not None and method in WRITE_METHODS
+        return wrap_handler(
+            handler,
+            lambda behavior, req_stream, resp_stream: self._admit(
+                behavior, method, is_write, resp_stream))
+
+    def _acquire(self, method, is_write, context):
+        # Aborts the RPC (raises) if it can't be admitted
+        remaining = context.time_remaining()
+        if remaining is not None and remaining <= 0:
+            ADMISSION_REJECTED.inc(method=method, reason="deadline")
+            context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "deadline expired before the call was handled")
+        if not is_write:
+            return
+
+        if not self.write_slots.acquire(blocking=False):
+            ADMISSION_REJECTED.inc(method=method, reason="overloaded")
+            # Tells clients this RESOURCE_EXHAUSTED is load shedding, worth a
+            # retry, and not a full collection, which isn't
+            context.set_trailing_metadata(((LOAD_SHED_TRAILER, "1"),))
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          f"server busy: {self.max_writes} writes already in flight, retry with backoff")
+
+    def _admit(self, behavior, method, is_write, response_streaming):
+
+        if response_streaming:
+            def wrapper(request, context):
+                self._acquire(method, is_write, context)
+                try:
+                    yield from behavior(request, context)
+                finally:
+                    if is_write:
+                        self.write_slots.release()
+        else:
+            def wrapper(request, context):
+                self._acquire(method, is_write, context)
+                try:
+                    return behavior(request, context)
+                finally:
+                    if is_write:
+                        self.write_slots.release()
+
+        return wrapper
@@ -0,0 +1,101 @@
+"""
+On-demand profiling of the running server, behind the Profile admin RPC.
+
+cpu: samples every thread's Python stack with sys._current_frames() every
+`interval` seconds. Nothing is hooked into the interpreter, so handlers run
+at full speed while a profile is taken and nothing is left behind after it.
+Threads that are idle (parked in threading/queue/selectors waits, or gRPC's
+completion-queue poller) are not counted.
+
+memory: tracemalloc snapshots at the start and end of the window, reporting
+where the memory still allocated at the end was allocated during it.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+MODES = ("cpu", "memory")
+
+# A thread whose innermost frame is in one of these is waiting for work
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "socketserver.py",
+              os.path.join("concurrent", "futures", "thread.py"))
+# gRPC's poller thread sits in this loop, blocked in C, whether or not calls arrive
+IDLE_FUNCTIONS = {(os.path.join("grpc", "_server.py"), "_serve")}
+
+# One profile at a time; a second request is refused rather than queued
+PROFILE_LOCK = threading.Lock()
+
+
+def is_idle(frame):
+    code = frame.f_code
+    if code.co_filename.endswith(IDLE_FILES):
+        return True
+    return any(code.co_name == name and code.co_filename.endswith(path)
+               for path, name in IDLE_FUNCTIONS)
+
+
+def where(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_cpu(seconds, interval=0.005, top=25):
+    """
+    Returns (report, ticks). Each function gets its self and total share of
+    the busy samples, hottest self time first.
+    """
+    me = threading.get_ident()
+    self_counts = {}
+    total_counts = {}
+    busy = 0
+    ticks = 0
+
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        ticks += 1
+        for ident, frame in sys._current_frames().items():
+            if ident == me or is_idle(frame):
+                continue
+            busy += 1
+            self_counts[frame.f_code] = self_counts.get(frame.f_code, 0) + 1
+            # Recursion must count a function once per sample
+            seen = set()
+            while frame is not None:
+                if frame.f_code not in seen:
+                    seen.add(frame.f_code)
+                    total_counts[frame.f_code] = total_counts.get(frame.f_code, 0) + 1
+                frame = frame.f_back
+        time.sleep(interval)
+
+    lines = [f"cpu: {ticks} ticks every {1000 * interval:g} ms over {seconds:g} s, "
+             f"{busy} busy thread samples"]
+    if busy:
+        lines.append(f"{'self%':>7} {'total%':>7}  function")
+        ranked = sorted(total_counts, key=lambda c: (-self_counts.get(c, 0), -total_counts[c]))
+        for code in ranked[:top]:
+            lines.append(f"{100 * self_counts.get(code, 0) / busy:7.1f} "
+                         f"{100 * total_counts[code] / busy:7.1f}  {where(code)}")
+    return "\n".join(lines), ticks
+
+
+def sample_memory(seconds, top=25):
+    """Returns (report, allocation sites). Starts tracemalloc for the window if it isn't running."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    stats = [s for s in after.compare_to(before, "lineno") if s.size_diff]
+    lines = [f"memory: {len(stats)} allocation sites changed over {seconds:g} s, "
+             f"traced {current / 1e6:.1f} MB (peak {peak / 1e6:.1f} MB)"]
+    lines.extend(str(stat) for stat in stats[:top])
+    return "\n".join(lines), len(stats)
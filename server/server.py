@@ -1,110 +1,542 @@
 import os
+import dataclasses
 import threading
 from concurrent import futures
 import grpc
 import signal
 from pathlib import Path
 import pickle
+import re
 import sys
+import time
 
 import kvstore_pb2
 import kvstore_pb2_grpc
 
+import eviction
+import interceptors
+import metrics
+import profiler
+import textcodec
+import vectorstore
+from content_hash import DIGEST_SIZE, content_hash, entry_digest
+
 # Derived from the environment variables (see devcontainer.json)
 GRPC_SERVER_PORT = int(os.getenv("KVSTORE_PORT", "50051"))
 
-# Python Pickle disc file where we will dump and load our data when starting and ending
+# Memory cap on stored payload bytes (0 = unbounded) and what to do when it is hit:
+# "reject" fails the Put with RESOURCE_EXHAUSTED, "lru"/"lfu" evict other keys
+KVSTORE_MAX_BYTES = int(os.getenv("KVSTORE_MAX_BYTES", "0"))
+KVSTORE_EVICTION = os.getenv("KVSTORE_EVICTION", "reject")
+
+# Optional per-chunk text compression ("none" or "zlib"), its zlib level,
+# and how many decompressed chunks to keep hot for GetText
+KVSTORE_TEXT_COMPRESSION = os.getenv("KVSTORE_TEXT_COMPRESSION", "none")
+KVSTORE_TEXT_COMPRESSION_LEVEL = int(os.getenv("KVSTORE_TEXT_COMPRESSION_LEVEL", "6"))
+KVSTORE_TEXT_CACHE_SIZE = int(os.getenv("KVSTORE_TEXT_CACHE_SIZE", "1024"))
+
+# Worker threads, how many of them bulk writes may occupy (0 = no limit) so
+# reads are never stuck behind an ingestion burst, and an optional hard cap on
+# RPCs accepted at once (0 = none). gRPC enforces that cap without telling
+# reads from writes, so it is off by default and writes are bounded by
+# admission control instead
+KVSTORE_WORKERS = int(os.getenv("KVSTORE_WORKERS", "8"))
+KVSTORE_MAX_CONCURRENT_RPCS = int(os.getenv("KVSTORE_MAX_CONCURRENT_RPCS", "0"))
+KVSTORE_MAX_WRITES = int(os.getenv("KVSTORE_MAX_WRITES", "4"))
+
+# Background snapshots: a collection is written to disk once this many seconds
+# have passed since its last snapshot, or once it has seen this many mutations,
+# whichever comes first (0 disables that trigger)
+KVSTORE_SNAPSHOT_INTERVAL = float(os.getenv("KVSTORE_SNAPSHOT_INTERVAL", "300"))
+KVSTORE_SNAPSHOT_MUTATIONS = int(os.getenv("KVSTORE_SNAPSHOT_MUTATIONS", "10000"))
+
+# Port for the Prometheus-style /metrics endpoint (0 = disabled)
+KVSTORE_METRICS_PORT = int(os.getenv("KVSTORE_METRICS_PORT", "0"))
+
+# Upper bound on one Profile call, which holds a worker for its whole duration
+KVSTORE_PROFILE_MAX_SECONDS = float(os.getenv("KVSTORE_PROFILE_MAX_SECONDS", "60"))
+
+LOCK_WAIT = metrics.Histogram(
+    "kvstore_lock_wait_seconds", "Time spent waiting to acquire a collection's lock", ("collection",))
+SNAPSHOT_SECONDS = metrics.Histogram(
+    "kvstore_snapshot_seconds",
+    "Time spent per snapshot phase (copy = under the collection lock, write = pickling and fsync)",
+    ("collection", "phase"))
+
+# Python Pickle disc file where we will dump and load our data when starting and ending.
+# The default collection keeps this name, any other collection <name> lives beside it
+# as kvstore.<name>.pkl
 KV_STORE_DISK = Path(Path(__file__).parent, "kvstore.pkl")
 
-class InMemoryKV(kvstore_pb2_grpc.KeyValueStoreServicer):
+# Collection used when a request leaves the field empty, and the names we accept
+# (they become part of a file name)
+DEFAULT_COLLECTION = "default"
+COLLECTION_NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def collection_disk_path(disk_path, name):
+    if name == DEFAULT_COLLECTION:
+        return disk_path
+    return disk_path.with_name(f"{disk_path.stem}.{name}{disk_path.suffix}")
+
+
+def doc_id_of(key):
+    # Keys look like "<doc_id>:<chunk index>"; the doc id itself may contain ':'
+    return key.rsplit(":", 1)[0]
+
+
+def fsync_dir(path):
+    # Make a rename inside `path` durable. Not every platform can open a directory
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def schema_to_proto(schema):
+    if schema is None:
+        return kvstore_pb2.VectorSchema()
+    return kvstore_pb2.VectorSchema(dim=schema.dim, dtype=schema.dtype, normalized=schema.normalized)
+
+
+class Collection:
+    """
+    One named corpus: its chunks and embeddings plus their byte accounting,
+    eviction policy, text codec, lock and persistence file.
+    """
+
+    def __init__(self, name, disk_path, max_bytes=KVSTORE_MAX_BYTES,
+                 eviction_policy=KVSTORE_EVICTION, text_compression=KVSTORE_TEXT_COMPRESSION):
+        self.name = name
+        self.disk_path = disk_path
 
-    def __init__(self):
         # Instantiate two dictionaries (hash tables) for the
         # the mapping of keys to textbook chunks and keys to embeddings
 
-        self.textbook_chunks = {}   # key -> bytes (JSON)
-        # key -> bytes (numpy array of numpy float-32's)
+        self.textbook_chunks = {}   # key -> str, or zlib bytes when compressed (see textcodec)
+        # key -> bytes (numpy array of numpy float-32's). Once a schema is
+        # declared this becomes a vectorstore.EmbeddingStore with the same interface
         self.embeddings = {}
-
-        # Protects shared dicts
-        self.lock = threading.RLock()
-
-        # Attempt to load previous data from disk
-        self.load_from_disk()
+        self.schema = None
+        # key -> content hash of the plain text + embedding, for incremental sync,
+        # and their XOR-combined digest: a fingerprint of the whole collection
+        self.hashes = {}
+        self.content_digest = 0
+
+        # Byte accounting: key -> (text bytes, embedding bytes) plus running totals.
+        # With a schema, embedding_bytes is the whole EmbeddingStore matrix
+        # (spare rows included) and entries count no embedding bytes of their own
+        self.entry_sizes = {}
+        self.text_bytes = 0
+        self.embedding_bytes = 0
+
+        # Capacity limit and eviction. Without a cap nothing can ever be
+        # evicted, so skip the per-access bookkeeping entirely
+        self.max_bytes = max_bytes
+        self.eviction = eviction.make_policy(eviction_policy if max_bytes else "reject")
+        self.evictions = 0
+        self.rejected_puts = 0
+
+        # Bumped on every insert/overwrite/removal, so readers (the MCP index)
+        # can tell from Stats alone whether anything changed
+        self.mutations = 0
+
+        # Encodes chunk text for storage (optionally compressed) and caches hot decodes
+        self.codec = textcodec.TextCodec(
+            text_compression, KVSTORE_TEXT_COMPRESSION_LEVEL, KVSTORE_TEXT_CACHE_SIZE)
+
+        # Protects this collection's dicts. Acquisitions are timed for the metrics endpoint
+        self.lock = metrics.TimedLock(threading.RLock(), LOCK_WAIT, collection=name)
+
+        # Serializes snapshots of this collection (never held together with
+        # self.lock for longer than the copy), and what the last one covered
+        self.persist_lock = threading.Lock()
+        self.persisted_mutations = 0
+        self.persisted_at = time.monotonic()
+
+    def dirty(self):
+        return self.mutations != self.persisted_mutations
 
     def persist_to_disk(self):
-        with self.lock:
+        with self.persist_lock:
+            # Point-in-time view: shallow copies made at C speed under the lock.
+            # Texts and embedding bytes are immutable and writers replace rather
+            # than modify them, so the copies share them with the live store
+            # (an EmbeddingStore copies its matrix, a single memcpy)
+            start = time.perf_counter()
+            with self.lock:
+                mutations = self.mutations
+                chunks = self.textbook_chunks.copy()
+                embeddings = self.embeddings.copy()
+                schema = self.schema
+            SNAPSHOT_SECONDS.observe(time.perf_counter() - start, collection=self.name, phase="copy")
+
+            # Everything else happens without the lock, so serving never waits on it
+            start = time.perf_counter()
             data = {
-                "textbook_chunks": dict(self.textbook_chunks),
-                "embeddings": dict(self.embeddings)
+                "textbook_chunks": chunks,
+                "embeddings": dict(embeddings),
+                "schema": dataclasses.asdict(schema) if schema else None
             }
 
-        with open(KV_STORE_DISK, "wb") as f:
-            pickle.dump(data, f)
+            # Write beside the real file, flush it to the disk and rename over
+            # the old snapshot, so a crash mid-write never leaves a torn file
+            tmp = self.disk_path.with_name(self.disk_path.name + ".tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.disk_path)
+            fsync_dir(self.disk_path.parent)
+            SNAPSHOT_SECONDS.observe(time.perf_counter() - start, collection=self.name, phase="write")
+
+            self.persisted_mutations = mutations
+            self.persisted_at = time.monotonic()
 
         print(
-            f"Dumped textbook_chunks & embeddings to disk via [{KV_STORE_DISK.name}]")
+            f"Dumped [{self.name}] textbook_chunks & embeddings to disk via [{self.disk_path.name}]")
 
     def load_from_disk(self):
-        if not KV_STORE_DISK.exists():
+        if not self.disk_path.exists():
             return
 
-        with open(KV_STORE_DISK, "rb") as f:
+        with open(self.disk_path, "rb") as f:
             data = pickle.load(f)
 
         with self.lock:
-            self.textbook_chunks = data.get("textbook_chunks", {})
-            self.embeddings = data.get("embeddings", {})
+            self.textbook_chunks = {}
+            self.embeddings = {}
+            self.hashes = {}
+            self.content_digest = 0
+            self.schema = None
+            if data.get("schema"):
+                # Entries were validated when they were first written
+                self.schema = vectorstore.VectorSchema(**data["schema"])
+                self.embeddings = vectorstore.EmbeddingStore(
+                    self.schema, capacity=max(1024, len(data.get("embeddings", {}))))
+                self.embedding_bytes = self.embeddings.nbytes
+            embeddings = data.get("embeddings", {})
+            for key, text in data.get("textbook_chunks", {}).items():
+                # Hashes aren't persisted, they are recomputed from the plain text
+                embedding = embeddings.get(key, b"")
+                digest = content_hash(textcodec.TextCodec.plain(text), embedding)
+                # Plain chunks from an older or uncompressed snapshot are
+                # re-encoded, already compressed ones are kept as they are
+                if isinstance(text, str):
+                    text = self.codec.encode(text)
+                self._insert(key, text, embedding, digest)
+
+            # What was just loaded is exactly what is on disk
+            self.persisted_mutations = self.mutations
 
         print(
-            f"Loaded textbook_chunks and embeddings from disk via [{KV_STORE_DISK.name}]")
+            f"Loaded [{self.name}] textbook_chunks and embeddings from disk via [{self.disk_path.name}]")
         print(f"[{len(self.textbook_chunks)}] key/values loaded")
 
+    def set_schema(self, schema):
+        # Caller must hold self.lock. Returns why the stored vectors don't fit
+        # the schema (nothing is changed then), or None once it is in effect
+        if schema == self.schema:
+            return None
+
+        keys = list(self.embeddings)
+        bad = schema.check([self.embeddings[key] for key in keys])
+        if bad is not None:
+            i, why = bad
+            return f"stored embedding for '{keys[i]}' {why}"
+
+        store = vectorstore.EmbeddingStore(schema, capacity=max(1024, len(keys)))
+        for key in keys:
+            store[key] = self.embeddings[key]
+            self.entry_sizes[key] = (self.entry_sizes[key][0], 0)
+        self.embeddings = store
+        self.embedding_bytes = store.nbytes
+        self.schema = schema
+        return None
+
+    def _sizes(self, stored_text, embedding):
+        # Embeddings in an EmbeddingStore are paid for by its matrix
+        emb_size = 0 if self.schema is not None else len(embedding)
+        return textcodec.TextCodec.stored_size(stored_text), emb_size
+
+    def _growth(self, new_rows, live=None):
+        # Bytes the EmbeddingStore matrix would grow by (0 without a schema)
+        return 0 if self.schema is None else self.embeddings.growth(new_rows, live)
+
+    def _insert(self, key, text, embedding, digest, sizes=None):
+        # Caller must hold self.lock. `digest` is the content_hash of the plain text
+        text_size, emb_size = sizes or self._sizes(text, embedding)
+        old_text, old_emb = self.entry_sizes.get(key, (0, 0))
+
+        old_digest = self.hashes.get(key)
+        if old_digest is not None:
+            self.content_digest ^= entry_digest(key, old_digest)
+        self.content_digest ^= entry_digest(key, digest)
+
+        self.textbook_chunks[key] = text
+        self.embeddings[key] = embedding
+        self.hashes[key] = digest
+        self.entry_sizes[key] = (text_size, emb_size)
+        self.text_bytes += text_size - old_text
+        self.embedding_bytes += emb_size - old_emb
+        if self.schema is not None:
+            # The matrix may have doubled to make room for this row
+            self.embedding_bytes = self.embeddings.nbytes
+        self.eviction.record_insert(key)
+        self.mutations += 1
+
+    def _remove(self, key):
+        # Caller must hold self.lock
+        if key not in self.textbook_chunks:
+            return False
+
+        del self.textbook_chunks[key]
+        self.embeddings.pop(key, None)
+        self.content_digest ^= entry_digest(key, self.hashes.pop(key))
+        text_size, emb_size = self.entry_sizes.pop(key)
+        self.text_bytes -= text_size
+        self.embedding_bytes -= emb_size
+        self.eviction.record_remove(key)
+        self.codec.forget(key)
+        self.mutations += 1
+        return True
+
+    def _make_room(self, needed, protected, new_rows=0):
+        # Caller must hold self.lock. Evicts keys outside `protected` until
+        # `needed` more bytes, plus whatever the EmbeddingStore matrix must
+        # grow by for `new_rows` more rows, fit under the cap. Returns False
+        # if they can't.
+        if not self.max_bytes:
+            return True
+
+        # If the write can't fit even after evicting everything else, reject
+        # it up front instead of emptying the store for nothing. The matrix
+        # never shrinks, so it counts in full however much is evicted
+        floor = sum(sum(self.entry_sizes.get(key, (0, 0))) for key in protected)
+        if self.schema is not None:
+            live = sum(1 for key in protected if key in self.embeddings)
+            floor += self.embeddings.nbytes + self._growth(new_rows, live)
+        if floor + needed > self.max_bytes:
+            self.rejected_puts += 1
+            return False
+
+        # Each eviction frees a row, which can spare the matrix from growing
+        while self.text_bytes + self.embedding_bytes + needed + self._growth(new_rows) > self.max_bytes:
+            victim = self.eviction.victim(exclude=protected)
+            if victim is None:
+                self.rejected_puts += 1
+                return False
+            self._remove(victim)
+            self.evictions += 1
+        return True
+
+    def _keys_with_prefix(self, prefix):
+        # Caller must hold self.lock
+        return [key for key in self.textbook_chunks if key.startswith(prefix)]
+
+    def _keys_of_document(self, doc_id):
+        # Caller must hold self.lock. The prefix alone would also match the
+        # chunks of a document "<doc_id>:<more>", since doc ids may contain ':'
+        return [key for key in self._keys_with_prefix(f"{doc_id}:") if doc_id_of(key) == doc_id]
+
+
+class InMemoryKV(kvstore_pb2_grpc.KeyValueStoreServicer):
+
+    def __init__(self, max_bytes=KVSTORE_MAX_BYTES, eviction_policy=KVSTORE_EVICTION,
+                 disk_path=KV_STORE_DISK, text_compression=KVSTORE_TEXT_COMPRESSION):
+        # Collections are created lazily, so check their settings now: a typo
+        # should stop the server at startup, not fail each collection's first write
+        eviction.make_policy(eviction_policy)
+        textcodec.TextCodec(text_compression)
+
+        # Settings every collection is created with
+        self.collection_config = {
+            "max_bytes": max_bytes,
+            "eviction_policy": eviction_policy,
+            "text_compression": text_compression,
+        }
+
+        # name -> Collection. The registry lock only guards the dict itself,
+        # each collection has its own lock for its data
+        self.collections = {}
+        self.collections_lock = threading.Lock()
+
+        # Attempt to load previous data from disk
+        self.disk_path = Path(disk_path)
+        self.load_from_disk()
+
+    def _new_collection(self, name):
+        return Collection(name, collection_disk_path(self.disk_path, name), **self.collection_config)
+
+    @staticmethod
+    def _check_name(name, context):
+        # Names become part of a file name, so only a safe alphabet is allowed
+        if not COLLECTION_NAME.fullmatch(name):
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          f"invalid collection name '{name}' (letters, digits, '_' and '-' only)")
+
+    def collection(self, name, context=None, create=False):
+        # Returns the named collection, or None if it doesn't exist and create is False
+        name = name or DEFAULT_COLLECTION
+        col = self.collections.get(name)
+        if col is not None or not create:
+            return col
+
+        self._check_name(name, context)
+
+        with self.collections_lock:
+            col = self.collections.get(name)
+            if col is None:
+                col = self.collections[name] = self._new_collection(name)
+            return col
+
+    def persist_to_disk(self, only_dirty=False):
+        with self.collections_lock:
+            collections = list(self.collections.values())
+        for col in collections:
+            if only_dirty and not col.dirty():
+                continue
+            col.persist_to_disk()
+
+    def load_from_disk(self):
+        # The default file plus any kvstore.<name>.pkl beside it
+        names = []
+        if self.disk_path.exists():
+            names.append(DEFAULT_COLLECTION)
+        for path in self.disk_path.parent.glob(f"{self.disk_path.stem}.*{self.disk_path.suffix}"):
+            name = path.name[len(self.disk_path.stem) + 1:-len(self.disk_path.suffix) or None]
+            if COLLECTION_NAME.fullmatch(name) and name != DEFAULT_COLLECTION:
+                names.append(name)
+
+        for name in names:
+            col = self._new_collection(name)
+            col.load_from_disk()
+            with self.collections_lock:
+                self.collections[name] = col
+
     def Put(self, request, context):
-        with self.lock:
+        col = self.collection(request.collection, context, create=True)
+        digest = content_hash(request.textbook_chunk, request.embedding)
+        overwritten = self._put(col, request, digest, context)
+
+        # Return the response
+        return kvstore_pb2.PutResponse(overwritten=overwritten)
+
+    def PutIfChanged(self, request, context):
+        col = self.collection(request.collection, context, create=True)
+        digest = content_hash(request.textbook_chunk, request.embedding)
+
+        with col.lock:
+            if col.hashes.get(request.key) == digest:
+                return kvstore_pb2.PutIfChangedResponse(changed=False, overwritten=False)
+
+        overwritten = self._put(col, request, digest, context)
+        return kvstore_pb2.PutIfChangedResponse(changed=True, overwritten=overwritten)
+
+    def GetHashes(self, request, context):
+        col = self.collection(request.collection)
+        if col is None:
+            return
+
+        with col.lock:
+            items = [(key, col.hashes[key]) for key in col._keys_with_prefix(request.prefix)]
+        for key, digest in items:
+            yield kvstore_pb2.KeyHash(key=key, hash=digest)
+
+    @staticmethod
+    def _validate(col, schema, keys, embeddings, context):
+        # Abort with INVALID_ARGUMENT if any embedding breaks the collection's schema
+        bad = schema.check(embeddings) if schema is not None else None
+        if bad is not None:
+            i, why = bad
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          f"embedding for '{keys[i]}' {why} (schema of collection '{col.name}')")
+
+    def _put(self, col, request, digest, context):
+        # Store one chunk; returns whether the key already existed
+
+        # Validate, encode and size the entry before taking the lock
+        schema = col.schema
+        self._validate(col, schema, [request.key], [request.embedding], context)
+        text = col.codec.encode(request.textbook_chunk)
+        sizes = col._sizes(text, request.embedding)
+
+        with col.lock:
+            # A schema declared in the meantime still applies to this write
+            if col.schema != schema:
+                self._validate(col, col.schema, [request.key], [request.embedding], context)
+                sizes = col._sizes(text, request.embedding)
+
             # Set overwritten based on if the key exists in the dictionaries
-            overwritten = (request.key in self.textbook_chunks) or (
-                request.key in self.embeddings)
+            overwritten = (request.key in col.textbook_chunks) or (
+                request.key in col.embeddings)
+
+            needed = sum(sizes) - sum(col.entry_sizes.get(request.key, (0, 0)))
+            new_rows = int(request.key not in col.embeddings)
+            if not col._make_room(needed, protected=(request.key,), new_rows=new_rows):
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                              f"collection '{col.name}' is full ({col.max_bytes} byte cap)")
 
             # Update or add the textbook chunk and embedding into our dictionary
-            self.textbook_chunks[request.key] = request.textbook_chunk
-            self.embeddings[request.key] = request.embedding
+            col._insert(request.key, text, request.embedding, digest, sizes)
 
-        # Return the response
-        return kvstore_pb2.PutResponse(overwritten=overwritten)
+        return overwritten
 
     def StreamEmbeddings(self, request, context):
-        with self.lock:
-            items = list(self.embeddings.items())
+        col = self.collection(request.collection)
+        if col is None:
+            return
+
+        with col.lock:
+            items = list(col.embeddings.items())
         for key, emb in items:
             yield kvstore_pb2.EmbeddingEntry(key=key, embedding=emb)
 
     def GetText(self, request, context):
-        with self.lock:
-            data = self.textbook_chunks.get(request.key)
+        col = self.collection(request.collection)
+        data = None
+        if col is not None:
+            with col.lock:
+                data = col.textbook_chunks.get(request.key)
+                if data is not None:
+                    col.eviction.record_access(request.key)
 
         if data is None:
             return kvstore_pb2.GetTextResponse(found=False, textbook_chunk="")
 
-        return kvstore_pb2.GetTextResponse(found=True, textbook_chunk=data)
+        # Decompression (if any) happens outside the store lock
+        return kvstore_pb2.GetTextResponse(found=True, textbook_chunk=col.codec.decode(request.key, data))
 
     def Delete(self, request, context):
-        with self.lock:
-            data = request.key in self.textbook_chunks
-            if data:
-                del self.textbook_chunks[request.key]
-                if request.key in self.embeddings:
-                    del self.embeddings[request.key]
+        col = self.collection(request.collection)
+        data = False
+        if col is not None:
+            with col.lock:
+                data = col._remove(request.key)
         return kvstore_pb2.DeleteResponse(deleted=data)
 
     def List(self, request, context):
-        with self.lock:
-            keys = list(self.textbook_chunks.keys())
+        col = self.collection(request.collection)
+        keys = []
+        if col is not None:
+            with col.lock:
+                keys = list(col.textbook_chunks.keys())
         return kvstore_pb2.ListResponse(keys=keys)
 
     def Health(self, request, context):
-        with self.lock:
-            count = len(self.textbook_chunks)
+        with self.collections_lock:
+            collections = list(self.collections.values())
+
+        count = 0
+        for col in collections:
+            with col.lock:
+                count += len(col.textbook_chunks)
 
         return kvstore_pb2.HealthResponse(
             server_name="InMemoryKVStore",
@@ -112,30 +544,264 @@ class InMemoryKV(kvstore_pb2_grpc.KeyValueStoreServicer):
             key_count=count
         )
 
+    def Stats(self, request, context):
+        name = request.collection or DEFAULT_COLLECTION
+        # A collection that doesn't exist yet reports as empty with the default settings
+        col = self.collection(name)
+        if col is None:
+            self._check_name(name, context)
+            col = self._new_collection(name)
+
+        with col.lock:
+            return kvstore_pb2.StatsResponse(
+                key_count=len(col.textbook_chunks),
+                text_bytes=col.text_bytes,
+                embedding_bytes=col.embedding_bytes,
+                total_bytes=col.text_bytes + col.embedding_bytes,
+                max_bytes=col.max_bytes,
+                eviction_policy=col.eviction.name,
+                evictions=col.evictions,
+                rejected_puts=col.rejected_puts,
+                text_compression=col.codec.compression,
+                text_cache_hits=col.codec.hits,
+                text_cache_misses=col.codec.misses,
+                collection=col.name,
+                mutations=col.mutations,
+                schema=schema_to_proto(col.schema),
+                content_digest=col.content_digest.to_bytes(DIGEST_SIZE, "little")
+            )
+
+    def SetSchema(self, request, context):
+        col = self.collection(request.collection, context, create=True)
+        try:
+            schema = vectorstore.VectorSchema(
+                dim=request.schema.dim,
+                dtype=request.schema.dtype or "float32",
+                normalized=request.schema.normalized)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+        with col.lock:
+            error = col.set_schema(schema)
+        if error is not None:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION,
+                          f"cannot apply schema to collection '{col.name}': {error}")
+
+        return kvstore_pb2.SetSchemaResponse(schema=schema_to_proto(schema))
+
+    def Profile(self, request, context):
+        mode = request.mode or "cpu"
+        if mode not in profiler.MODES:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          f"unknown mode '{mode}', expected one of {list(profiler.MODES)}")
+        seconds = request.seconds or 5.0
+        if not 0 < seconds <= KVSTORE_PROFILE_MAX_SECONDS:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          f"seconds must be in (0, {KVSTORE_PROFILE_MAX_SECONDS:g}]")
+        top = request.top or 25
+
+        if not profiler.PROFILE_LOCK.acquire(blocking=False):
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, "a profile is already running")
+        try:
+            if mode == "cpu":
+                report, samples = profiler.sample_cpu(seconds, (request.interval_ms or 5) / 1000.0, top)
+            else:
+                report, samples = profiler.sample_memory(seconds, top)
+        finally:
+            profiler.PROFILE_LOCK.release()
+
+        return kvstore_pb2.ProfileResponse(report=report, samples=samples)
+
+    def ListCollections(self, request, context):
+        with self.collections_lock:
+            collections = sorted(self.collections.items())
+
+        infos = []
+        for name, col in collections:
+            with col.lock:
+                infos.append(kvstore_pb2.CollectionInfo(name=name, key_count=len(col.textbook_chunks)))
+        return kvstore_pb2.ListCollectionsResponse(collections=infos)
+
+    def DeleteByPrefix(self, request, context):
+        # An empty prefix would wipe the whole store, so refuse it
+        if not request.prefix:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "prefix must be non-empty")
+
+        col = self.collection(request.collection)
+        keys = []
+        if col is not None:
+            with col.lock:
+                keys = col._keys_with_prefix(request.prefix)
+                for key in keys:
+                    col._remove(key)
+
+        return kvstore_pb2.DeleteByPrefixResponse(deleted_count=len(keys))
+
+    def ReplaceDocument(self, request_iterator, context):
+        col = None
+        doc_id = None
+        texts = {}
+        embeddings = {}
+        digests = {}
+        sizes = {}
+
+        # Drain the whole stream before touching the store so readers
+        # never observe a half-replaced document
+        for request in request_iterator:
+            if doc_id is None:
+                doc_id = request.doc_id
+                if not doc_id:
+                    context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                                  "first message must carry doc_id")
+                col = self.collection(request.collection, context, create=True)
+
+            if not request.HasField("chunk"):
+                continue
+
+            chunk = request.chunk
+            if ":" not in chunk.key or doc_id_of(chunk.key) != doc_id:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                              f"key '{chunk.key}' does not belong to document '{doc_id}'")
+
+            texts[chunk.key] = col.codec.encode(chunk.textbook_chunk)
+            embeddings[chunk.key] = chunk.embedding
+            digests[chunk.key] = content_hash(chunk.textbook_chunk, chunk.embedding)
+            sizes[chunk.key] = col._sizes(texts[chunk.key], chunk.embedding)
+
+        if doc_id is None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "empty ReplaceDocument stream")
+
+        # The whole document is checked as one batch
+        schema = col.schema
+        self._validate(col, schema, list(embeddings), list(embeddings.values()), context)
+
+        # Swap the chunk set in one critical section, dropping the stale
+        # keys and bulk-inserting the new ones
+        with col.lock:
+            if col.schema != schema:
+                self._validate(col, col.schema, list(embeddings), list(embeddings.values()), context)
+                sizes = {key: col._sizes(texts[key], embeddings[key]) for key in texts}
+
+            old_keys = col._keys_of_document(doc_id)
+            stale = [key for key in old_keys if key not in texts]
+
+            # Check capacity before mutating anything so a rejected
+            # replacement leaves the old document fully intact
+            needed = sum(map(sum, sizes.values())) - sum(
+                sum(col.entry_sizes[key]) for key in old_keys)
+            # Stale rows are freed before the new ones are taken
+            new_rows = max(0, len(texts.keys() - set(old_keys)) - len(stale))
+            if not col._make_room(needed, protected=set(old_keys) | texts.keys(), new_rows=new_rows):
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                              f"collection '{col.name}' is full ({col.max_bytes} byte cap)")
+
+            for key in stale:
+                col._remove(key)
+
+            for key, text in texts.items():
+                col._insert(key, text, embeddings[key], digests[key], sizes[key])
+
+        return kvstore_pb2.ReplaceDocumentResponse(
+            removed_count=len(stale),
+            inserted_count=len(texts)
+        )
 
-def serve():
-    # Single worker keeps semantics simple for now
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
-    kv = InMemoryKV()
+
+def log_trace(trace):
+    print(f"trace {trace.format()}")
+
+
+def build_server(kv, address=f"[::]:{GRPC_SERVER_PORT}", workers=KVSTORE_WORKERS,
+                 max_concurrent_rpcs=KVSTORE_MAX_CONCURRENT_RPCS, max_writes=KVSTORE_MAX_WRITES):
+    # Returns the (not yet started) server and the port it bound to,
+    # which matters when address asks for an ephemeral port (":0").
+    # Tracing wraps everything so a traced call's time in the other interceptors
+    # is part of its trace, then metrics, so calls turned away by admission
+    # control are counted too
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=workers),
+        interceptors=[interceptors.TracingInterceptor(log_trace),
+                      interceptors.MetricsInterceptor(),
+                      interceptors.AdmissionInterceptor(min(max_writes, workers))],
+        maximum_concurrent_rpcs=max_concurrent_rpcs or None)
     kvstore_pb2_grpc.add_KeyValueStoreServicer_to_server(kv, server)
+    port = server.add_insecure_port(address)
+    return server, port
+
+
+class SnapshotScheduler(threading.Thread):
+    """
+    Persists collections in the background: each one once `interval` seconds
+    have passed since its last snapshot or once it has taken `mutations`
+    writes, whichever comes first. Unchanged collections are never rewritten.
+    """
+
+    def __init__(self, kv, interval=KVSTORE_SNAPSHOT_INTERVAL, mutations=KVSTORE_SNAPSHOT_MUTATIONS,
+                 poll=1.0):
+        super().__init__(name="snapshots", daemon=True)
+        self.kv = kv
+        self.interval = interval
+        self.mutations = mutations
+        self.poll = poll
+        self.stopped = threading.Event()
+
+    def due(self, col):
+        if not col.dirty():
+            return False
+        if self.mutations and col.mutations - col.persisted_mutations >= self.mutations:
+            return True
+        return bool(self.interval) and time.monotonic() - col.persisted_at >= self.interval
+
+    def run(self):
+        while not self.stopped.wait(self.poll):
+            with self.kv.collections_lock:
+                collections = list(self.kv.collections.values())
+            for col in collections:
+                if self.due(col):
+                    try:
+                        col.persist_to_disk()
+                    except (OSError, pickle.PicklingError) as e:
+                        print(f"snapshot of [{col.name}] failed: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def serve():
+    try:
+        kv = InMemoryKV()
+    except ValueError as e:
+        sys.exit(f"invalid configuration: {e}")
 
     # Bind to all local interfaces (IPv4 + IPv6) with [::],
     # so clients can connect via localhost or other container addresses
-    server.add_insecure_port(f"[::]:{GRPC_SERVER_PORT}")
+    server, _ = build_server(kv, f"[::]:{GRPC_SERVER_PORT}")
+
+    snapshots = SnapshotScheduler(kv)
 
     # Define a signal handler function to gracefully shut down the server
     def server_shutdown_sig_handler(signum, frame):
         print("shutting down server")
-        kv.persist_to_disk()     # Dump the current KV-Store data to the disk
-        server.stop(grace=1)     # allow in-flight RPCs to finish
+        snapshots.stop()
+        server.stop(grace=1).wait()        # allow in-flight RPCs to finish, accept no new ones
+        kv.persist_to_disk(only_dirty=True)  # only what changed since the last background snapshot
         sys.exit(0)
 
-    # Register the interrupt signal with our handler
-    signal.signal(signal.SIGINT, server_shutdown_sig_handler)  # Ctrl+C
+    # Register the interrupt and terminate signals with our handler
+    signal.signal(signal.SIGINT, server_shutdown_sig_handler)   # Ctrl+C
+    signal.signal(signal.SIGTERM, server_shutdown_sig_handler)  # kill, docker stop, ...
 
     # Start the server then wait for termination
     server.start()
     print(f"listening on :{GRPC_SERVER_PORT}")
+
+    if KVSTORE_SNAPSHOT_INTERVAL or KVSTORE_SNAPSHOT_MUTATIONS:
+        snapshots.start()
+
+    if KVSTORE_METRICS_PORT:
+        metrics.start_http_server(KVSTORE_METRICS_PORT)
+        print(f"metrics on http://127.0.0.1:{KVSTORE_METRICS_PORT}/metrics")
+
     server.wait_for_termination()
 
 
@@ -0,0 +1,85 @@
+import threading
+import zlib
+from collections import OrderedDict
+
+# Chunks shorter than this are stored as plain str, zlib's header and
+# checksum would eat most of the savings
+MIN_COMPRESS_CHARS = 64
+
+
+class TextCodec:
+    """
+    Encodes textbook chunks for storage and decodes them for GetText.
+
+    With compression "none" chunks are stored as the str they arrived as.
+    With "zlib" each chunk is stored as its own zlib stream of the UTF-8
+    bytes, so any key can be decoded independently. Stored values are
+    self-describing (str = plain, bytes = zlib), so a store can be loaded
+    under either setting. Recently decoded chunks are kept in a small LRU.
+    """
+
+    CODECS = ("none", "zlib")
+
+    def __init__(self, compression="none", level=6, cache_size=1024):
+        compression = compression.lower()
+        if compression not in self.CODECS:
+            raise ValueError(
+                f"unknown text compression '{compression}', expected one of {list(self.CODECS)}")
+
+        self.compression = compression
+        self.level = level
+        self.cache_size = cache_size
+
+        # key -> (stored blob, decoded text). The blob is compared by identity
+        # on lookup, so an overwrite can never serve a stale cached text
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, text):
+        if self.compression == "none" or len(text) < MIN_COMPRESS_CHARS:
+            return text
+        return zlib.compress(text.encode("utf-8"), self.level)
+
+    @staticmethod
+    def stored_size(stored):
+        if isinstance(stored, bytes):
+            return len(stored)
+        return len(stored.encode("utf-8"))
+
+    @staticmethod
+    def plain(stored):
+        # Decode without the cache or its counters, for bulk work like
+        # rehashing on load that isn't a client read
+        if not isinstance(stored, bytes):
+            return stored
+        return zlib.decompress(stored).decode("utf-8")
+
+    def decode(self, key, stored):
+        if not isinstance(stored, bytes):
+            return stored
+
+        with self.cache_lock:
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] is stored:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Decompress outside the cache lock so concurrent GetTexts don't serialize
+        text = zlib.decompress(stored).decode("utf-8")
+
+        if self.cache_size:
+            with self.cache_lock:
+                self.cache[key] = (stored, text)
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return text
+
+    def forget(self, key):
+        # Drop a removed key's cached text so it doesn't pin memory
+        with self.cache_lock:
+            self.cache.pop(key, None)
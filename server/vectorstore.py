@@ -0,0 +1,124 @@
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+
+import numpy as np
+
+DTYPES = ("float32", "float16")
+
+# How far a "normalized" vector's L2 norm may be from 1
+NORM_TOLERANCE = 1e-3
+
+
+@dataclass(frozen=True)
+class VectorSchema:
+    """The shape every embedding in a collection must have."""
+    dim: int
+    dtype: str = "float32"
+    normalized: bool = False
+
+    def __post_init__(self):
+        if self.dim <= 0:
+            raise ValueError("dim must be positive")
+        if self.dtype not in DTYPES:
+            raise ValueError(f"unknown dtype '{self.dtype}', expected one of {list(DTYPES)}")
+
+    @property
+    def row_bytes(self):
+        return self.dim * np.dtype(self.dtype).itemsize
+
+    def check(self, embeddings):
+        """
+        Validate a batch of raw embeddings. Returns the index of the first bad
+        one and why, or None if all conform. Length is checked per entry, the
+        values (finite, unit norm) for the whole batch at once.
+        """
+        for i, emb in enumerate(embeddings):
+            if len(emb) != self.row_bytes:
+                return i, f"expected {self.dim} x {self.dtype} ({self.row_bytes} bytes), got {len(emb)} bytes"
+        if not embeddings:
+            return None
+
+        mat = np.frombuffer(b"".join(embeddings), dtype=self.dtype).reshape(len(embeddings), self.dim)
+        finite = np.isfinite(mat).all(axis=1)
+        if not finite.all():
+            return int(np.argmin(finite)), "contains NaN or infinity"
+        if self.normalized:
+            norms = np.linalg.norm(mat.astype(np.float32), axis=1)
+            off = np.abs(norms - 1.0) > NORM_TOLERANCE
+            if off.any():
+                i = int(np.argmax(off))
+                return i, f"is not unit-normalized (norm {norms[i]:.4f})"
+        return None
+
+
+class EmbeddingStore(MutableMapping):
+    """
+    key -> embedding bytes, backed by one preallocated (capacity, dim) matrix
+    instead of a bytes object per key. Rows freed by removals are reused and
+    the matrix doubles when full. Entries must already conform to `schema`;
+    validation happens once, when they are written (see VectorSchema.check).
+    """
+
+    def __init__(self, schema, capacity=1024):
+        self.schema = schema
+        self.matrix = np.empty((capacity, schema.dim), dtype=schema.dtype)
+        self.rows = {}      # key -> row in self.matrix
+        self.free = []      # rows released by removals
+
+    def _grow(self):
+        bigger = np.empty((2 * self.matrix.shape[0], self.schema.dim), dtype=self.matrix.dtype)
+        bigger[:self.matrix.shape[0]] = self.matrix
+        self.matrix = bigger
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes
+
+    def growth(self, new_rows, live=None):
+        """
+        Bytes the matrix would grow by to hold `new_rows` more entries on top
+        of `live` (default: the ones stored now). Freed rows are reused, so
+        only the live count matters.
+        """
+        rows = (len(self.rows) if live is None else live) + new_rows
+        capacity = self.matrix.shape[0]
+        while capacity < rows:
+            capacity *= 2
+        return (capacity - self.matrix.shape[0]) * self.schema.row_bytes
+
+    def __setitem__(self, key, embedding):
+        row = self.rows.get(key)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+            else:
+                # Without free rows, rows 0..len-1 are exactly the ones in use
+                row = len(self.rows)
+                if row == self.matrix.shape[0]:
+                    self._grow()
+            self.rows[key] = row
+        self.matrix[row] = np.frombuffer(embedding, dtype=self.matrix.dtype)
+
+    def __getitem__(self, key):
+        return self.matrix[self.rows[key]].tobytes()
+
+    def __delitem__(self, key):
+        self.free.append(self.rows.pop(key))
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def copy(self):
+        # Independent point-in-time copy: the matrix is duplicated in one memcpy
+        other = EmbeddingStore.__new__(EmbeddingStore)
+        other.schema = self.schema
+        other.matrix = self.matrix.copy()
+        other.rows = dict(self.rows)
+        other.free = list(self.free)
+        return other
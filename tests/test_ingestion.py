@@ -0,0 +1,127 @@
+import sys
+sys.path.insert(0, "ingestion/RAG/")
+import re
+
+import numpy as np
+
+import dedup
+import pdf_ingestor
+
+# Pure-text ingestion helpers (chunking, dedup); run from the project root, no model or server needed
+
+
+def whitespace_tokenizer(text, **kwargs):
+    # Stands in for the model's fast tokenizer: one token per word, with offsets
+    return {"offset_mapping": [(m.start(), m.end()) for m in re.finditer(r"\S+", text)]}
+
+
+def token_spans(text):
+    return [(m.start(), m.end()) for m in re.finditer(r"\S+", text)]
+
+
+def chunk(text, max_tokens, overlap_sentences=1):
+    return pdf_ingestor.chunk_by_tokens(text, "d", whitespace_tokenizer, max_tokens, overlap_sentences)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# chunk_by_tokens
+# ─────────────────────────────────────────────────────────────────────────────
+def test_chunk_coverage():
+    text = " ".join(f"Sentence {i} has {'a few ' * (i % 7)}words." for i in range(200))
+    text += "\n\n" + " ".join(f"w{i}" for i in range(130))  # one sentence longer than max_tokens
+    tokens = token_spans(text)
+
+    for max_tokens in (8, 20, 64):
+        chunks = chunk(text, max_tokens)
+        covered = set()
+        for c in chunks:
+            assert c.text == text[c.char_start:c.char_end]
+            inside = [t for t in tokens if c.char_start <= t[0] and t[1] <= c.char_end]
+            assert 0 < len(inside) <= max_tokens, "chunks must fit the token budget"
+            covered.update(inside)
+        assert covered == set(tokens), "every token should land in some chunk"
+
+        # Chunks move forward and never sit entirely inside the one before
+        for prev, cur in zip(chunks, chunks[1:]):
+            assert cur.char_start > prev.char_start and cur.char_end > prev.char_end
+
+    print("PASSED: chunk coverage")
+
+
+def test_chunk_overlap():
+    # Consecutive chunks share the boundary sentence when it fits
+    text = " ".join(f"Sentence number {i} is short." for i in range(10))
+    chunks = chunk(text, max_tokens=15)
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert cur.char_start < prev.char_end, "neighbouring chunks should overlap"
+
+    # ...but not when the unit after it doesn't fit next to it: that chunk would
+    # hold nothing but the overlap sentence, which the previous chunk already has
+    table = " ".join(f"cell{i}" for i in range(48))
+    text = " ".join(f"Sentence number {i} is short." for i in range(60)) + "\n\n" + table
+    chunks = chunk(text, max_tokens=50)
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert not (prev.char_start <= cur.char_start and cur.char_end <= prev.char_end), \
+            f"{cur.chunk_id} is contained in {prev.chunk_id}"
+    assert chunks[-1].text == table
+
+    # No overlap asked for, none given
+    chunks = chunk(" ".join(f"Sentence number {i} is short." for i in range(10)), 15, 0)
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert cur.char_start >= prev.char_end
+
+    print("PASSED: chunk overlap")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# dedup
+# ─────────────────────────────────────────────────────────────────────────────
+def test_dedup_chunks():
+    words = "process thread message replica consensus clock failure network node latency".split()
+    rng = np.random.default_rng(0)
+    body = " ".join(rng.choice(words, 200))
+    other = " ".join(rng.choice(words, 200))
+    near = body.replace(body.split()[100], "quorum", 1)
+    chunks = [
+        pdf_ingestor.Chunk("d:0", body, 1, 1),
+        pdf_ingestor.Chunk("d:1", "  " + body.upper() + "\n", 1, 1),   # same words, other case/spacing
+        pdf_ingestor.Chunk("d:2", near, 1, 1),                           # one word changed
+        pdf_ingestor.Chunk("d:3", other, 1, 1),
+    ]
+    kept, report = dedup.dedup_chunks(chunks)
+    assert [c.chunk_id for c in kept] == ["d:0", "d:3"], "the first occurrence should win"
+    assert (report.exact, report.near, report.removed) == (1, 1, 2)
+    assert report.removed_ids == ["d:1", "d:2"]
+
+    print("PASSED: dedup chunks")
+
+
+def test_dedup_embeddings():
+    def unit(degrees):
+        r = np.radians(degrees)
+        return np.array([np.cos(r), np.sin(r), 0.0], dtype=np.float32)
+
+    # cos(a, b) = cos(b, c) = 0.985 but cos(a, c) = 0.94: b goes, c is no duplicate of a kept row
+    step = np.degrees(np.arccos(0.985))
+    v = np.stack([unit(0), unit(step), unit(2 * step)])
+    for block in (1, 2, 1024):
+        assert dedup.dedup_embeddings(v, threshold=0.98, block=block).tolist() == [True, False, True]
+
+    # Exact copies are dropped, and the result doesn't depend on the block size
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((300, 32)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    x[200:250] = x[:50]
+    keep = dedup.dedup_embeddings(x, block=64)
+    assert keep[:200].all() and not keep[200:250].any() and keep[250:].all()
+    assert (dedup.dedup_embeddings(x, block=7) == keep).all()
+
+    print("PASSED: dedup embeddings")
+
+
+if __name__ == '__main__':
+    test_chunk_coverage()
+    test_chunk_overlap()
+    test_dedup_chunks()
+    test_dedup_embeddings()
+    print("\nALL TESTS PASSED")
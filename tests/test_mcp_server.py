@@ -3,6 +3,9 @@ sys.path.insert(0, "mcp_server/")
 import mcp_server
 import random
 import json
+from types import SimpleNamespace
+
+import numpy as np
 
 jsonl_path = "ingestion/RAG/output/textbook_distributed_systems_v3.03_vectorized.jsonl"
 
@@ -46,6 +49,163 @@ def test_get_text_from_keys():
     check_not_found()
     print("PASSED: get_text_from_keys()")
 
+def test_publish():
+    print("TESTING: publish()")
+    older = mcp_server.make_snapshot(["a"], None, (1, ""))
+    newer = mcp_server.make_snapshot(["a", "b"], None, (2, ""))
+    collection = "test_publish"
+
+    # The newer build finishes first: the older one must not replace it
+    assert mcp_server.publish(collection, newer)
+    assert not mcp_server.publish(collection, older), "an older build should not be published"
+    assert mcp_server.INDEXES[collection] is newer
+
+    mcp_server.INDEXES.pop(collection)
+    assert mcp_server.publish(collection, older)
+    assert mcp_server.publish(collection, newer), "a newer build should replace an older one"
+    assert mcp_server.INDEXES.pop(collection) is newer
+    print("PASSED: publish()")
+
+def test_load_index_failure():
+    print("TESTING: load_index() failure")
+    collection = "test_load_failure"
+
+    def broken(collection):
+        raise ValueError("buffer size must be a multiple of element size")
+
+    build_index, load_snapshot = mcp_server.build_index, mcp_server.load_snapshot
+    mcp_server.build_index, mcp_server.load_snapshot = broken, lambda collection: None
+    try:
+        ready = mcp_server.INDEX_READY[collection] = mcp_server.threading.Event()
+        mcp_server.load_index(collection, ready)
+    finally:
+        mcp_server.build_index, mcp_server.load_snapshot = build_index, load_snapshot
+
+    # Any error is reported to searches, and the next one tries again
+    assert ready.is_set()
+    assert "ValueError" in mcp_server.INDEX_ERRORS.pop(collection)
+    assert collection not in mcp_server.INDEX_READY, "a failed load should be retried"
+    assert collection not in mcp_server.INDEXES
+    print("PASSED: load_index() failure")
+
+def test_stream_unchecked():
+    print("TESTING: stream_unchecked()")
+    v = np.array([3, 4, 0], dtype=np.float32)
+    stored = [("a:0", v.tobytes()), ("a:1", b""), ("a:2", b"\x01"),
+              ("a:3", np.ones(2, dtype=np.float32).tobytes()), ("a:4", (2 * v).tobytes())]
+
+    class Stub:
+        def StreamEmbeddings(self, req, timeout=None):
+            return (SimpleNamespace(key=k, embedding=e) for k, e in stored)
+
+    req = mcp_server.kvstore_pb2.StreamEmbeddingsRequest(collection="c")
+    keys, mat = mcp_server.stream_unchecked(Stub(), req, 1.0)
+    # Empty, odd-sized and off-dimension entries are skipped, the rest normalized
+    assert keys == ["a:0", "a:4"]
+    assert np.allclose(mat, [[0.6, 0.8, 0], [0.6, 0.8, 0]])
+
+    stored[:] = [("b:0", b"\x01\x02")]
+    assert mcp_server.stream_unchecked(Stub(), req, 1.0) == ([], None)
+    print("PASSED: stream_unchecked()")
+
+def test_refresh_failure():
+    print("TESTING: refresh_once() failure")
+    good = mcp_server.make_snapshot(["g:0"], None, (1, ""))
+    bad = mcp_server.make_snapshot(["b:0"], None, (1, ""))
+    mcp_server.INDEXES.update({"test_refresh_bad": bad, "test_refresh_good": good})
+    checked = []
+
+    def is_current(collection, index):
+        checked.append(collection)
+        if collection == "test_refresh_bad":
+            raise ValueError("bad collection")
+        return True
+
+    original = mcp_server.is_current
+    mcp_server.is_current = is_current
+    try:
+        mcp_server.refresh_once()
+    finally:
+        mcp_server.is_current = original
+        mcp_server.INDEXES.pop("test_refresh_bad")
+        mcp_server.INDEXES.pop("test_refresh_good")
+
+    # The failure is recorded and the next collection is still checked
+    assert "ValueError" in mcp_server.INDEX_ERRORS.pop("test_refresh_bad")
+    assert "test_refresh_good" in checked
+    print("PASSED: refresh_once() failure")
+
+def test_candidates():
+    print("TESTING: candidates()")
+    sims = np.array([0.1, 0.9, -0.5, 0.7, 0.3], dtype=np.float32)
+
+    # Best first, cut at n and at min_score
+    assert mcp_server.candidates(sims, 3, -1.0).tolist() == [1, 3, 4]
+    assert mcp_server.candidates(sims, 10, -1.0).tolist() == [1, 3, 4, 0, 2]
+    assert mcp_server.candidates(sims, 5, 0.5).tolist() == [1, 3]
+    assert mcp_server.candidates(sims, 5, 0.95).tolist() == []
+
+    # top_k < 1 counts as 1
+    assert mcp_server.candidates(sims, 0, -1.0).tolist() == [1]
+    assert mcp_server.candidates(sims, -3, -1.0).tolist() == [1]
+    print("PASSED: candidates()")
+
+def test_mmr():
+    print("TESTING: mmr()")
+    # Rows 0 and 1 are near-duplicates and the two best matches; row 2 is
+    # less relevant but covers something else
+    mat = mcp_server.norm_rows(np.array([[1, 0, 0.2], [1, 0.01, 0.2], [0.3, 0, 1], [0, 1, 0]],
+                                        dtype=np.float32))
+    q = mcp_server.norm_rows(np.array([[1, 0, 0.5]], dtype=np.float32))[0]
+    sims = mat @ q
+    cand = mcp_server.candidates(sims, 4, -1.0)
+
+    assert mcp_server.candidates(sims, 2, -1.0).tolist() == [0, 1]
+    assert mcp_server.mmr(mat, sims, cand, 2, 0.5).tolist() == [0, 2], "MMR should skip the near-duplicate"
+    assert mcp_server.mmr(mat, sims, cand, 2, 1.0).tolist() == [0, 1], "lambda 1 should be plain top-k"
+
+    # Never more than the candidates, nothing from nothing, and top_k < 1 means 1 like candidates()
+    assert sorted(mcp_server.mmr(mat, sims, cand, 10, 0.5).tolist()) == [0, 1, 2, 3]
+    assert mcp_server.mmr(mat, sims, cand[:0], 3, 0.5).tolist() == []
+    for top_k in (0, -2):
+        plain = mcp_server.candidates(sims, top_k, -1.0)
+        assert mcp_server.mmr(mat, sims, cand, top_k, 0.5).tolist() == plain.tolist() == [0]
+    print("PASSED: mmr()")
+
+def test_invalid_collection():
+    print("TESTING: invalid collection names")
+    before = dict(mcp_server.INDEX_READY)
+    for name in ("../x", "a/b", "x" * 65, "sp ace"):
+        result = mcp_server.search("query", 3, name, False, -1.0)
+        assert result["matches"] == [] and "invalid collection name" in result["error"]
+        try:
+            mcp_server.ensure_index(name)
+            assert False, f"ensure_index('{name}') should be refused"
+        except ValueError:
+            pass
+    assert mcp_server.INDEX_READY == before, "no index state should be created for a bad name"
+    print("PASSED: invalid collection names")
+
+def test_ensure_index_fast_path():
+    print("TESTING: ensure_index() fast path")
+    ready = mcp_server.INDEX_READY["test_fast_path"] = mcp_server.threading.Event()
+    ready.set()
+    try:
+        # A known collection is found while another thread holds the lock
+        with mcp_server.INDEX_LOCK:
+            assert mcp_server.ensure_index("test_fast_path") is ready
+    finally:
+        mcp_server.INDEX_READY.pop("test_fast_path")
+    print("PASSED: ensure_index() fast path")
+
 if __name__ == '__main__':
+    test_publish()
+    test_load_index_failure()
+    test_stream_unchecked()
+    test_refresh_failure()
+    test_candidates()
+    test_mmr()
+    test_invalid_collection()
+    test_ensure_index_fast_path()
     test_get_text_from_keys()
     print("\nALL TESTS PASSED")
@@ -1,7 +1,10 @@
 import grpc
+import numpy as np
 import kvstore_pb2
 import kvstore_pb2_grpc
 
+from content_hash import content_hash
+
 
 def get_stub():
     channel = grpc.insecure_channel("localhost:50051")
@@ -183,6 +186,362 @@ def test_Health(stub):
     print("PASSED: Health")
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# RPC: DeleteByPrefix
+# ─────────────────────────────────────────────────────────────────────────────
+def test_DeleteByPrefix(stub):
+    stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="dbp:"))
+    stub.Delete(kvstore_pb2.DeleteRequest(key="dbpx:keep"))
+
+    for k in ["dbp:0", "dbp:1", "dbp:2", "dbpx:keep"]:
+        stub.Put(kvstore_pb2.PutRequest(key=k, textbook_chunk=k, embedding=b"\x01"))
+
+    # Only keys starting with the prefix are removed
+    d = stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="dbp:"))
+    assert d.deleted_count == 3, "all three prefixed keys should be deleted"
+    l = stub.List(kvstore_pb2.ListRequest())
+    assert not any(k.startswith("dbp:") for k in l.keys), "prefixed keys should be gone"
+    assert "dbpx:keep" in l.keys, "keys outside the prefix should remain"
+
+    # Nothing left to delete
+    d2 = stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="dbp:"))
+    assert d2.deleted_count == 0
+
+    # Empty prefix is rejected instead of wiping the store
+    try:
+        stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix=""))
+        assert False, "empty prefix should be rejected"
+    except grpc.RpcError as e:
+        assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+    stub.Delete(kvstore_pb2.DeleteRequest(key="dbpx:keep"))
+
+    print("PASSED: DeleteByPrefix")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# RPC: ReplaceDocument
+# ─────────────────────────────────────────────────────────────────────────────
+def replace_document(stub, doc_id, texts):
+    def requests():
+        yield kvstore_pb2.ReplaceDocumentRequest(doc_id=doc_id)
+        for i, text in enumerate(texts):
+            yield kvstore_pb2.ReplaceDocumentRequest(
+                chunk=kvstore_pb2.PutRequest(key=f"{doc_id}:{i}", textbook_chunk=text, embedding=b"\x01"))
+    return stub.ReplaceDocument(requests())
+
+
+def test_ReplaceDocument(stub):
+    stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="repl:"))
+    stub.Delete(kvstore_pb2.DeleteRequest(key="replx:0"))
+    stub.Put(kvstore_pb2.PutRequest(key="replx:0", textbook_chunk="other doc", embedding=b"\x01"))
+
+    # First revision has four chunks
+    r = replace_document(stub, "repl", ["a", "b", "c", "d"])
+    assert r.inserted_count == 4 and r.removed_count == 0
+
+    # Second revision has two chunks, the stale ones must disappear
+    r2 = replace_document(stub, "repl", ["a2", "b2"])
+    assert r2.inserted_count == 2
+    assert r2.removed_count == 2, "stale chunks repl:2 and repl:3 should be removed"
+    l = stub.List(kvstore_pb2.ListRequest())
+    assert sorted(k for k in l.keys if k.startswith("repl:")) == ["repl:0", "repl:1"]
+    assert stub.GetText(kvstore_pb2.GetTextRequest(key="repl:0")).textbook_chunk == "a2"
+
+    # Similar-looking documents are untouched
+    assert stub.GetText(kvstore_pb2.GetTextRequest(key="replx:0")).found is True
+
+    # Doc ids may contain ':', so "repl:sub" is a different document from "repl"
+    replace_document(stub, "repl:sub", ["nested"])
+    r_sub = replace_document(stub, "repl", ["a2", "b2"])
+    assert r_sub.removed_count == 0, "another document's chunks must not count as stale"
+    assert stub.GetText(kvstore_pb2.GetTextRequest(key="repl:sub:0")).textbook_chunk == "nested"
+    def nested_requests():
+        yield kvstore_pb2.ReplaceDocumentRequest(doc_id="repl")
+        yield kvstore_pb2.ReplaceDocumentRequest(
+            chunk=kvstore_pb2.PutRequest(key="repl:sub:0", textbook_chunk="x", embedding=b"\x01"))
+    try:
+        stub.ReplaceDocument(nested_requests())
+        assert False, "a chunk of document 'repl:sub' should be rejected for 'repl'"
+    except grpc.RpcError as e:
+        assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+    replace_document(stub, "repl:sub", [])
+
+    # Chunks of another document are rejected and nothing is changed
+    def bad_requests():
+        yield kvstore_pb2.ReplaceDocumentRequest(doc_id="repl")
+        yield kvstore_pb2.ReplaceDocumentRequest(
+            chunk=kvstore_pb2.PutRequest(key="elsewhere:0", textbook_chunk="x", embedding=b"\x01"))
+    try:
+        stub.ReplaceDocument(bad_requests())
+        assert False, "foreign key should be rejected"
+    except grpc.RpcError as e:
+        assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert stub.GetText(kvstore_pb2.GetTextRequest(key="repl:1")).textbook_chunk == "b2"
+
+    # Replacing with no chunks empties the document
+    r3 = replace_document(stub, "repl", [])
+    assert r3.inserted_count == 0 and r3.removed_count == 2
+    assert stub.GetText(kvstore_pb2.GetTextRequest(key="repl:0")).found is False
+
+    stub.Delete(kvstore_pb2.DeleteRequest(key="replx:0"))
+
+    print("PASSED: ReplaceDocument")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# RPC: Stats
+# ─────────────────────────────────────────────────────────────────────────────
+def test_Stats(stub):
+    stub.Delete(kvstore_pb2.DeleteRequest(key="stats:probe"))
+
+    s = stub.Stats(kvstore_pb2.StatsRequest())
+    assert s.total_bytes == s.text_bytes + s.embedding_bytes
+    assert len(s.eviction_policy) > 0, "eviction_policy should be non-empty"
+    # Health counts every collection, Stats without a name only the default one
+    h = stub.Health(kvstore_pb2.HealthRequest())
+    cols = stub.ListCollections(kvstore_pb2.ListCollectionsRequest()).collections
+    assert h.key_count == sum(c.key_count for c in cols), "Health should sum key_count over collections"
+    assert s.key_count == {c.name: c.key_count for c in cols}.get("default", 0)
+
+    # Text is counted in UTF-8 bytes, embeddings in raw bytes
+    stub.Put(kvstore_pb2.PutRequest(key="stats:probe", textbook_chunk="héllo", embedding=b"\x00" * 16))
+    s2 = stub.Stats(kvstore_pb2.StatsRequest())
+    assert s2.key_count == s.key_count + 1
+    assert s2.text_bytes == s.text_bytes + 6, "text should be counted in UTF-8 bytes"
+    assert s2.embedding_bytes == s.embedding_bytes + 16
+    assert s2.mutations > s.mutations, "a Put should count as a mutation"
+    assert len(s2.content_digest) == 16 and s2.content_digest != s.content_digest
+
+    # Overwrite replaces the old sizes instead of adding to them
+    stub.Put(kvstore_pb2.PutRequest(key="stats:probe", textbook_chunk="hi", embedding=b"\x00" * 4))
+    s3 = stub.Stats(kvstore_pb2.StatsRequest())
+    assert s3.text_bytes == s.text_bytes + 2
+    assert s3.embedding_bytes == s.embedding_bytes + 4
+    assert s3.content_digest != s2.content_digest, "an overwrite should change the digest"
+    stub.Put(kvstore_pb2.PutRequest(key="stats:probe", textbook_chunk="hi", embedding=b"\x00" * 4))
+    assert stub.Stats(kvstore_pb2.StatsRequest()).content_digest == s3.content_digest, \
+        "the digest should depend only on the content"
+
+    # Delete gives the bytes back
+    stub.Delete(kvstore_pb2.DeleteRequest(key="stats:probe"))
+    s4 = stub.Stats(kvstore_pb2.StatsRequest())
+    assert s4.total_bytes == s.total_bytes, "bytes should return to the baseline after Delete"
+    assert s4.content_digest == s.content_digest, "the digest should return to the baseline after Delete"
+
+    print("PASSED: Stats")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Collections
+# ─────────────────────────────────────────────────────────────────────────────
+def test_Collections(stub):
+    for c in ["test_course_a", "test_course_b"]:
+        stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="col:", collection=c))
+    stub.Delete(kvstore_pb2.DeleteRequest(key="col:shared"))
+
+    # The same key lives independently in each collection
+    stub.Put(kvstore_pb2.PutRequest(key="col:shared", textbook_chunk="default", embedding=b"\x01"))
+    stub.Put(kvstore_pb2.PutRequest(key="col:shared", textbook_chunk="a", embedding=b"\x01",
+                                    collection="test_course_a"))
+    r = stub.Put(kvstore_pb2.PutRequest(key="col:shared", textbook_chunk="b", embedding=b"\x01\x02",
+                                        collection="test_course_b"))
+    assert r.overwritten is False, "a key in another collection should not count as an overwrite"
+
+    g = stub.GetText(kvstore_pb2.GetTextRequest(key="col:shared", collection="test_course_a"))
+    assert g.found and g.textbook_chunk == "a"
+    g2 = stub.GetText(kvstore_pb2.GetTextRequest(key="col:shared"))
+    assert g2.found and g2.textbook_chunk == "default", "empty collection should mean the default one"
+    g3 = stub.GetText(kvstore_pb2.GetTextRequest(key="col:shared", collection="default"))
+    assert g3.textbook_chunk == "default"
+
+    # List, StreamEmbeddings and Stats only see their own collection
+    l = stub.List(kvstore_pb2.ListRequest(collection="test_course_b"))
+    assert list(l.keys) == ["col:shared"]
+    entries = list(stub.StreamEmbeddings(kvstore_pb2.StreamEmbeddingsRequest(collection="test_course_b")))
+    assert [(e.key, e.embedding) for e in entries] == [("col:shared", b"\x01\x02")]
+    s = stub.Stats(kvstore_pb2.StatsRequest(collection="test_course_b"))
+    assert s.collection == "test_course_b" and s.key_count == 1 and s.embedding_bytes == 2
+
+    names = {c.name for c in stub.ListCollections(kvstore_pb2.ListCollectionsRequest()).collections}
+    assert {"default", "test_course_a", "test_course_b"} <= names
+
+    # Deleting in one collection leaves the others alone
+    d = stub.Delete(kvstore_pb2.DeleteRequest(key="col:shared", collection="test_course_a"))
+    assert d.deleted is True
+    assert stub.GetText(kvstore_pb2.GetTextRequest(key="col:shared", collection="test_course_a")).found is False
+    assert stub.GetText(kvstore_pb2.GetTextRequest(key="col:shared", collection="test_course_b")).found is True
+
+    # Reads from a collection that was never written are simply empty
+    g4 = stub.GetText(kvstore_pb2.GetTextRequest(key="col:shared", collection="never_created"))
+    assert g4.found is False
+    assert len(stub.List(kvstore_pb2.ListRequest(collection="never_created")).keys) == 0
+
+    # Collection names end up in file names, so odd ones are rejected
+    try:
+        stub.Put(kvstore_pb2.PutRequest(key="x", textbook_chunk="x", embedding=b"\x01",
+                                        collection="../etc"))
+        assert False, "invalid collection name should be rejected"
+    except grpc.RpcError as e:
+        assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+    try:
+        stub.Stats(kvstore_pb2.StatsRequest(collection="../etc"))
+        assert False, "Stats should reject an invalid collection name too"
+    except grpc.RpcError as e:
+        assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+    stub.Delete(kvstore_pb2.DeleteRequest(key="col:shared"))
+    stub.Delete(kvstore_pb2.DeleteRequest(key="col:shared", collection="test_course_b"))
+
+    print("PASSED: Collections")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Incremental sync: GetHashes / PutIfChanged
+# ─────────────────────────────────────────────────────────────────────────────
+def test_PutIfChanged(stub):
+    stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="sync:"))
+
+    # New key → written
+    r = stub.PutIfChanged(kvstore_pb2.PutRequest(key="sync:0", textbook_chunk="alpha", embedding=b"\x01\x02"))
+    assert r.changed is True and r.overwritten is False
+
+    # Identical content → nothing written, no mutation
+    before = stub.Stats(kvstore_pb2.StatsRequest()).mutations
+    r2 = stub.PutIfChanged(kvstore_pb2.PutRequest(key="sync:0", textbook_chunk="alpha", embedding=b"\x01\x02"))
+    assert r2.changed is False, "identical content should be skipped"
+    assert stub.Stats(kvstore_pb2.StatsRequest()).mutations == before
+
+    # A different embedding alone counts as a change
+    r3 = stub.PutIfChanged(kvstore_pb2.PutRequest(key="sync:0", textbook_chunk="alpha", embedding=b"\x01\x03"))
+    assert r3.changed is True and r3.overwritten is True
+
+    print("PASSED: PutIfChanged")
+
+
+def test_GetHashes(stub):
+    stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="sync:"))
+    stub.Put(kvstore_pb2.PutRequest(key="sync:a", textbook_chunk="héllo", embedding=b"\x01"))
+    stub.Put(kvstore_pb2.PutRequest(key="sync:b", textbook_chunk="world", embedding=b"\x02"))
+    stub.Put(kvstore_pb2.PutRequest(key="other:c", textbook_chunk="world", embedding=b"\x02"))
+
+    hashes = {h.key: h.hash for h in stub.GetHashes(kvstore_pb2.GetHashesRequest(prefix="sync:"))}
+    assert set(hashes) == {"sync:a", "sync:b"}, "only keys under the prefix should be returned"
+
+    # Clients compute the same hash locally to decide what to send
+    assert hashes["sync:a"] == content_hash("héllo", b"\x01")
+    assert hashes["sync:b"] == content_hash("world", b"\x02")
+
+    # ReplaceDocument keeps hashes in step with the stored content
+    stub.ReplaceDocument(iter([
+        kvstore_pb2.ReplaceDocumentRequest(doc_id="sync"),
+        kvstore_pb2.ReplaceDocumentRequest(
+            chunk=kvstore_pb2.PutRequest(key="sync:a", textbook_chunk="new", embedding=b"\x03")),
+    ]))
+    hashes = {h.key: h.hash for h in stub.GetHashes(kvstore_pb2.GetHashesRequest(prefix="sync:"))}
+    assert hashes == {"sync:a": content_hash("new", b"\x03")}
+
+    stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="sync:"))
+    stub.Delete(kvstore_pb2.DeleteRequest(key="other:c"))
+
+    print("PASSED: GetHashes")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Vector schema
+# ─────────────────────────────────────────────────────────────────────────────
+def test_Schema(stub):
+    c = "test_schema"
+    stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="vec:", collection=c))
+
+    schema = kvstore_pb2.VectorSchema(dim=4, dtype="float32", normalized=True)
+    r = stub.SetSchema(kvstore_pb2.SetSchemaRequest(collection=c, schema=schema))
+    assert r.schema.dim == 4 and r.schema.normalized is True
+
+    s = stub.Stats(kvstore_pb2.StatsRequest(collection=c))
+    assert s.schema.dim == 4 and s.schema.dtype == "float32", "Stats should report the schema"
+
+    # A conforming vector is stored and streamed back byte for byte
+    unit = np.array([0.6, 0.8, 0.0, 0.0], dtype=np.float32).tobytes()
+    stub.Put(kvstore_pb2.PutRequest(key="vec:ok", textbook_chunk="ok", embedding=unit, collection=c))
+    entries = list(stub.StreamEmbeddings(kvstore_pb2.StreamEmbeddingsRequest(collection=c)))
+    assert [(e.key, e.embedding) for e in entries] == [("vec:ok", unit)]
+
+    # Embeddings are accounted as the whole preallocated matrix (1024 rows to start)
+    s = stub.Stats(kvstore_pb2.StatsRequest(collection=c))
+    assert s.embedding_bytes == 1024 * 4 * 4, "embedding_bytes should be the matrix size"
+    assert s.total_bytes == s.text_bytes + s.embedding_bytes
+
+    # Wrong dimension, not normalized and NaN are all rejected at Put time
+    bad = [
+        np.ones(3, dtype=np.float32).tobytes(),
+        np.ones(4, dtype=np.float32).tobytes(),
+        np.array([np.nan, 1, 0, 0], dtype=np.float32).tobytes(),
+        b"\x01",
+    ]
+    for emb in bad:
+        try:
+            stub.Put(kvstore_pb2.PutRequest(key="vec:bad", textbook_chunk="x", embedding=emb, collection=c))
+            assert False, "embedding breaking the schema should be rejected"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert stub.GetText(kvstore_pb2.GetTextRequest(key="vec:bad", collection=c)).found is False
+
+    # A schema the stored vectors don't fit can't be declared
+    try:
+        stub.SetSchema(kvstore_pb2.SetSchemaRequest(
+            collection=c, schema=kvstore_pb2.VectorSchema(dim=8)))
+        assert False, "conflicting schema should be rejected"
+    except grpc.RpcError as e:
+        assert e.code() == grpc.StatusCode.FAILED_PRECONDITION
+
+    # Collections without a schema still accept any bytes
+    assert stub.Stats(kvstore_pb2.StatsRequest()).schema.dim == 0
+
+    stub.DeleteByPrefix(kvstore_pb2.DeleteByPrefixRequest(prefix="vec:", collection=c))
+
+    print("PASSED: Schema")
+
+
+def test_Tracing(stub):
+    stub.Put(kvstore_pb2.PutRequest(key="trace:1", textbook_chunk="traced", embedding=b""))
+
+    # A call carrying a trace ID is traced under it and the ID comes back in the trailers
+    resp, call = stub.GetText.with_call(
+        kvstore_pb2.GetTextRequest(key="trace:1"), metadata=(("x-trace-id", "feedc0de"),))
+    assert resp.found and resp.textbook_chunk == "traced"
+    trailers = dict(call.trailing_metadata())
+    assert trailers.get("x-trace-id") == "feedc0de", "trace ID should be echoed back"
+    assert float(trailers["x-trace-server-ms"]) >= 0.0
+
+    # Untraced calls are left alone
+    _, call = stub.GetText.with_call(kvstore_pb2.GetTextRequest(key="trace:1"))
+    assert "x-trace-id" not in dict(call.trailing_metadata())
+
+    stub.Delete(kvstore_pb2.DeleteRequest(key="trace:1"))
+
+    print("PASSED: Tracing")
+
+
+def test_Profile(stub):
+    r = stub.Profile(kvstore_pb2.ProfileRequest(mode="cpu", seconds=0.2, interval_ms=2))
+    assert r.report.startswith("cpu:") and r.samples > 0
+
+    r = stub.Profile(kvstore_pb2.ProfileRequest(mode="memory", seconds=0.1))
+    assert r.report.startswith("memory:")
+
+    for bad in (kvstore_pb2.ProfileRequest(mode="gpu"),
+                kvstore_pb2.ProfileRequest(seconds=-1),
+                kvstore_pb2.ProfileRequest(seconds=1e6)):
+        try:
+            stub.Profile(bad)
+            assert False, "invalid profile request should be rejected"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+    print("PASSED: Profile")
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Main
 # ─────────────────────────────────────────────────────────────────────────────
@@ -194,6 +553,15 @@ def main():
     test_Delete(stub)
     test_List(stub)
     test_Health(stub)
+    test_DeleteByPrefix(stub)
+    test_ReplaceDocument(stub)
+    test_Stats(stub)
+    test_Collections(stub)
+    test_PutIfChanged(stub)
+    test_GetHashes(stub)
+    test_Schema(stub)
+    test_Tracing(stub)
+    test_Profile(stub)
 
     print("\nALL TESTS PASSED")
 
@@ -0,0 +1,388 @@
+import sys
+sys.path.insert(0, "server/")
+sys.path.insert(0, "common/")
+sys.path.insert(0, "gRPC_KVS/src/kvstore/")
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import grpc
+import numpy as np
+
+import interceptors
+import kvstore_pb2
+import kvstore_pb2_grpc
+import metrics
+import server
+import tracing
+from retry import LOAD_SHED_TRAILER, with_retry
+
+
+# In-process tests of the store itself; run from the project root, no server needed
+def new_store(tmpdir, **kwargs):
+    return server.InMemoryKV(disk_path=Path(tmpdir, "kvstore.pkl"), **kwargs)
+
+
+def serve(kv, **kwargs):
+    # The store behind a real gRPC server on an ephemeral port, like bench/harness.py
+    srv, port = server.build_server(kv, "127.0.0.1:0", **kwargs)
+    srv.start()
+    return srv, grpc.insecure_channel(f"127.0.0.1:{port}")
+
+
+def stop(srv, channel):
+    channel.close()
+    srv.stop(grace=1).wait()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────────────
+def test_config(tmpdir):
+    for kwargs in ({"eviction_policy": "lfu-ish"}, {"text_compression": "brotli"}):
+        try:
+            new_store(tmpdir, **kwargs)
+            assert False, f"{kwargs} should be rejected when the store is created"
+        except ValueError:
+            pass
+
+    # Settings are case-insensitive, like the environment variables they come from
+    new_store(tmpdir, eviction_policy="LRU", text_compression="ZLIB")
+
+    print("PASSED: config")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Memory cap and eviction
+# ─────────────────────────────────────────────────────────────────────────────
+def test_eviction(tmpdir):
+    # Three 10-byte chunks fill a 30-byte cap, and a fourth has to push one
+    # out. Without reads both policies would pick a, the oldest write. The
+    # GetTexts make b the least recently used, and c (tied with a, but bumped
+    # first) the least frequently used
+    expected = {"lru": "b", "lfu": "c"}
+    for policy in ("lru", "lfu", "reject"):
+        kv = new_store(tmpdir, max_bytes=30, eviction_policy=policy)
+        srv, channel = serve(kv)
+        stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+        for key in "abc":
+            stub.Put(kvstore_pb2.PutRequest(key=key, textbook_chunk=key * 10))
+        for key in "bbca":
+            assert stub.GetText(kvstore_pb2.GetTextRequest(key=key)).found
+        before = stub.Stats(kvstore_pb2.StatsRequest())
+        keys = sorted(stub.List(kvstore_pb2.ListRequest()).keys)
+
+        try:
+            stub.Put(kvstore_pb2.PutRequest(key="d", textbook_chunk="d" * 10))
+        except grpc.RpcError as e:
+            # Rejected writes leave the store exactly as it was
+            assert policy == "reject", f"{policy} should make room instead of rejecting"
+            assert e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+            after = stub.Stats(kvstore_pb2.StatsRequest())
+            assert sorted(stub.List(kvstore_pb2.ListRequest()).keys) == keys
+            assert (after.total_bytes, after.evictions) == (before.total_bytes, 0)
+            assert after.rejected_puts == before.rejected_puts + 1
+        else:
+            assert policy != "reject", "reject should never evict"
+            left = set(stub.List(kvstore_pb2.ListRequest()).keys)
+            assert left == set("abcd") - {expected[policy]}, f"{policy} evicted the wrong key: {left}"
+            after = stub.Stats(kvstore_pb2.StatsRequest())
+            assert (after.evictions, after.total_bytes) == (1, 30)
+
+        stop(srv, channel)
+
+    print("PASSED: eviction")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Compressed text storage
+# ─────────────────────────────────────────────────────────────────────────────
+def test_compression(tmpdir):
+    kv = new_store(tmpdir, text_compression="zlib")
+    srv, channel = serve(kv)
+    stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+    long_text = "replica consensus quorum " * 40
+    long_text2 = "leader election partition " * 40
+
+    # Long chunks are stored as zlib bytes and accounted at their stored size
+    stub.Put(kvstore_pb2.PutRequest(key="z:long", textbook_chunk=long_text, embedding=b"\x00" * 8))
+    stub.Put(kvstore_pb2.PutRequest(key="z:short", textbook_chunk="héllo", embedding=b"\x00" * 8))
+    col = kv.collection("")
+    stored = col.textbook_chunks["z:long"]
+    assert isinstance(stored, bytes) and len(stored) < len(long_text)
+    assert isinstance(col.textbook_chunks["z:short"], str), "short chunks aren't worth compressing"
+    s = stub.Stats(kvstore_pb2.StatsRequest())
+    assert s.text_compression == "zlib"
+    assert s.text_bytes == len(stored) + len("héllo".encode("utf-8"))
+
+    # The second read is served from the cache
+    for _ in range(2):
+        assert stub.GetText(kvstore_pb2.GetTextRequest(key="z:long")).textbook_chunk == long_text
+    s = stub.Stats(kvstore_pb2.StatsRequest())
+    assert (s.text_cache_misses, s.text_cache_hits) == (1, 1)
+
+    # An overwrite replaces the stored blob, so the cached text must not be served
+    stub.Put(kvstore_pb2.PutRequest(key="z:long", textbook_chunk=long_text2, embedding=b"\x00" * 8))
+    assert stub.GetText(kvstore_pb2.GetTextRequest(key="z:long")).textbook_chunk == long_text2
+    s = stub.Stats(kvstore_pb2.StatsRequest())
+    assert s.text_bytes == len(col.textbook_chunks["z:long"]) + len("héllo".encode("utf-8"))
+
+    # Removed keys leave the cache
+    stub.Put(kvstore_pb2.PutRequest(key="z:gone", textbook_chunk=long_text, embedding=b"\x00" * 8))
+    stub.GetText(kvstore_pb2.GetTextRequest(key="z:gone"))
+    stub.Delete(kvstore_pb2.DeleteRequest(key="z:gone"))
+    assert "z:gone" not in col.codec.cache
+
+    stop(srv, channel)
+    kv.persist_to_disk()
+
+    # A zlib pickle loads under "none": stored blobs are kept and still decode
+    kv2 = new_store(tmpdir, text_compression="none")
+    srv2, channel2 = serve(kv2)
+    stub2 = kvstore_pb2_grpc.KeyValueStoreStub(channel2)
+    assert isinstance(kv2.collection("").textbook_chunks["z:long"], bytes)
+    assert stub2.GetText(kvstore_pb2.GetTextRequest(key="z:long")).textbook_chunk == long_text2
+    assert stub2.GetText(kvstore_pb2.GetTextRequest(key="z:short")).textbook_chunk == "héllo"
+    assert stub2.Stats(kvstore_pb2.StatsRequest()).text_bytes == s.text_bytes
+
+    # New writes follow the new setting
+    stub2.Put(kvstore_pb2.PutRequest(key="z:plain", textbook_chunk=long_text, embedding=b"\x00" * 8))
+    assert isinstance(kv2.collection("").textbook_chunks["z:plain"], str)
+    stop(srv2, channel2)
+    kv2.persist_to_disk()
+
+    # And the other way round: plain chunks are compressed when loaded under "zlib".
+    # Rehashing on load doesn't go through the GetText cache
+    kv3 = new_store(tmpdir, text_compression="zlib")
+    codec = kv3.collection("").codec
+    assert (len(codec.cache), codec.hits, codec.misses) == (0, 0, 0), "loading should not touch the cache"
+    assert isinstance(kv3.collection("").textbook_chunks["z:plain"], bytes)
+    assert kv3.collection("").codec.decode("z:plain", kv3.collection("").textbook_chunks["z:plain"]) == long_text
+
+    print("PASSED: compression")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Background snapshots
+# ─────────────────────────────────────────────────────────────────────────────
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_snapshots(tmpdir):
+    kv = new_store(tmpdir)
+    srv, channel = serve(kv)
+    stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+    default, other = Path(tmpdir, "kvstore.pkl"), Path(tmpdir, "kvstore.other.pkl")
+
+    # Write-count trigger: nothing until the third write
+    snapshots = server.SnapshotScheduler(kv, interval=0, mutations=3, poll=0.01)
+    snapshots.start()
+    for i in range(2):
+        stub.Put(kvstore_pb2.PutRequest(key=f"s:{i}", textbook_chunk=f"text {i}"))
+    time.sleep(0.1)
+    assert not default.exists(), "no snapshot before the write-count trigger"
+    stub.Put(kvstore_pb2.PutRequest(key="s:2", textbook_chunk="text 2"))
+    assert wait_for(default.exists), "a snapshot should follow the third write"
+    snapshots.stop()
+    snapshots.join()
+
+    # Interval trigger: one write is enough once the interval has passed
+    snapshots = server.SnapshotScheduler(kv, interval=0.2, mutations=0, poll=0.01)
+    start = time.monotonic()
+    snapshots.start()
+    stub.Put(kvstore_pb2.PutRequest(key="o:0", textbook_chunk="other", collection="other"))
+    assert wait_for(other.exists), "a snapshot should follow the interval"
+    assert time.monotonic() - start >= 0.2
+    snapshots.stop()
+    snapshots.join()
+    assert not list(Path(tmpdir).glob("*.tmp")), "snapshots should leave no temp files"
+
+    # On shutdown only collections written since their last snapshot are rewritten
+    stub.Put(kvstore_pb2.PutRequest(key="s:3", textbook_chunk="text 3"))
+    stop(srv, channel)
+    other_mtime = other.stat().st_mtime_ns
+    default_mtime = default.stat().st_mtime_ns
+    kv.persist_to_disk(only_dirty=True)
+    assert other.stat().st_mtime_ns == other_mtime, "a clean collection should not be rewritten"
+    assert default.stat().st_mtime_ns != default_mtime, "a dirty collection should be rewritten"
+    assert not kv.collection("").dirty()
+
+    # And everything comes back
+    kv2 = new_store(tmpdir)
+    assert kv2.collection("").textbook_chunks == {f"s:{i}": f"text {i}" for i in range(4)}
+    assert kv2.collection("other").textbook_chunks == {"o:0": "other"}
+
+    print("PASSED: snapshots")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Vector schema accounting
+# ─────────────────────────────────────────────────────────────────────────────
+def test_schema_bytes(tmpdir):
+    row = np.array([1, 0, 0, 0], dtype=np.float32).tobytes()
+    matrix = 1024 * len(row)
+    kv = new_store(tmpdir, max_bytes=matrix + 2000)
+    srv, channel = serve(kv)
+    stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+    stub.SetSchema(kvstore_pb2.SetSchemaRequest(schema=kvstore_pb2.VectorSchema(dim=4)))
+
+    # The first 1024 rows are already paid for
+    for i in range(1024):
+        stub.Put(kvstore_pb2.PutRequest(key=f"m:{i}", textbook_chunk="", embedding=row))
+    s = stub.Stats(kvstore_pb2.StatsRequest())
+    assert (s.embedding_bytes, s.text_bytes) == (matrix, 0)
+
+    # Row 1025 would double the matrix past the cap; overwrites still fit
+    try:
+        stub.Put(kvstore_pb2.PutRequest(key="m:new", textbook_chunk="", embedding=row))
+        assert False, "a Put that grows the matrix past the cap should be rejected"
+    except grpc.RpcError as e:
+        assert e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    stub.Put(kvstore_pb2.PutRequest(key="m:0", textbook_chunk="x", embedding=row))
+    stop(srv, channel)
+
+    # Without a cap the matrix doubles, and Stats counts all of it
+    kv.collection("").max_bytes = 0
+    srv, channel = serve(kv)
+    stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+    stub.Put(kvstore_pb2.PutRequest(key="m:new", textbook_chunk="", embedding=row))
+    assert stub.Stats(kvstore_pb2.StatsRequest()).embedding_bytes == 2 * matrix
+    stop(srv, channel)
+
+    print("PASSED: schema bytes")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Metrics and tracing interceptors
+# ─────────────────────────────────────────────────────────────────────────────
+def test_interceptors(tmpdir):
+    traces = []
+    log_trace = server.log_trace
+    server.log_trace = traces.append
+    try:
+        kv = new_store(tmpdir)
+        srv, channel = serve(kv)
+    finally:
+        server.log_trace = log_trace
+    stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+    stub.Put(kvstore_pb2.PutRequest(key="m:0", textbook_chunk="text", embedding=b"\x00" * 4))
+
+    ok = interceptors.RPC_TOTAL.get(method="GetText", code="OK")
+    bad = interceptors.RPC_TOTAL.get(method="Stats", code="INVALID_ARGUMENT")
+    timed = interceptors.RPC_LATENCY.count(method="GetText")
+    streamed = interceptors.STREAM_MESSAGES.count(method="StreamEmbeddings", direction="sent")
+
+    # Calls are counted per method and status code, and timed per method
+    stub.GetText(kvstore_pb2.GetTextRequest(key="m:0"))
+    try:
+        stub.Stats(kvstore_pb2.StatsRequest(collection="../x"))
+        assert False, "an invalid collection name should be rejected"
+    except grpc.RpcError as e:
+        assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert len(list(stub.StreamEmbeddings(kvstore_pb2.StreamEmbeddingsRequest()))) == 1
+    assert interceptors.RPC_TOTAL.get(method="GetText", code="OK") == ok + 1
+    assert interceptors.RPC_TOTAL.get(method="Stats", code="INVALID_ARGUMENT") == bad + 1
+    assert interceptors.RPC_LATENCY.count(method="GetText") == timed + 1
+    assert interceptors.STREAM_MESSAGES.count(method="StreamEmbeddings", direction="sent") == streamed + 1
+    assert 'kvstore_rpc_total{method="GetText",code="OK"}' in metrics.REGISTRY.render()
+
+    # Untraced calls leave no trace; a traced one is traced under the client's
+    # ID, with the lock wait as a span, and the ID is echoed back
+    assert traces == []
+    _, call = stub.GetText.with_call(kvstore_pb2.GetTextRequest(key="m:0"),
+                                     metadata=((tracing.TRACE_HEADER, "abc123"),))
+    trailers = dict(call.trailing_metadata())
+    assert trailers[tracing.TRACE_HEADER] == "abc123"
+    assert float(trailers["x-trace-server-ms"]) >= 0
+    assert [(t.trace_id, t.name) for t in traces] == [("abc123", "GetText")]
+    assert "lock_wait" in [span[0] for span in traces[0].spans]
+
+    stop(srv, channel)
+    print("PASSED: interceptors")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Admission control
+# ─────────────────────────────────────────────────────────────────────────────
+def test_admission(tmpdir):
+    kv = new_store(tmpdir, max_bytes=64)
+    srv, channel = serve(kv, max_writes=1)
+    stub = kvstore_pb2_grpc.KeyValueStoreStub(channel)
+    stub.Put(kvstore_pb2.PutRequest(key="a:1", textbook_chunk="x", embedding=b"\x00" * 4))
+    stub.Put(kvstore_pb2.PutRequest(key="b:1", textbook_chunk="y", collection="other"))
+
+    # Park the next Put at the collection lock, holding the only write slot
+    col = kv.collection("")
+    entered, release = threading.Event(), threading.Event()
+
+    class ParkedLock:
+        def __init__(self, lock):
+            self.lock = lock
+
+        def __enter__(self):
+            entered.set()
+            release.wait()
+            return self.lock.__enter__()
+
+        def __exit__(self, *exc):
+            return self.lock.__exit__(*exc)
+
+    col.lock = ParkedLock(col.lock)
+    parked = stub.Put.future(kvstore_pb2.PutRequest(key="a:2", textbook_chunk="z"))
+    assert entered.wait(5)
+    try:
+        # A second write is shed at once and marked as retryable load shedding
+        try:
+            stub.Put(kvstore_pb2.PutRequest(key="a:3", textbook_chunk="z"), timeout=5)
+            assert False, "a write with no free slot should be rejected"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+            assert (LOAD_SHED_TRAILER, "1") in e.trailing_metadata()
+
+        # Reads still get a worker while the write slot is taken
+        resp = stub.GetText(kvstore_pb2.GetTextRequest(key="b:1", collection="other"), timeout=5)
+        assert resp.textbook_chunk == "y"
+    finally:
+        col.lock = col.lock.lock
+        release.set()
+    assert parked.result(timeout=5).overwritten is False
+
+    # A full collection is RESOURCE_EXHAUSTED too, but without the trailer it isn't retried
+    attempts = []
+    def put_big(timeout):
+        attempts.append(timeout)
+        return stub.Put(kvstore_pb2.PutRequest(key="a:big", textbook_chunk="x" * 100), timeout=timeout)
+    try:
+        with_retry(put_big, 5)
+        assert False, "a Put over the byte cap should fail"
+    except grpc.RpcError as e:
+        assert e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert len(attempts) == 1, "a full collection should not be retried"
+
+    stop(srv, channel)
+    print("PASSED: admission")
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_config(tmpdir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_eviction(tmpdir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_compression(tmpdir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_snapshots(tmpdir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_schema_bytes(tmpdir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_interceptors(tmpdir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_admission(tmpdir)
+    print("\nALL TESTS PASSED")
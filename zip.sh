@@ -9,11 +9,14 @@ mkdir -p $ZIP_DIR
 
 mkdir -p $ZIP_DIR/ingestion/RAG
 cp -r ingestion/RAG/pdf_ingestor.py $ZIP_DIR/ingestion/RAG/
+cp -r ingestion/RAG/dedup.py $ZIP_DIR/ingestion/RAG/
 cp -r ingestion/ingestion_client.py $ZIP_DIR/ingestion/
 
+cp -r common/ $ZIP_DIR/
 cp -r mcp_server/ $ZIP_DIR/
 cp -r server/ $ZIP_DIR/
 cp -r tests/ $ZIP_DIR/
+cp -r bench/ $ZIP_DIR/
 cp -r docs/ $ZIP_DIR/
 
 echo "Zipping..."